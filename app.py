@@ -1,16 +1,63 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, has_request_context, g, Response
+from flask import has_app_context
+from flask import stream_with_context
+from flask import before_render_template, template_rendered
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session as SqlaSession
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
 from twilio.rest import Client
+from twilio.http.http_client import TwilioHttpClient
+from twilio.request_validator import RequestValidator
+from twilio.base.exceptions import TwilioRestException
+from requests.adapters import HTTPAdapter
+import requests
+import atexit
+import bisect
+import click
+import csv
+import glob
+import hashlib
+import hmac
+import io
+import json
+import mmap
 import os
+import random
+import re
+import secrets
+import struct
+import sys
+import threading
+import time
+import unicodedata
+
+try:
+    import fcntl
+except ImportError:  # Windows: metrics files are archived without a cross-process lock
+    fcntl = None
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'change-this-to-a-random-secret-key')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///fellowship_evals.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///fellowship_evals.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# SQLite tuning, applied to every new connection
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', '20000'))
+SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'connect_args': {'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000},
+    }
+
 db = SQLAlchemy(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -21,6 +68,528 @@ TWILIO_ACCOUNT_SID = os.environ.get('TWILIO_ACCOUNT_SID', '')
 TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN', '')
 TWILIO_PHONE_NUMBER = os.environ.get('TWILIO_PHONE_NUMBER', '')
 
+# Sender pool: comma-separated numbers to spread sends across (defaults to
+# TWILIO_PHONE_NUMBER), or a messaging service, which takes precedence
+TWILIO_SENDER_NUMBERS = [number.strip() for number in os.environ.get('TWILIO_SENDER_NUMBERS', '').split(',')
+                         if number.strip()] or [TWILIO_PHONE_NUMBER]
+TWILIO_MESSAGING_SERVICE_SID = os.environ.get('TWILIO_MESSAGING_SERVICE_SID', '')
+# Messages per second allowed per sender (a long code is about 1/s; for a
+# messaging service use the service's combined rate) and the burst each may
+# send before pacing starts (defaults to ten seconds' worth)
+SMS_SENDER_RATE = float(os.environ.get('SMS_SENDER_RATE', '1'))
+SMS_SENDER_BURST = float(os.environ.get('SMS_SENDER_BURST', '0')) or SMS_SENDER_RATE * 10
+# Seconds a sender rests after the provider throttles it (doubles on repeats, up to 60)
+SMS_THROTTLE_COOLDOWN = float(os.environ.get('SMS_THROTTLE_COOLDOWN', '1'))
+
+# Public URL of the /twilio/status webhook; Twilio reports delivery status there when set
+TWILIO_STATUS_CALLBACK_URL = os.environ.get('TWILIO_STATUS_CALLBACK_URL', '')
+
+# Delivery status batching: flush after this many updates or this many seconds
+STATUS_BATCH_SIZE = int(os.environ.get('STATUS_BATCH_SIZE', '500'))
+STATUS_FLUSH_INTERVAL = float(os.environ.get('STATUS_FLUSH_INTERVAL', '2'))
+
+# Number of SMS messages sent in parallel during a Friday run
+SMS_MAX_WORKERS = int(os.environ.get('SMS_MAX_WORKERS', '8'))
+
+# Timeouts (seconds) for calls to the Twilio API
+TWILIO_CONNECT_TIMEOUT = float(os.environ.get('TWILIO_CONNECT_TIMEOUT', '5'))
+TWILIO_READ_TIMEOUT = float(os.environ.get('TWILIO_READ_TIMEOUT', '15'))
+
+# Evaluation log batching: flush after this many rows or this many seconds
+EVAL_LOG_BATCH_SIZE = int(os.environ.get('EVAL_LOG_BATCH_SIZE', '100'))
+EVAL_LOG_FLUSH_INTERVAL = float(os.environ.get('EVAL_LOG_FLUSH_INTERVAL', '2'))
+# fsync every journal line (survives a machine crash, not just a process crash)
+EVAL_LOG_FSYNC = os.environ.get('EVAL_LOG_FSYNC', '').lower() in ('1', 'true', 'yes')
+
+# Retries of failed scheduled sends: attempts per send, and the backoff range in seconds
+RETRY_MAX_ATTEMPTS = int(os.environ.get('RETRY_MAX_ATTEMPTS', '5'))
+RETRY_BASE_DELAY = float(os.environ.get('RETRY_BASE_DELAY', '60'))
+RETRY_MAX_DELAY = float(os.environ.get('RETRY_MAX_DELAY', '3600'))
+# A send still 'sending' after this many seconds was abandoned by a dead process
+RETRY_STALE_AFTER = float(os.environ.get('RETRY_STALE_AFTER', '600'))
+
+# SMS transport: 'twilio', or 'fake' to send nothing and simulate Twilio locally (load tests)
+SMS_TRANSPORT = os.environ.get('SMS_TRANSPORT', 'twilio').lower()
+# Fake transport behaviour: mean latency, share of 5xx errors and read timeouts,
+# and per-sender messages per second before it answers 429 (0 = unlimited)
+SMS_FAKE_LATENCY_MS = float(os.environ.get('SMS_FAKE_LATENCY_MS', '150'))
+SMS_FAKE_ERROR_RATE = float(os.environ.get('SMS_FAKE_ERROR_RATE', '0'))
+SMS_FAKE_TIMEOUT_RATE = float(os.environ.get('SMS_FAKE_TIMEOUT_RATE', '0'))
+SMS_FAKE_RATE_LIMIT = float(os.environ.get('SMS_FAKE_RATE_LIMIT', '0'))
+
+# Request metrics: directory for the per-process shared-memory files, and an
+# optional bearer token that lets a scraper read /metrics without logging in
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Query budgets: the most SQL statements a request may issue (per-view limits
+# come from @query_budget or QUERY_BUDGETS="endpoint=n,..."), how many times one
+# statement shape may repeat (an N+1), and what to do when a request goes over:
+# 'raise' (default in debug mode), 'log' (default otherwise) or 'off'
+QUERY_BUDGET_DEFAULT = int(os.environ.get('QUERY_BUDGET_DEFAULT', '40'))
+QUERY_REPEAT_LIMIT = int(os.environ.get('QUERY_REPEAT_LIMIT', '10'))
+QUERY_BUDGETS = {
+    endpoint.strip(): int(limit)
+    for endpoint, _, limit in (entry.partition('=') for entry in os.environ.get('QUERY_BUDGETS', '').split(','))
+    if endpoint.strip() and limit.strip()
+}
+QUERY_BUDGET_ACTION = os.environ.get('QUERY_BUDGET_ACTION', '').lower()
+
+# Transliterate every outgoing message to GSM-7 so it is never billed as UCS-2
+SMS_FORCE_GSM7 = os.environ.get('SMS_FORCE_GSM7', '').lower() in ('1', 'true', 'yes')
+
+
+# Database Engine
+_write_lock = threading.RLock()
+_writer_state = threading.local()
+
+
+def _configure_sqlite_connection(dbapi_connection, connection_record):
+    """Apply WAL, busy_timeout, synchronous and cache size to a new SQLite connection"""
+    # Let SQLAlchemy's begin event issue BEGIN so writers can use BEGIN IMMEDIATE
+    dbapi_connection.isolation_level = None
+    
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.close()
+
+
+def _write_lock_holder():
+    """The connection through which this thread holds the SQLite write lock, or None"""
+    holder = getattr(_writer_state, 'holder', None)
+    if holder is not None and (holder.closed or not holder.in_transaction()):
+        holder = _writer_state.holder = None
+    return holder
+
+
+def _begin_sqlite_transaction(conn):
+    """Start write units with BEGIN IMMEDIATE and reads deferred.
+    
+    Write units are serialized_write() blocks and the session of a POST
+    request; they take the write lock before their first read, so what they
+    check is still true when they write, and they queue on busy_timeout
+    instead of failing with 'database is locked'. Reads stay deferred and,
+    in WAL mode, never wait behind a writer. Once a thread holds the lock
+    its other connections begin deferred, since they could only wait on it.
+    """
+    immediate = (conn.get_execution_options().get('sqlite_immediate')
+                 or (has_app_context() and g.get('sqlite_write_request')))
+    if immediate and _write_lock_holder() is None:
+        conn.exec_driver_sql('BEGIN IMMEDIATE')
+        conn.info['sqlite_writer'] = True
+        _writer_state.holder = conn
+    else:
+        conn.exec_driver_sql('BEGIN')
+
+
+def _release_write_lock(conn):
+    if conn.info.pop('sqlite_writer', False) and getattr(_writer_state, 'holder', None) is conn:
+        _writer_state.holder = None
+
+
+with app.app_context():
+    if db.engine.dialect.name == 'sqlite':
+        db.event.listen(db.engine, 'connect', _configure_sqlite_connection)
+        db.event.listen(db.engine, 'begin', _begin_sqlite_transaction)
+        db.event.listen(db.engine, 'commit', _release_write_lock)
+        db.event.listen(db.engine, 'rollback', _release_write_lock)
+
+
+@app.before_request
+def _mark_write_request():
+    """POST (and other unsafe) requests write, so their session begins as a writer"""
+    if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+        g.sqlite_write_request = True
+
+
+@contextmanager
+def serialized_write():
+    """Run a block of writes as one transaction through this process's single writer.
+    
+    The block gets its own session on a fresh connection that begins with
+    BEGIN IMMEDIATE; it commits on success and rolls back on error, and the
+    caller's session is left alone. Nested calls join the outer block.
+    If this thread already holds the write lock (a POST request's session),
+    the block joins that transaction in a savepoint instead of waiting on
+    its own lock, and is committed when the caller commits. Background
+    writers (the evaluation log, counter rebuilds, bulk jobs) use this so
+    they queue behind each other instead of contending for the write lock.
+    """
+    if getattr(_writer_state, 'depth', 0):
+        yield db.session
+        return
+    
+    holder = _write_lock_holder()
+    outer_g = g._get_current_object() if has_request_context() else None
+    with _write_lock, app.app_context():
+        if outer_g is not None:
+            # Count the block's statements against the request that ran it
+            g.sql_stats = outer_g.setdefault('sql_stats', [0, 0.0])
+            g.sql_shapes = outer_g.setdefault('sql_shapes', {})
+        if holder is not None:
+            db.session.registry.set(SqlaSession(bind=holder, join_transaction_mode='create_savepoint'))
+        _writer_state.depth = 1
+        try:
+            if holder is None:
+                db.session.connection(execution_options={'sqlite_immediate': True})
+            yield db.session
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            _writer_state.depth = 0
+
+
+# Metrics
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    'http_requests_total': ('counter', 'Requests by endpoint, method and status', None),
+    'http_request_duration_seconds': ('histogram', 'Request latency by endpoint', LATENCY_BUCKETS),
+    'sql_statements_per_request': ('histogram', 'SQL statements issued per request', STATEMENT_BUCKETS),
+    'sql_seconds_per_request': ('histogram', 'Time spent in SQL per request', LATENCY_BUCKETS),
+    'template_render_seconds': ('histogram', 'Template render time', LATENCY_BUCKETS),
+    'sms_send_seconds': ('histogram', 'SMS provider API call latency by endpoint and outcome', LATENCY_BUCKETS),
+}
+
+
+class SharedMetrics:
+    """Counters and histograms that add up across gunicorn workers.
+    
+    Each process writes its own memory-mapped file of (key, float) entries,
+    so recording a value never waits on another process; reading sums the
+    files of every live process plus an archive holding the totals of
+    processes that have exited, so counters never go backwards. The file
+    layout is an 8-byte header holding the bytes in use, followed by
+    entries of a 4-byte key length, the UTF-8 key padded to 8 bytes, and a
+    float64. The header is updated after an entry is complete, so readers
+    never see a half-written entry.
+    """
+    
+    _header = struct.Struct('<I4x')
+    _length = struct.Struct('<I')
+    _value = struct.Struct('<d')
+    
+    def __init__(self, directory, initial_size=64 * 1024):
+        self.directory = directory
+        self.initial_size = initial_size
+        self._pid = None
+        self._lock = threading.Lock()
+        self._file = None
+        self._map = None
+        self._offsets = {}
+        self._used = self._header.size
+    
+    def _open(self):
+        """Open this process's file; after a fork, start a new one"""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self._archive_dead()
+        self._file = open(os.path.join(self.directory, f'metrics.{pid}.db'), 'w+b')
+        self._file.truncate(self.initial_size)
+        self._map = mmap.mmap(self._file.fileno(), self.initial_size)
+        self._offsets = {}
+        self._used = self._header.size
+        self._header.pack_into(self._map, 0, self._used)
+        self._pid = pid
+    
+    @contextmanager
+    def _locked(self, mode):
+        """Hold the directory's lock file: exclusive to archive, shared to read"""
+        with open(os.path.join(self.directory, 'metrics.lock'), 'a+b') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, mode)
+            yield
+    
+    def _load_archive(self):
+        try:
+            with open(os.path.join(self.directory, 'metrics.archive.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'values': {}, 'merged': []}
+    
+    def _archive_dead(self):
+        """Fold the values of processes that have exited into the archive, then delete their files.
+        
+        Each dead file is first renamed to a unique '.archiving' name, and the
+        archive lists the names it already holds, so a crash part-way through
+        neither counts a file twice nor loses it.
+        """
+        with self._locked(fcntl.LOCK_EX if fcntl else None):
+            for path in glob.glob(os.path.join(self.directory, 'metrics.*.db')):
+                try:
+                    os.kill(int(path.rsplit('.', 2)[-2]), 0)
+                except ProcessLookupError:
+                    os.rename(path, f'{path[:-3]}.{secrets.token_hex(4)}.archiving')
+                except (ValueError, OSError):
+                    pass
+            
+            archive = self._load_archive()
+            pending = []
+            for path in glob.glob(os.path.join(self.directory, 'metrics.*.archiving')):
+                if os.path.basename(path) in archive['merged']:
+                    os.remove(path)  # archived before a crash, but not yet deleted
+                else:
+                    pending.append(path)
+            if not pending:
+                return
+            
+            values = archive['values']
+            for path in pending:
+                for key, value in self._read(path).items():
+                    values[key] = values.get(key, 0.0) + value
+            archive['merged'] = [os.path.basename(path) for path in pending]
+            
+            archive_path = os.path.join(self.directory, 'metrics.archive.json')
+            with open(f'{archive_path}.tmp', 'w', encoding='utf-8') as f:
+                json.dump(archive, f)
+            os.replace(f'{archive_path}.tmp', archive_path)
+            for path in pending:
+                os.remove(path)
+    
+    def _offset(self, key):
+        """Offset of the key's value, appending a zeroed entry for a new key"""
+        offset = self._offsets.get(key)
+        if offset is not None:
+            return offset
+        
+        encoded = key.encode('utf-8')
+        padded = (len(encoded) + self._length.size + 7) // 8 * 8 - self._length.size
+        size = self._length.size + padded + self._value.size
+        if self._used + size > len(self._map):
+            new_size = max(len(self._map) * 2, self._used + size)
+            self._file.truncate(new_size)
+            self._map.close()
+            self._map = mmap.mmap(self._file.fileno(), new_size)
+        
+        self._length.pack_into(self._map, self._used, len(encoded))
+        self._map[self._used + self._length.size:self._used + self._length.size + len(encoded)] = encoded
+        offset = self._used + self._length.size + padded
+        self._value.pack_into(self._map, offset, 0.0)
+        self._used += size
+        self._header.pack_into(self._map, 0, self._used)
+        self._offsets[key] = offset
+        return offset
+    
+    def _add(self, key, amount):
+        offset = self._offset(key)
+        self._value.pack_into(self._map, offset, self._value.unpack_from(self._map, offset)[0] + amount)
+    
+    @staticmethod
+    def _key(name, labels, suffix='', le=''):
+        return json.dumps([name, sorted(labels.items()), suffix, le], ensure_ascii=False)
+    
+    def inc(self, name, labels, amount=1.0):
+        """Add to a counter"""
+        with self._lock:
+            self._open()
+            self._add(self._key(name, labels), amount)
+    
+    def observe(self, name, labels, value):
+        """Record one observation in a histogram"""
+        buckets = METRICS[name][2]
+        bucket = next((bound for bound in buckets if value <= bound), '+Inf')
+        with self._lock:
+            self._open()
+            self._add(self._key(name, labels, 'bucket', str(bucket)), 1.0)
+            self._add(self._key(name, labels, 'sum'), value)
+            self._add(self._key(name, labels, 'count'), 1.0)
+    
+    def _read(self, path):
+        """The {key: value} entries of one process's file"""
+        with open(path, 'rb') as f:
+            data = f.read()
+        values = {}
+        if len(data) < self._header.size:
+            return values
+        used = min(self._header.unpack_from(data, 0)[0], len(data))
+        position = self._header.size
+        while position < used:
+            length = self._length.unpack_from(data, position)[0]
+            padded = (length + self._length.size + 7) // 8 * 8 - self._length.size
+            key = data[position + self._length.size:position + self._length.size + length].decode('utf-8')
+            value_at = position + self._length.size + padded
+            values[key] = values.get(key, 0.0) + self._value.unpack_from(data, value_at)[0]
+            position = value_at + self._value.size
+        return values
+    
+    def collect(self):
+        """Sum the archive and every process's values; returns {key: value}"""
+        if not os.path.isdir(self.directory):
+            return {}
+        with self._locked(fcntl.LOCK_SH if fcntl else None):
+            archive = self._load_archive()
+            totals = dict(archive['values'])
+            paths = glob.glob(os.path.join(self.directory, 'metrics.*.db')) + [
+                path for path in glob.glob(os.path.join(self.directory, 'metrics.*.archiving'))
+                if os.path.basename(path) not in archive['merged']
+            ]
+            for path in paths:
+                for key, value in self._read(path).items():
+                    totals[key] = totals.get(key, 0.0) + value
+        return totals
+    
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        series = {}
+        for key, value in self.collect().items():
+            name, labels, suffix, le = json.loads(key)
+            series.setdefault(name, {}).setdefault(tuple(map(tuple, labels)), {})[(suffix, le)] = value
+        
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, values in sorted(series.get(name, {}).items()):
+                if kind == 'counter':
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(values[("", "")])}')
+                    continue
+                cumulative = 0.0
+                for bound in [str(bound) for bound in buckets] + ['+Inf']:
+                    cumulative += values.get(('bucket', bound), 0.0)
+                    lines.append(f'{name}_bucket{_format_labels(labels + (("le", bound),))} {_format_value(cumulative)}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(values.get(("sum", ""), 0.0))}')
+                lines.append(f'{name}_count{_format_labels(labels)} {_format_value(values.get(("count", ""), 0.0))}')
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+def _format_value(value):
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+metrics = SharedMetrics(METRICS_DIR or os.path.join(app.instance_path, 'metrics'))
+
+
+def _sql_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_started'] = time.perf_counter()
+
+
+def _sql_finished(conn, cursor, statement, parameters, context, executemany):
+    """Add each statement to the current request's SQL count and time"""
+    started = conn.info.pop('query_started', None)
+    if started is None or not has_request_context():
+        return
+    stats = g.setdefault('sql_stats', [0, 0.0])
+    stats[0] += 1
+    stats[1] += time.perf_counter() - started
+    shape = sql_shape(statement)
+    shapes = g.setdefault('sql_shapes', {})
+    shapes[shape] = shapes.get(shape, 0) + 1
+
+
+with app.app_context():
+    db.event.listen(db.engine, 'before_cursor_execute', _sql_started)
+    db.event.listen(db.engine, 'after_cursor_execute', _sql_finished)
+
+
+@before_render_template.connect_via(app)
+def _template_started(sender, template, context, **extra):
+    g.setdefault('templates_started', []).append(time.perf_counter())
+
+
+@template_rendered.connect_via(app)
+def _template_finished(sender, template, context, **extra):
+    started = g.get('templates_started')
+    if started:
+        metrics.observe('template_render_seconds', {'template': template.name or 'string'},
+                        time.perf_counter() - started.pop())
+
+
+@app.before_request
+def _start_request_metrics():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def _record_request_metrics(response):
+    """Record latency, status and SQL totals for the request under its endpoint"""
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    
+    endpoint = request.endpoint or 'unmatched'
+    statements, sql_seconds = g.pop('sql_stats', (0, 0.0))
+    metrics.inc('http_requests_total', {'endpoint': endpoint, 'method': request.method,
+                                        'status': str(response.status_code)})
+    metrics.observe('http_request_duration_seconds', {'endpoint': endpoint}, time.perf_counter() - started)
+    metrics.observe('sql_statements_per_request', {'endpoint': endpoint}, statements)
+    metrics.observe('sql_seconds_per_request', {'endpoint': endpoint}, sql_seconds)
+    return response
+
+
+# Query Budgets
+class QueryBudgetExceeded(Exception):
+    """A request issued more SQL statements than its view allows"""
+
+
+def query_budget(max_statements=None, max_repeats=None):
+    """Set the view's statement budget (and N+1 repeat limit) in place of the defaults"""
+    def decorator(view):
+        view.query_budget = (max_statements, max_repeats)
+        return view
+    return decorator
+
+
+_SQL_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SQL_PARAM_LIST = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+
+
+def sql_shape(statement):
+    """The statement with literals and expanded IN lists collapsed, so repeats compare equal"""
+    shape = _SQL_LITERAL.sub('?', ' '.join(statement.split()))
+    return _SQL_PARAM_LIST.sub('(?, ...)', shape)
+
+
+def check_query_budget(endpoint, statements, shapes):
+    """Return a description of the budget breach for this request, or None"""
+    view = app.view_functions.get(endpoint)
+    max_statements, max_repeats = getattr(view, 'query_budget', (None, None))
+    if endpoint in QUERY_BUDGETS:
+        max_statements = QUERY_BUDGETS[endpoint]
+    max_statements = QUERY_BUDGET_DEFAULT if max_statements is None else max_statements
+    max_repeats = QUERY_REPEAT_LIMIT if max_repeats is None else max_repeats
+    
+    shape, repeats = max(shapes.items(), key=lambda item: item[1], default=('', 0))
+    if statements <= max_statements and repeats <= max_repeats:
+        return None
+    breach = f"{endpoint} issued {statements} SQL statements (budget {max_statements})"
+    if repeats > 1:
+        breach += f"; repeated {repeats} times (limit {max_repeats}): {shape}"
+    return breach
+
+
+@app.after_request
+def _enforce_query_budget(response):
+    """Raise (debug) or log when the request went over its view's query budget"""
+    action = QUERY_BUDGET_ACTION or ('raise' if app.debug else 'log')
+    if action == 'off' or request.endpoint is None or g.get('query_budget_checked'):
+        return response
+    g.query_budget_checked = True  # the error response for a breach passes through here too
+    
+    statements = g.get('sql_stats', (0, 0.0))[0]
+    breach = check_query_budget(request.endpoint, statements, g.get('sql_shapes', {}))
+    if breach:
+        if action == 'raise':
+            raise QueryBudgetExceeded(breach)
+        app.logger.warning('Query budget exceeded: %s', breach)
+    return response
+
 
 # Database Models
 class User(UserMixin, db.Model):
@@ -40,20 +609,44 @@ class Fellow(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     phone_number = db.Column(db.String(20), nullable=False)
+    phone_e164 = db.Column(db.String(20))  # normalized from phone_number on write
     email = db.Column(db.String(120))
     active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     evaluations = db.relationship('Evaluation', backref='fellow', lazy=True)
     assignments = db.relationship('RotationAssignment', backref='fellow', lazy=True)
+    
+    # Partial index: only active fellows are ever listed or sent to
+    __table_args__ = (
+        db.Index('ix_fellow_active', 'id', sqlite_where=db.text('active = 1'), postgresql_where=db.text('active')),
+        db.Index('ux_fellow_phone_e164', 'phone_e164', unique=True),
+    )
+    
+    @db.validates('phone_number')
+    def normalize_phone_number(self, key, phone_number):
+        self.phone_e164 = format_phone_number(phone_number) if phone_number else None
+        return phone_number
 
 
 class Faculty(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     phone_number = db.Column(db.String(20), nullable=False)
+    phone_e164 = db.Column(db.String(20))  # normalized from phone_number on write
     email = db.Column(db.String(120))
     active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    assignments = db.relationship('RotationAssignment', backref='faculty', lazy=True)
+    
+    __table_args__ = (
+        db.Index('ix_faculty_active', 'id', sqlite_where=db.text('active = 1'), postgresql_where=db.text('active')),
+        db.Index('ux_faculty_phone_e164', 'phone_e164', unique=True),
+    )
+    
+    @db.validates('phone_number')
+    def normalize_phone_number(self, key, phone_number):
+        self.phone_e164 = format_phone_number(phone_number) if phone_number else None
+        return phone_number
 
 
 class Survey(db.Model):
@@ -64,195 +657,2387 @@ class Survey(db.Model):
     survey_link = db.Column(db.String(500), nullable=False)
     survey_type = db.Column(db.String(50))
     sms_template = db.Column(db.Text)  # Custom SMS message template  # 'self', 'peer', 'faculty', 'rotation'
+    template_version = db.Column(db.Integer, default=1)  # bumped whenever the rendered text can change
     active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     assignments = db.relationship('RotationAssignment', backref='survey', lazy=True)
+    
+    __table_args__ = (
+        db.Index('ix_survey_active', 'id', sqlite_where=db.text('active = 1'), postgresql_where=db.text('active')),
+    )
+
+
+class RotationBlock(db.Model):
+    """Weekly rotation blocks (typically 7 days, Monday-Sunday)"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)  # e.g., "ICU Week 1 - Jan 6-12, 2025"
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+    notes = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    assignments = db.relationship('RotationAssignment', backref='rotation_block', lazy=True)
+    
+    # Active-block lookups filter on start_date <= today <= end_date
+    __table_args__ = (db.Index('ix_rotation_block_dates', 'start_date', 'end_date'),)
+    
+    def get_friday(self):
+        """Return the Friday date in this rotation block (if any)"""
+        fridays = fridays_between(self.start_date, self.end_date)
+        return fridays[0] if fridays else None
+    
+    def get_fridays(self):
+        """Return all Friday dates in this rotation block (for backward compatibility)"""
+        friday = self.get_friday()
+        return [friday] if friday else []
+    
+    @property
+    def is_active(self):
+        """Check if this block is currently active"""
+        today = datetime.now().date()
+        return self.start_date <= today <= self.end_date
+    
+    @property
+    def is_upcoming(self):
+        """Check if this block is in the future"""
+        today = datetime.now().date()
+        return self.start_date > today
+
+
+def fridays_between(start_date, end_date):
+    """Return every Friday from start_date to end_date inclusive"""
+    first = start_date + timedelta(days=(4 - start_date.weekday()) % 7)  # Friday is 4
+    return [first + timedelta(weeks=week) for week in range((end_date - first).days // 7 + 1)] if first <= end_date else []
+
+
+class RotationAssignment(db.Model):
+    """Assigns fellows to surveys for specific rotation blocks"""
+    id = db.Column(db.Integer, primary_key=True)
+    fellow_id = db.Column(db.Integer, db.ForeignKey('fellow.id'), nullable=True)
+    faculty_id = db.Column(db.Integer, db.ForeignKey('faculty.id'), nullable=True)
+    recipient_type = db.Column(db.String(20), default='fellow')
+    send_date = db.Column(db.Date)
+    survey_id = db.Column(db.Integer, db.ForeignKey('survey.id'), nullable=False)
+    rotation_block_id = db.Column(db.Integer, db.ForeignKey('rotation_block.id'), nullable=False)
+    send_on_fridays = db.Column(db.Boolean, default=True)
+    last_sent = db.Column(db.Date)  # Track last send date to avoid duplicates
+    notes = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Unique constraint: one fellow can't have the same survey twice in the same rotation
+    __table_args__ = (
+        db.UniqueConstraint('fellow_id', 'survey_id', 'rotation_block_id'),
+        # The constraint above never fires for faculty rows, whose fellow_id is NULL
+        db.Index('ux_rotation_assignment_faculty', 'faculty_id', 'survey_id', 'rotation_block_id', unique=True,
+                 sqlite_where=db.text('faculty_id IS NOT NULL'), postgresql_where=db.text('faculty_id IS NOT NULL')),
+        db.Index('ix_rotation_assignment_block_fridays', 'rotation_block_id', 'send_on_fridays'),
+    )
+
+
+
+    
+    def get_recipient(self):
+        """Get the fellow or faculty member"""
+        if self.recipient_type == 'faculty':
+            return self.faculty
+        return self.fellow
+    
+    def get_recipient_name(self):
+        """Get recipient name"""
+        recipient = self.get_recipient()
+        return recipient.name if recipient else "Unknown"
+
+class Evaluation(db.Model):
+    """Log of sent evaluations"""
+    id = db.Column(db.Integer, primary_key=True)
+    fellow_id = db.Column(db.Integer, db.ForeignKey('fellow.id'), nullable=True)
+    faculty_id = db.Column(db.Integer, db.ForeignKey('faculty.id'), nullable=True)
+    recipient_type = db.Column(db.String(20), default='fellow')
+    send_date = db.Column(db.Date)
+    survey_id = db.Column(db.Integer, db.ForeignKey('survey.id'))
+    rotation_assignment_id = db.Column(db.Integer, db.ForeignKey('rotation_assignment.id'))
+    sent_at = db.Column(db.DateTime, default=datetime.utcnow)
+    status = db.Column(db.String(20), default='sent')  # sent, failed, delivered, undelivered, completed
+    message_sid = db.Column(db.String(100))  # Twilio message ID
+    completed_at = db.Column(db.DateTime)
+    notes = db.Column(db.Text)
+    
+    __table_args__ = (
+        db.Index('ix_evaluation_sent_at', 'sent_at', 'id'),  # newest-first listings
+        db.Index('ix_evaluation_status', 'status'),  # dashboard counts
+        db.Index('ix_evaluation_message_sid', 'message_sid'),  # delivery status callbacks
+    )
+
+
+class OutboundMessage(db.Model):
+    """One scheduled text per (assignment, send date); its idempotency key makes sends at-most-once"""
+    id = db.Column(db.Integer, primary_key=True)
+    idempotency_key = db.Column(db.String(64), unique=True, nullable=False)  # '<assignment id>:<send date>'
+    rotation_assignment_id = db.Column(db.Integer, db.ForeignKey('rotation_assignment.id'), nullable=False)
+    send_date = db.Column(db.Date, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='sending')  # sending, sent, retrying, failed
+    attempts = db.Column(db.Integer, nullable=False, default=1)
+    claimed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    next_attempt_at = db.Column(db.DateTime)
+    needs_reconcile = db.Column(db.Boolean, nullable=False, default=False)  # an earlier attempt may have gone out
+    last_error = db.Column(db.Text)
+    message_sid = db.Column(db.String(100))
+    attempt_token = db.Column(db.String(32))  # changes on every claim; only its holder may send
+    to_number = db.Column(db.String(20))  # recipient and text of the first attempt, reused by retries
+    body = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.Index('ix_outbound_message_due', 'status', 'next_attempt_at'),)
+
+
+class SendRun(db.Model):
+    """One Friday send run; its counts are filled in when the background run finishes"""
+    id = db.Column(db.Integer, primary_key=True)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    pid = db.Column(db.Integer)  # the process sending it
+    queued = db.Column(db.Integer, nullable=False, default=0)
+    success = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    retrying = db.Column(db.Integer, nullable=False, default=0)
+    already_sent = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+
+
+class SendCalendar(db.Model):
+    """Materialized send schedule: one row per (date, assignment) that goes out that day"""
+    send_date = db.Column(db.Date, primary_key=True)
+    rotation_assignment_id = db.Column(db.Integer, db.ForeignKey('rotation_assignment.id'), primary_key=True)
+    
+    __table_args__ = (db.Index('ix_send_calendar_assignment', 'rotation_assignment_id'),)
+
+
+class DashboardCounter(db.Model):
+    """Precomputed dashboard totals, updated in the same transaction as the rows they count.
+    
+    Rows named '<name>_version' are change counters that let per-process
+    caches notice when another worker has changed the data behind them.
+    """
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+
+@login_manager.user_loader
+def load_user(user_id):
+    return User.query.get(int(user_id))
+
+
+# Dashboard Counters
+DASHBOARD_COUNTERS = {
+    'active_fellows': lambda: Fellow.query.filter_by(active=True).count(),
+    'active_faculty': lambda: Faculty.query.filter_by(active=True).count(),
+    'active_surveys': lambda: Survey.query.filter_by(active=True).count(),
+    'evaluations_sent': lambda: Evaluation.query.filter_by(status='sent').count(),
+    'evaluations_failed': lambda: Evaluation.query.filter_by(status='failed').count(),
+    'evaluations_delivered': lambda: Evaluation.query.filter_by(status='delivered').count(),
+    'evaluations_undelivered': lambda: Evaluation.query.filter_by(status='undelivered').count(),
+}
+
+_ACTIVE_COUNTERS = {
+    Fellow: 'active_fellows',
+    Faculty: 'active_faculty',
+    Survey: 'active_surveys',
+}
+
+
+def rebuild_dashboard_counters():
+    """Recount every dashboard counter from scratch"""
+    with serialized_write():
+        values = {name: count() for name, count in DASHBOARD_COUNTERS.items()}
+        DashboardCounter.query.filter(DashboardCounter.name.in_(DASHBOARD_COUNTERS)).delete()
+        db.session.add_all(DashboardCounter(name=name, value=value) for name, value in values.items())
+    return values
+
+
+def get_dashboard_counters():
+    """Return all dashboard counters, rebuilding them if any are missing"""
+    values = dict(db.session.query(DashboardCounter.name, DashboardCounter.value))
+    if not set(DASHBOARD_COUNTERS) <= set(values):
+        values = rebuild_dashboard_counters()
+    return values
+
+
+def bump_dashboard_counters(deltas, connection=None):
+    """Apply counter deltas inside the caller's transaction"""
+    execute = connection.execute if connection is not None else db.session.execute
+    for name, delta in deltas.items():
+        if delta and name in DASHBOARD_COUNTERS:
+            execute(
+                db.update(DashboardCounter)
+                .where(DashboardCounter.name == name)
+                .values(value=DashboardCounter.value + delta)
+            )
+
+
+def bump_version(name, connection=None):
+    """Increment the '<name>_version' change counter inside the caller's transaction"""
+    execute = connection.execute if connection is not None else db.session.execute
+    key = f'{name}_version'
+    result = execute(
+        db.update(DashboardCounter)
+        .where(DashboardCounter.name == key)
+        .values(value=DashboardCounter.value + 1)
+    )
+    if result.rowcount == 0:
+        execute(db.insert(DashboardCounter).values(name=key, value=1))
+
+
+def get_version(name, connection=None):
+    """Return the current value of a '<name>_version' change counter"""
+    execute = connection.execute if connection is not None else db.session.execute
+    value = execute(db.select(DashboardCounter.value).where(DashboardCounter.name == f'{name}_version')).scalar()
+    return value or 0
+
+
+def _was_changed(obj, attr):
+    """Return (old, new) for a changed attribute, or None if it did not change"""
+    history = db.inspect(obj).attrs[attr].history
+    if history.added and history.deleted:
+        return history.deleted[0], history.added[0]
+    return None
+
+
+@db.event.listens_for(db.Session, 'after_flush')
+def _update_dashboard_counters(session, flush_context):
+    """Keep dashboard counters in step with ORM inserts, updates and deletes"""
+    deltas = {}
+    
+    def bump(name, amount):
+        deltas[name] = deltas.get(name, 0) + amount
+    
+    for obj in session.new:
+        if type(obj) in _ACTIVE_COUNTERS and obj.active is not False:
+            bump(_ACTIVE_COUNTERS[type(obj)], 1)
+        elif isinstance(obj, Evaluation):
+            bump(f'evaluations_{obj.status}', 1)
+    
+    for obj in session.dirty:
+        if type(obj) in _ACTIVE_COUNTERS:
+            change = _was_changed(obj, 'active')
+            if change and (change[0] is not False) != (change[1] is not False):
+                bump(_ACTIVE_COUNTERS[type(obj)], 1 if change[1] is not False else -1)
+        elif isinstance(obj, Evaluation):
+            change = _was_changed(obj, 'status')
+            if change:
+                bump(f'evaluations_{change[0]}', -1)
+                bump(f'evaluations_{change[1]}', 1)
+    
+    for obj in session.deleted:
+        if type(obj) in _ACTIVE_COUNTERS and obj.active is not False:
+            bump(_ACTIVE_COUNTERS[type(obj)], -1)
+        elif isinstance(obj, Evaluation):
+            bump(f'evaluations_{obj.status}', -1)
+    
+    if any(deltas.values()):
+        bump_dashboard_counters(deltas, session.connection())
+    
+    changed = session.new | session.dirty | session.deleted
+    if any(isinstance(obj, RotationBlock) for obj in changed):
+        bump_version('rotation_blocks', session.connection())
+        session.info['rotation_blocks_changed'] = True
+
+
+@db.event.listens_for(db.Session, 'after_commit')
+def _note_block_changes(session):
+    """Have the block calendar check its version again once this process commits block changes"""
+    if session.info.pop('rotation_blocks_changed', False):
+        block_calendar.changed()
+
+
+# Send Calendar
+def assignment_send_dates(send_date, send_on_fridays, block_start, block_end):
+    """Return the dates an assignment goes out.
+    
+    Assignments with a send_date go out on that date (if it falls inside the
+    block); the rest go out on every Friday of the block. Assignments not
+    marked send_on_fridays never go out automatically.
+    """
+    if not send_on_fridays:
+        return []
+    if send_date:
+        return [send_date] if block_start <= send_date <= block_end else []
+    return fridays_between(block_start, block_end)
+
+
+def refresh_send_calendar(assignment_ids=(), block_ids=(), connection=None, rebuild=False):
+    """Recompute send-calendar rows for the given assignments and blocks (or all of them)"""
+    execute = connection.execute if connection is not None else db.session.execute
+    assignment_ids, block_ids = list(assignment_ids), list(block_ids)
+    if not (rebuild or assignment_ids or block_ids):
+        return 0
+    
+    query = db.select(
+        RotationAssignment.id, RotationAssignment.send_date, RotationAssignment.send_on_fridays,
+        RotationBlock.start_date, RotationBlock.end_date
+    ).join(RotationBlock, RotationBlock.id == RotationAssignment.rotation_block_id)
+    
+    if rebuild:
+        execute(db.delete(SendCalendar))
+    else:
+        scope = db.or_(
+            RotationAssignment.id.in_(assignment_ids),
+            RotationAssignment.rotation_block_id.in_(block_ids)
+        )
+        query = query.where(scope)
+        execute(db.delete(SendCalendar).where(db.or_(
+            SendCalendar.rotation_assignment_id.in_(assignment_ids),
+            SendCalendar.rotation_assignment_id.in_(db.select(RotationAssignment.id).where(scope))
+        )))
+    
+    rows = [
+        {'send_date': day, 'rotation_assignment_id': assignment_id}
+        for assignment_id, send_date, send_on_fridays, block_start, block_end in execute(query)
+        for day in assignment_send_dates(send_date, send_on_fridays, block_start, block_end)
+    ]
+    if rows:
+        execute(db.insert(SendCalendar), rows)
+    return len(rows)
+
+
+def rebuild_send_calendar():
+    """Recompute the whole send calendar from assignments and blocks"""
+    with serialized_write():
+        return refresh_send_calendar(rebuild=True)
+
+
+def ensure_send_calendar():
+    """Build the send calendar if it is empty but there are assignments (e.g. after upgrading)"""
+    calendar_empty = not db.session.query(db.select(SendCalendar).exists()).scalar()
+    if calendar_empty and db.session.query(db.select(RotationAssignment).exists()).scalar():
+        rebuild_send_calendar()
+
+
+@db.event.listens_for(db.Session, 'after_flush')
+def _update_send_calendar(session, flush_context):
+    """Keep the send calendar in step with ORM changes to assignments and blocks"""
+    assignment_ids = set()
+    block_ids = set()
+    
+    for obj in session.new:
+        if isinstance(obj, RotationAssignment):
+            assignment_ids.add(obj.id)
+    
+    for obj in session.dirty:
+        if isinstance(obj, RotationAssignment) and any(
+            _was_changed(obj, attr) for attr in ('send_date', 'send_on_fridays', 'rotation_block_id')
+        ):
+            assignment_ids.add(obj.id)
+        elif isinstance(obj, RotationBlock) and any(
+            _was_changed(obj, attr) for attr in ('start_date', 'end_date')
+        ):
+            block_ids.add(obj.id)
+    
+    for obj in session.deleted:
+        if isinstance(obj, RotationAssignment):
+            assignment_ids.add(obj.id)
+        elif isinstance(obj, RotationBlock):
+            block_ids.add(obj.id)
+    
+    if assignment_ids or block_ids:
+        refresh_send_calendar(assignment_ids, block_ids, session.connection())
+
+
+# Block Calendar
+class BlockCalendar:
+    """Sorted in-memory interval index over rotation blocks.
+    
+    Blocks are kept ordered by start date along with a running maximum of
+    end dates, so overlap and active-block lookups are a bisect plus a
+    short backwards walk instead of a table scan. The index reloads itself
+    whenever the 'rotation_blocks' version changes, which happens on every
+    block insert, update or delete in any process.
+    
+    The index is an immutable (version, blocks, starts, max_end) tuple that
+    is swapped in with one assignment, so readers never need the lock and
+    never see half of a reload. The version is checked once per request (or
+    app context), and again after this process commits block changes.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = (None, (), (), ())  # version, (start_date, end_date, id) sorted, starts, max_end
+        self._changes = 0  # block changes this process has committed
+    
+    def changed(self):
+        """Note that this process committed block changes"""
+        self._changes += 1
+    
+    def _refresh(self):
+        """Return the current index, reloading it first if the blocks changed.
+        
+        The version and the blocks are read together on their own connection,
+        so only committed blocks are cached: a caller's unflushed edits (and
+        version bumps that a rollback would hand out again) never are.
+        """
+        index = self._index
+        checked = (self, self._changes)
+        if has_app_context() and g.get('block_calendar_checked') == checked:
+            return index
+        if has_app_context():
+            g.block_calendar_checked = checked
+        
+        with db.engine.connect() as conn:
+            version = get_version('rotation_blocks', conn)
+            if version == index[0]:
+                return index
+            
+            with self._lock:
+                blocks = tuple(tuple(block) for block in conn.execute(
+                    db.select(RotationBlock.start_date, RotationBlock.end_date, RotationBlock.id)
+                    .order_by(RotationBlock.start_date, RotationBlock.id)
+                ))
+                
+                max_end = []
+                for _, end_date, _ in blocks:
+                    max_end.append(max(end_date, max_end[-1]) if max_end else end_date)
+                
+                index = (version, blocks, tuple(block[0] for block in blocks), tuple(max_end))
+                self._index = index
+        return index
+    
+    @staticmethod
+    def _overlapping(index, start_date, end_date):
+        """Ids of indexed blocks that share at least one day with [start_date, end_date]"""
+        _, blocks, starts, max_end = index
+        ids = []
+        i = bisect.bisect_right(starts, end_date) - 1
+        while i >= 0 and max_end[i] >= start_date:
+            if blocks[i][1] >= start_date:
+                ids.append(blocks[i][2])
+            i -= 1
+        ids.reverse()
+        return ids
+    
+    def overlapping(self, start_date, end_date, exclude_id=None):
+        """Return ids of blocks overlapping [start_date, end_date], oldest first"""
+        index = self._refresh()
+        return [block_id for block_id in self._overlapping(index, start_date, end_date) if block_id != exclude_id]
+    
+    def active_block_ids(self, day=None):
+        """Return ids of blocks that include `day` (default today)"""
+        day = day or datetime.now().date()
+        return self.overlapping(day, day)
+    
+    def active_blocks(self, day=None):
+        """Return the RotationBlock rows that include `day`, loaded by primary key"""
+        ids = self.active_block_ids(day)
+        if not ids:
+            return []
+        return RotationBlock.query.filter(RotationBlock.id.in_(ids)).order_by(RotationBlock.start_date).all()
+    
+    def create_weeks(self, start_date, num_weeks, name_template, allow_overlap=False):
+        """Create consecutive 7-day blocks with a single bulk INSERT.
+        
+        Weeks that overlap an existing block are skipped unless
+        allow_overlap is set. Returns (created_count, skipped_names).
+        """
+        index = self._refresh()
+        
+        rows = []
+        skipped = []
+        current_start = start_date
+        for week_num in range(1, num_weeks + 1):
+            # Calculate end date (6 days later for 7-day week)
+            current_end = current_start + timedelta(days=6)
+            
+            # Format the name
+            block_name = name_template.replace('{week}', str(week_num))
+            block_name = block_name.replace('{start}', current_start.strftime('%b %d'))
+            block_name = block_name.replace('{end}', current_end.strftime('%b %d'))
+            block_name = block_name.replace('{year}', current_start.strftime('%Y'))
+            
+            if not allow_overlap and self._overlapping(index, current_start, current_end):
+                skipped.append(block_name)
+            else:
+                rows.append({'name': block_name, 'start_date': current_start, 'end_date': current_end})
+            
+            # Move to next week
+            current_start = current_end + timedelta(days=1)
+        
+        if rows:
+            db.session.execute(db.insert(RotationBlock), rows)
+            bump_version('rotation_blocks')
+            db.session.info['rotation_blocks_changed'] = True
+        db.session.commit()
+        
+        return len(rows), skipped
+
+
+block_calendar = BlockCalendar()
+
+
+# Helper Functions
+def format_phone_number(phone):
+    """Format phone number to E.164 format"""
+    # Remove all non-digit characters
+    digits = ''.join(filter(str.isdigit, phone))
+    
+    # Add +1 if it's a 10-digit US number
+    if len(digits) == 10:
+        return f'+1{digits}'
+    elif len(digits) == 11 and digits.startswith('1'):
+        return f'+{digits}'
+    else:
+        return f'+{digits}'
+
+
+def is_valid_phone_number(phone):
+    """True if the phone number has the digits of a US (10) or international (11-15) number"""
+    digits = ''.join(filter(str.isdigit, phone or ''))
+    return len(digits) == 10 or 11 <= len(digits) <= 15
+
+
+def find_recipient_by_phone(phone):
+    """Return the fellow or faculty member with this phone number (any format), or None"""
+    phone_e164 = format_phone_number(phone)
+    return (Fellow.query.filter_by(phone_e164=phone_e164).first()
+            or Faculty.query.filter_by(phone_e164=phone_e164).first())
+
+
+def phone_in_use(phone, exclude=None):
+    """Return whoever else already has this phone number, or None"""
+    with db.session.no_autoflush:
+        recipient = find_recipient_by_phone(phone)
+    return recipient if recipient is not None and recipient is not exclude else None
+
+
+def backfill_phone_numbers():
+    """Normalize phone_e164 for every fellow and faculty row in bulk; returns rows updated"""
+    updated = 0
+    with serialized_write():
+        for model in (Fellow, Faculty):
+            rows = [
+                {'row_id': row_id, 'phone_e164': format_phone_number(phone_number)}
+                for row_id, phone_number, phone_e164 in db.session.query(model.id, model.phone_number, model.phone_e164)
+                if phone_number and format_phone_number(phone_number) != phone_e164
+            ]
+            if rows:
+                db.session.execute(
+                    db.update(model.__table__)
+                    .where(model.__table__.c.id == db.bindparam('row_id'))
+                    .values(phone_e164=db.bindparam('phone_e164')),
+                    rows
+                )
+            updated += len(rows)
+    return updated
+
+
+_twilio_client = None
+_twilio_client_pid = None
+_twilio_client_lock = threading.Lock()
+
+
+def get_twilio_client():
+    """Return the process-wide Twilio client, creating it on first use.
+    
+    The client keeps a pooled keep-alive HTTP session sized for the send
+    worker pool, so messages reuse TLS connections. It is rebuilt after a
+    fork so gunicorn workers never share sockets.
+    """
+    global _twilio_client, _twilio_client_pid
+    
+    pid = os.getpid()
+    if _twilio_client is not None and _twilio_client_pid == pid:
+        return _twilio_client
+    
+    with _twilio_client_lock:
+        if _twilio_client is None or _twilio_client_pid != pid:
+            http_client = TwilioHttpClient(pool_connections=True)
+            # TwilioHttpClient only validates a single number, so set the
+            # (connect, read) tuple after construction
+            http_client.timeout = (TWILIO_CONNECT_TIMEOUT, TWILIO_READ_TIMEOUT)
+            http_client.session.mount('https://', HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=max(send_worker_count(), 1),
+                max_retries=0
+            ))
+            _twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, http_client=http_client)
+            _twilio_client_pid = pid
+    
+    return _twilio_client
+
+
+# Sender Pool
+# Twilio error codes that mean "slow down" rather than "this message is bad"
+THROTTLING_ERROR_CODES = {20429, 14107}
+
+
+def is_throttling_error(error):
+    """True if the provider rejected a request because we are sending too fast"""
+    return isinstance(error, TwilioRestException) and (error.status == 429 or error.code in THROTTLING_ERROR_CODES)
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` acquisitions per second, in bursts of up to `capacity`"""
+    
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    def reserve(self):
+        """Take a token, returning how many seconds the caller must wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+    
+    def try_acquire(self):
+        """Take a token if one is available right now; never blocks"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+    
+    def acquire(self):
+        """Block until a token is available"""
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+    
+    def set_rate(self, rate):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+
+class Sender:
+    """One sending identity (a phone number or a messaging service) with its own rate limit.
+    
+    The rate adapts: it is halved, and the sender rests, each time the
+    provider throttles it, and creeps back up to the configured rate with
+    every successful send.
+    """
+    
+    def __init__(self, options, rate=SMS_SENDER_RATE, burst=SMS_SENDER_BURST):
+        self.options = options  # passed to messages.create: from_ or messaging_service_sid
+        self.name = next(iter(options.values()))
+        self.max_rate = rate
+        self.bucket = TokenBucket(rate, burst)
+        self._lock = threading.Lock()
+        self._strikes = 0
+        self.resting_until = 0.0
+    
+    def throttled(self):
+        with self._lock:
+            if self.resting_until > time.monotonic():
+                return  # a request sent before the rest began; already backing off
+            self._strikes += 1
+            self.bucket.set_rate(max(self.max_rate / 16, self.bucket.rate / 2))
+            cooldown = min(60.0, SMS_THROTTLE_COOLDOWN * 2 ** (self._strikes - 1))
+            self.resting_until = max(self.resting_until, time.monotonic() + cooldown)
+    
+    def succeeded(self):
+        if self.bucket.rate >= self.max_rate and not self._strikes:
+            return
+        with self._lock:
+            self._strikes = 0
+            self.bucket.set_rate(min(self.max_rate, self.bucket.rate + self.max_rate / 10))
+
+
+class SenderPool:
+    """Spreads sends across senders, keeping each recipient on the same sender.
+    
+    Recipients are assigned by rendezvous hashing, so each one always
+    prefers the same sender and adding a sender only moves its share of
+    recipients. A sender that is resting after being throttled is skipped
+    in favour of the recipient's next choice, so throughput scales with
+    the number of senders and degrades gracefully when one is throttled.
+    """
+    
+    def __init__(self, senders):
+        self.senders = senders
+    
+    def _preference(self, to):
+        return sorted(self.senders, reverse=True, key=lambda sender: hashlib.blake2b(
+            f'{sender.name}|{to}'.encode(), digest_size=8).digest())
+    
+    def sender_for(self, to):
+        """The recipient's preferred sender that isn't resting (or the one that rests least)"""
+        ranked = self._preference(to)
+        now = time.monotonic()
+        for sender in ranked:
+            if sender.resting_until <= now:
+                return sender
+        return min(ranked, key=lambda sender: sender.resting_until)
+    
+    def send(self, to, send, attempts=3):
+        """Call send(**sender_options) once the recipient's sender has capacity.
+        
+        A throttled attempt rests that sender and is tried again (on the
+        recipient's next choice if the rest is long), up to `attempts` times.
+        """
+        for attempt in range(1, attempts + 1):
+            sender = self.sender_for(to)
+            rest = sender.resting_until - time.monotonic()
+            if rest > 0:
+                time.sleep(rest)
+            sender.bucket.acquire()
+            try:
+                result = send(**sender.options)
+            except Exception as e:
+                if not is_throttling_error(e):
+                    raise
+                sender.throttled()
+                if attempt == attempts:
+                    raise
+            else:
+                sender.succeeded()
+                return result
+
+
+_sender_pool = None
+_sender_pool_pid = None
+_sender_pool_lock = threading.Lock()
+
+
+def get_sender_pool():
+    """Return this process's sender pool, built from configuration on first use"""
+    global _sender_pool, _sender_pool_pid
+    
+    pid = os.getpid()
+    with _sender_pool_lock:
+        if _sender_pool is None or _sender_pool_pid != pid:
+            if TWILIO_MESSAGING_SERVICE_SID:
+                senders = [Sender({'messaging_service_sid': TWILIO_MESSAGING_SERVICE_SID})]
+            else:
+                senders = [Sender({'from_': number}) for number in TWILIO_SENDER_NUMBERS]
+            _sender_pool = SenderPool(senders)
+            _sender_pool_pid = pid
+    return _sender_pool
+
+
+def send_worker_count():
+    """Parallel sends for a run: enough workers to keep every sender in the pool busy"""
+    return max(SMS_MAX_WORKERS, 2 * len(get_sender_pool().senders))
+
+
+# SMS Transports
+class SmsTransport:
+    """Interface for sending texts.
+    
+    Implementations return message objects with Twilio's attributes (sid,
+    to, body, status, date_created) and raise Twilio's exceptions, so error
+    classification, throttling and retries work the same with any of them.
+    """
+    
+    name = None
+    
+    def send(self, to, body, **options):
+        """Send one text; `options` are Twilio messages.create arguments (from_, status_callback, ...)"""
+        return self._timed('messages.create', self._send, to, body, **options)
+    
+    def recent_messages(self, to, limit=20):
+        """The most recent messages sent to `to`, newest first"""
+        return self._timed('messages.list', self._recent_messages, to, limit)
+    
+    def _timed(self, endpoint, call, *args, **kwargs):
+        """Make one provider API call, observing its latency by endpoint and outcome"""
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            result = call(*args, **kwargs)
+            outcome = 'ok'
+            return result
+        finally:
+            metrics.observe('sms_send_seconds', {'transport': self.name, 'endpoint': endpoint, 'outcome': outcome},
+                            time.perf_counter() - started)
+    
+    def _send(self, to, body, **options):
+        raise NotImplementedError
+    
+    def _recent_messages(self, to, limit):
+        raise NotImplementedError
+
+
+class TwilioTransport(SmsTransport):
+    """Sends through the Twilio REST API"""
+    
+    name = 'twilio'
+    
+    def _send(self, to, body, **options):
+        return get_twilio_client().messages.create(to=to, body=body, **options)
+    
+    def _recent_messages(self, to, limit):
+        return get_twilio_client().messages.list(to=to, limit=limit)
+
+
+class FakeMessage:
+    """A message accepted by FakeTransport"""
+    
+    def __init__(self, to, body, sender):
+        self.sid = 'SM' + os.urandom(16).hex()
+        self.to = to
+        self.body = body
+        self.from_ = sender
+        self.status = 'queued'
+        self.date_created = datetime.utcnow()
+
+
+class FakeTransport(SmsTransport):
+    """Simulates Twilio locally so send runs can be load-tested without texting anyone.
+    
+    Each send sleeps for a jittered latency, then fails with a 5xx or a
+    read timeout at the configured rates (a timed-out message is still
+    recorded, as it would be when Twilio accepted it but the response was
+    lost), and answers 429 when a sender exceeds its rate limit.
+    """
+    
+    name = 'fake'
+    
+    def __init__(self, latency_ms=SMS_FAKE_LATENCY_MS, error_rate=SMS_FAKE_ERROR_RATE,
+                 timeout_rate=SMS_FAKE_TIMEOUT_RATE, rate_limit=SMS_FAKE_RATE_LIMIT):
+        self.latency = latency_ms / 1000
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.rate_limit = rate_limit
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._messages = {}
+        self.sent = 0
+    
+    def _bucket(self, sender):
+        with self._lock:
+            if sender not in self._buckets:
+                # Providers count per second, so allow a second's worth in a burst
+                self._buckets[sender] = TokenBucket(self.rate_limit, self.rate_limit)
+            return self._buckets[sender]
+    
+    def _send(self, to, body, **options):
+        sender = options.get('messaging_service_sid') or options.get('from_')
+        if self.latency:
+            time.sleep(random.uniform(0.5, 1.5) * self.latency)
+        
+        if self.rate_limit and not self._bucket(sender).try_acquire():
+            raise TwilioRestException(429, '/Messages.json', msg='Too Many Requests', code=20429, method='POST')
+        if random.random() < self.error_rate:
+            raise TwilioRestException(503, '/Messages.json', msg='Service Unavailable', method='POST')
+        
+        message = FakeMessage(to, body, sender)
+        with self._lock:
+            self._messages.setdefault(to, []).append(message)
+            self.sent += 1
+        
+        if random.random() < self.timeout_rate:
+            raise requests.exceptions.ReadTimeout('Fake transport: read timed out')
+        return message
+    
+    def _recent_messages(self, to, limit):
+        with self._lock:
+            return list(reversed(self._messages.get(to, [])))[:limit]
+
+
+SMS_TRANSPORTS = {'twilio': TwilioTransport, 'fake': FakeTransport}
+
+_sms_transport = None
+_sms_transport_lock = threading.Lock()
+
+
+def get_sms_transport():
+    """Return the process-wide SMS transport selected by SMS_TRANSPORT"""
+    global _sms_transport
+    
+    with _sms_transport_lock:
+        if _sms_transport is None:
+            if SMS_TRANSPORT not in SMS_TRANSPORTS:
+                raise ValueError(f"Unknown SMS_TRANSPORT '{SMS_TRANSPORT}'; expected one of {', '.join(SMS_TRANSPORTS)}")
+            _sms_transport = SMS_TRANSPORTS[SMS_TRANSPORT]()
+    return _sms_transport
+
+
+class EvaluationLogWriter:
+    """Buffers Evaluation rows and last_sent updates and writes them in bulk.
+    
+    Every entry is appended to a per-process journal file before it is
+    buffered, so a message that was sent is never lost if the process dies
+    before the next flush: journals of dead processes are replayed into the
+    database when the app starts (and again before a process first writes
+    its own). The journal is truncated after each successful flush.
+    """
+    
+    def __init__(self, journal_dir, batch_size=EVAL_LOG_BATCH_SIZE,
+                 flush_interval=EVAL_LOG_FLUSH_INTERVAL, fsync=EVAL_LOG_FSYNC):
+        self.journal_dir = journal_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self._lock = threading.RLock()
+        self._buffer = []
+        self._pending_sent = {}  # rotation_assignment_id -> last_sent date
+        self._timer = None
+        self._journal_fd = None
+        self._pid = None
+    
+    def _journal_path(self, pid):
+        return os.path.join(self.journal_dir, f'evaluations.{pid}.journal')
+    
+    def _open_journal(self):
+        """Open this process's journal, replaying any left behind by dead processes first"""
+        pid = os.getpid()
+        if self._journal_fd is not None and self._pid == pid:
+            return
+        
+        # After a fork the parent's buffer belongs to the parent
+        self._buffer = []
+        self._pending_sent = {}
+        self._timer = None
+        
+        os.makedirs(self.journal_dir, exist_ok=True)
+        try:
+            self.recover()
+        except Exception:
+            # Never fail a send over someone else's journal; it stays claimed for the next start-up
+            app.logger.exception('Replaying evaluation log journals failed')
+        self._journal_fd = os.open(self._journal_path(pid), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        self._pid = pid
+    
+    def record(self, rotation_assignment=None, last_sent=None, **fields):
+        """Journal and buffer one Evaluation row (and the assignment's last_sent date and outbox update)"""
+        fields.setdefault('sent_at', datetime.utcnow())
+        entry = dict(fields)
+        entry['rotation_assignment_id'] = rotation_assignment.id if rotation_assignment else None
+        entry['last_sent'] = last_sent
+        
+        line = json.dumps(entry, default=lambda value: value.isoformat()) + '\n'
+        
+        with self._lock:
+            self._open_journal()
+            os.write(self._journal_fd, line.encode('utf-8'))
+            if self.fsync:
+                os.fsync(self._journal_fd)
+            
+            self._buffer.append(entry)
+            if rotation_assignment and last_sent:
+                self._pending_sent[rotation_assignment.id] = last_sent
+            
+            if len(self._buffer) >= self.batch_size:
+                self._flush_quietly()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self._flush_quietly)
+                self._timer.daemon = True
+                self._timer.start()
+    
+    def _flush_quietly(self):
+        """Flush from the send path; a failure leaves the entries buffered and journaled"""
+        try:
+            self.flush()
+        except Exception:
+            app.logger.exception('Evaluation log flush failed; entries kept for retry')
+    
+    def is_pending_sent(self, assignment_id, day):
+        """True if a send for this assignment on `day` is buffered but not yet flushed"""
+        return self._pending_sent.get(assignment_id) == day
+    
+    def flush(self):
+        """Write all buffered entries in a single transaction"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._buffer or self._pid != os.getpid():
+                return 0
+            if _write_lock_holder() is not None:
+                # Joining the caller's transaction would drop the entries if it rolls back
+                self._timer = threading.Timer(self.flush_interval, self._flush_quietly)
+                self._timer.daemon = True
+                self._timer.start()
+                return 0
+            
+            entries = self._buffer
+            with app.app_context():
+                self._write(entries)
+            
+            self._buffer = []
+            self._pending_sent = {}
+            os.ftruncate(self._journal_fd, 0)
+            return len(entries)
+    
+    def _write(self, entries, skip_existing=False):
+        """Bulk insert Evaluation rows and bulk update last_sent and outbox rows, then commit once"""
+        # Outbox updates are idempotent, so replay them even for rows already logged
+        outbox_updates = []
+        for entry in entries:
+            outbox = entry.get('outbox')
+            if outbox:
+                outbox = dict(outbox)
+                if isinstance(outbox.get('next_attempt_at'), str):
+                    outbox['next_attempt_at'] = datetime.fromisoformat(outbox['next_attempt_at'])
+                outbox_updates.append(outbox)
+        
+        with serialized_write():
+            # Checked under the write lock, so two processes replaying one journal can't both insert it
+            if skip_existing:
+                entries = self._without_logged(entries)
+            
+            rows = []
+            last_sent_by_day = {}
+            status_counts = {}
+            for entry in entries:
+                row = dict(entry)
+                row.pop('outbox', None)
+                last_sent = row.pop('last_sent', None)
+                if isinstance(row.get('sent_at'), str):
+                    row['sent_at'] = datetime.fromisoformat(row['sent_at'])
+                if isinstance(last_sent, str):
+                    last_sent = datetime.fromisoformat(last_sent).date()
+                if last_sent and row.get('rotation_assignment_id'):
+                    last_sent_by_day.setdefault(last_sent, []).append(row['rotation_assignment_id'])
+                rows.append(row)
+                counter = f"evaluations_{row.get('status') or 'sent'}"
+                status_counts[counter] = status_counts.get(counter, 0) + 1
+            
+            if rows:
+                db.session.execute(db.insert(Evaluation), rows)
+            for day, assignment_ids in last_sent_by_day.items():
+                db.session.execute(
+                    db.update(RotationAssignment)
+                    .where(RotationAssignment.id.in_(assignment_ids))
+                    .values(last_sent=day)
+                )
+            if outbox_updates:
+                update_outbound_messages(outbox_updates)
+            bump_dashboard_counters(status_counts)
+    
+    def _without_logged(self, entries):
+        """Drop journal entries that already reached the database before a crash"""
+        sids = [entry['message_sid'] for entry in entries if entry.get('message_sid')]
+        logged_sids = set()
+        if sids:
+            logged_sids = {sid for (sid,) in db.session.query(Evaluation.message_sid)
+                           .filter(Evaluation.message_sid.in_(sids))}
+        
+        remaining = []
+        for entry in entries:
+            if entry.get('message_sid'):
+                if entry['message_sid'] in logged_sids:
+                    continue
+            elif Evaluation.query.filter_by(
+                rotation_assignment_id=entry.get('rotation_assignment_id'),
+                sent_at=datetime.fromisoformat(entry['sent_at'])
+            ).first():
+                continue
+            remaining.append(entry)
+        return remaining
+    
+    def _claim_dead_journals(self):
+        """Rename each journal left by a dead process so only this process replays it.
+        
+        A journal is claimed by renaming it to '<journal>.<our pid>.recovering';
+        rename is atomic, so when several workers start at once exactly one
+        of them gets each journal. Claims left by a recoverer that died
+        are claimed again.
+        """
+        pid = os.getpid()
+        claimed = []
+        candidates = [(path, int(os.path.basename(path).split('.')[1])) for path in glob.glob(self._journal_path('*'))]
+        candidates += [(path, int(os.path.basename(path).split('.')[3])) for path in
+                       glob.glob(os.path.join(self.journal_dir, 'evaluations.*.journal.*.recovering'))]
+        for path, owner in candidates:
+            if owner == pid:
+                if path.endswith('.recovering') or self._pid == pid:
+                    continue  # being replayed, or our own live journal
+            elif _pid_alive(owner):
+                continue
+            journal = path if path.endswith('.journal') else path.rsplit('.', 2)[0]
+            target = f'{journal}.{pid}.recovering'
+            try:
+                os.rename(path, target)
+            except FileNotFoundError:
+                continue  # another process claimed it first
+            claimed.append(target)
+        return claimed
+    
+    def recover(self):
+        """Replay journals of processes that died before flushing; returns the entries replayed"""
+        recovered = 0
+        with self._lock:
+            for path in self._claim_dead_journals():
+                with open(path, encoding='utf-8') as journal:
+                    entries = [json.loads(line) for line in journal if line.strip()]
+                if entries:
+                    with app.app_context():
+                        self._write(entries, skip_existing=True)
+                    recovered += len(entries)
+                os.remove(path)
+        return recovered
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+evaluation_log = EvaluationLogWriter(
+    os.environ.get('EVAL_LOG_JOURNAL_DIR', os.path.join(app.instance_path, 'journal'))
+)
+atexit.register(evaluation_log.flush)
+
+
+# SMS Templates
+DEFAULT_SMS_TEMPLATE = "Hi {name}, please complete your {survey}: {link}"
+SMS_PLACEHOLDERS = ('name', 'link', 'survey', 'date')
+_PLACEHOLDER_RE = re.compile(r'\{(\w+)\}')
+
+
+def unknown_placeholders(template):
+    """Return the {placeholders} in a template that will not be filled in"""
+    return sorted({name for name in _PLACEHOLDER_RE.findall(template or '') if name not in SMS_PLACEHOLDERS})
+
+
+class CompiledSmsTemplate:
+    """An SMS template parsed once into literal text and per-message fields.
+    
+    {link} and {survey} are fixed for a survey, so they are folded into the
+    literal text at compile time; only {name} and {date} are filled per render.
+    Unknown placeholders are left in the text as-is.
+    """
+    
+    def __init__(self, template, survey):
+        constants = {'link': survey.survey_link, 'survey': survey.name}
+        self.parts = []  # literal strings and ('name',) / ('date',) fields
+        literal = []
+        position = 0
+        for match in _PLACEHOLDER_RE.finditer(template):
+            literal.append(template[position:match.start()])
+            field = match.group(1)
+            if field in constants:
+                literal.append(constants[field])
+            elif field in SMS_PLACEHOLDERS:
+                self.parts.append(''.join(literal))
+                self.parts.append((field,))
+                literal = []
+            else:
+                literal.append(match.group(0))
+            position = match.end()
+        literal.append(template[position:])
+        self.parts.append(''.join(literal))
+    
+    def render(self, name, date):
+        values = {'name': name, 'date': date}
+        return ''.join(part if isinstance(part, str) else values[part[0]] for part in self.parts)
+    
+    def render_batch(self, names, date=None):
+        """Render one message per name, formatting the date once for the whole batch"""
+        date = date or datetime.now().strftime('%B %d, %Y')
+        return [self.render(name, date) for name in names]
+
+
+class SmsTemplateCache:
+    """Per-process cache of compiled templates keyed by (survey id, template_version)"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._compiled = {}
+    
+    def get(self, survey):
+        key = (survey.id, survey.template_version or 1)
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            compiled = CompiledSmsTemplate(survey.sms_template or DEFAULT_SMS_TEMPLATE, survey)
+            with self._lock:
+                # Drop compiled forms of older versions of this survey
+                for stale in [k for k in self._compiled if k[0] == survey.id]:
+                    del self._compiled[stale]
+                self._compiled[key] = compiled
+        return compiled
+    
+    def invalidate(self, survey_id):
+        with self._lock:
+            for stale in [k for k in self._compiled if k[0] == survey_id]:
+                del self._compiled[stale]
+
+
+sms_templates = SmsTemplateCache()
+
+
+# SMS Segments
+GSM7_BASIC = set(
+    '@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !"#¤%&\'()*+,-./0123456789:;<=>?'
+    '¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà'
+)
+GSM7_EXTENDED = set('^{}\\[~]|€\f')  # each costs two septets
+
+# Common characters pasted from word processors and phones, with GSM-7 stand-ins
+GSM7_REPLACEMENTS = {
+    '\u2018': "'", '\u2019': "'", '\u201a': "'", '\u201b': "'", '\u2032': "'",
+    '\u201c': '"', '\u201d': '"', '\u201e': '"', '\u201f': '"', '\u2033': '"',
+    '\u2013': '-', '\u2014': '-', '\u2015': '-', '\u2212': '-', '\u2010': '-', '\u2011': '-',
+    '\u2026': '...', '\u2022': '-', '\u00b7': '-',
+    '\u00a0': ' ', '\u2002': ' ', '\u2003': ' ', '\u2009': ' ', '\u200b': '', '\ufeff': '',
+    '\t': ' ', '\u00ab': '"', '\u00bb': '"', '\u2039': "'", '\u203a': "'",
+    'Ł': 'L', 'ł': 'l', 'Đ': 'D', 'đ': 'd', 'ı': 'i', 'œ': 'oe', 'Œ': 'OE',
+}
+
+SAMPLE_RECIPIENT_NAME = 'Sample Recipient Name'
+
+
+def analyze_sms(text):
+    """Return the encoding, billed length and segment count for an SMS body.
+    
+    GSM-7 messages fit 160 septets in one segment (153 per segment when
+    split); any character outside GSM-7 switches the whole message to UCS-2,
+    which fits 70 UTF-16 units (67 when split).
+    """
+    non_gsm = sorted({char for char in text if char not in GSM7_BASIC and char not in GSM7_EXTENDED})
+    if non_gsm:
+        encoding = 'UCS-2'
+        length = len(text.encode('utf-16-le')) // 2
+        single, multi = 70, 67
+    else:
+        encoding = 'GSM-7'
+        length = len(text) + sum(1 for char in text if char in GSM7_EXTENDED)
+        single, multi = 160, 153
+    
+    segments = 1 if length <= single else -(-length // multi)
+    return {'encoding': encoding, 'length': length, 'segments': segments, 'non_gsm': non_gsm}
+
+
+def transliterate_gsm7(text):
+    """Replace characters outside GSM-7 with the closest GSM-7 text (or '?')"""
+    result = []
+    for char in text:
+        if char in GSM7_BASIC or char in GSM7_EXTENDED:
+            result.append(char)
+        elif char in GSM7_REPLACEMENTS:
+            result.append(GSM7_REPLACEMENTS[char])
+        else:
+            # Strip accents GSM-7 lacks, e.g. 'á' -> 'a'
+            base = ''.join(c for c in unicodedata.normalize('NFKD', char) if not unicodedata.combining(c))
+            result.append(base if base and all(c in GSM7_BASIC for c in base) else '?')
+    return ''.join(result)
+
+
+def analyze_sms_template(survey):
+    """Analyze a survey's SMS as rendered for a sample recipient"""
+    message = CompiledSmsTemplate(survey.sms_template or DEFAULT_SMS_TEMPLATE, survey).render(
+        SAMPLE_RECIPIENT_NAME, datetime.now().strftime('%B %d, %Y')
+    )
+    return analyze_sms(message)
+
+
+def flash_sms_analysis(survey):
+    """Tell the admin how a survey's messages will be encoded and billed"""
+    analysis = analyze_sms_template(survey)
+    message = (f'Each text will be about {analysis["length"]} {analysis["encoding"]} characters, '
+               f'billed as {analysis["segments"]} segment(s).')
+    if analysis['non_gsm']:
+        message += (f' These characters force UCS-2: {" ".join(analysis["non_gsm"])} '
+                    '- tick "Convert to GSM-7" to replace them.')
+    flash(message, 'warning' if analysis['non_gsm'] or analysis['segments'] > 1 else 'info')
+
+
+def render_sms_message(recipient, survey, custom_message=None):
+    """Build the SMS text for one recipient"""
+    if custom_message:
+        message = CompiledSmsTemplate(custom_message, survey).render_batch([recipient.name])[0]
+    else:
+        message = sms_templates.get(survey).render_batch([recipient.name])[0]
+    return transliterate_gsm7(message) if SMS_FORCE_GSM7 else message
+
+
+def render_plan_messages(plan):
+    """Fill in item['message'] for every send plan item, one batch per survey"""
+    date = datetime.now().strftime('%B %d, %Y')
+    by_survey = {}
+    for item in plan:
+        by_survey.setdefault(item['survey'].id, []).append(item)
+    
+    for items in by_survey.values():
+        compiled = sms_templates.get(items[0]['survey'])
+        for item, message in zip(items, compiled.render_batch([item['recipient'].name for item in items], date)):
+            item['message'] = transliterate_gsm7(message) if SMS_FORCE_GSM7 else message
+    return plan
+
+
+def send_evaluation_sms(recipient, survey, rotation_assignment=None, custom_message=None, message_body=None,
+                        outbox=None):
+    """Send evaluation SMS via Twilio.
+    
+    `outbox` is the claimed idempotency key of a scheduled send (see
+    claim_sends); the outcome of the attempt is recorded on it so transient
+    failures are queued for retry.
+    """
+    recipient_type = 'faculty' if isinstance(recipient, Faculty) else 'fellow'
+    recipient_fields = {'recipient_type': recipient_type, f'{recipient_type}_id': recipient.id}
+    
+    try:
+        transport = get_sms_transport()
+        
+        # Build message, unless it was already rendered as part of a batch
+        if message_body is None:
+            message_body = render_sms_message(recipient, survey, custom_message)
+        
+        to = recipient.phone_e164 or format_phone_number(recipient.phone_number)
+        if outbox and outbox.get('body'):
+            # Resend exactly what the first attempt sent, so reconciling can recognise it
+            to, message_body = outbox['to'], outbox['body']
+        
+        message = None
+        if outbox and outbox['needs_reconcile']:
+            # An earlier attempt may have reached Twilio; never send it twice
+            message = find_sent_message(transport, to, message_body, outbox['since'])
+        
+        if message is None:
+            options = {'status_callback': TWILIO_STATUS_CALLBACK_URL} if TWILIO_STATUS_CALLBACK_URL else {}
+            
+            def send(**sender):
+                if outbox:
+                    confirm_claim(outbox, to, message_body)
+                return transport.send(to, message_body, **sender, **options)
+            
+            message = get_sender_pool().send(to, send)
+        
+        # Log the evaluation and update last_sent date on the assignment
+        evaluation_log.record(
+            rotation_assignment=rotation_assignment,
+            last_sent=datetime.now().date() if rotation_assignment else None,
+            **recipient_fields,
+            survey_id=survey.id,
+            status='sent',
+            message_sid=message.sid,
+            outbox=_outbox_result(outbox, message_sid=message.sid) if outbox else None
+        )
+        
+        return True, message.sid
+    except SendClaimLost:
+        raise
+    except Exception as e:
+        notes = str(e)
+        outbox_update = _outbox_result(outbox, error=e) if outbox else None
+        if outbox_update and outbox_update['status'] == 'retrying':
+            notes += f" (attempt {outbox['attempts']} of {RETRY_MAX_ATTEMPTS}, will retry)"
+        
+        # Log failed evaluation
+        evaluation_log.record(
+            rotation_assignment=rotation_assignment,
+            **recipient_fields,
+            survey_id=survey.id if survey else None,
+            status='failed',
+            notes=notes,
+            outbox=outbox_update
+        )
+        
+        return False, str(e)
+
+
+def _send_plan_query():
+    """Assignments joined to their survey, block and recipient, keeping only active surveys and recipients"""
+    return db.session.query(RotationAssignment, Survey, RotationBlock, Fellow, Faculty).join(
+        Survey, Survey.id == RotationAssignment.survey_id
+    ).join(
+        RotationBlock, RotationBlock.id == RotationAssignment.rotation_block_id
+    ).outerjoin(
+        Fellow, db.and_(RotationAssignment.recipient_type != 'faculty', Fellow.id == RotationAssignment.fellow_id)
+    ).outerjoin(
+        Faculty, db.and_(RotationAssignment.recipient_type == 'faculty', Faculty.id == RotationAssignment.faculty_id)
+    ).filter(
+        Survey.active == True,
+        db.or_(Fellow.active == True, Faculty.active == True)
+    )
+
+
+def _plan_items(query):
+    """Turn rows of _send_plan_query into plan item dicts"""
+    plan = []
+    for assignment, survey, block, fellow, faculty in query:
+        plan.append({
+            'assignment': assignment,
+            'recipient': faculty if assignment.recipient_type == 'faculty' else fellow,
+            'recipient_type': assignment.recipient_type,
+            'survey': survey,
+            'block': block
+        })
+    return plan
+
+
+def build_send_plan(today=None, include_already_sent=False):
+    """Return everything due to send today as a list of plan items.
+    
+    Today's assignments are an equality lookup on the send calendar, joined
+    in the same query to their recipients, surveys and blocks, with the
+    active-recipient and active-survey rules applied in SQL. Each item is a
+    dict with 'assignment', 'recipient', 'recipient_type', 'survey' and 'block'.
+    """
+    today = today or datetime.now().date()
+    ensure_send_calendar()
+    
+    query = _send_plan_query().join(
+        SendCalendar, SendCalendar.rotation_assignment_id == RotationAssignment.id
+    ).filter(SendCalendar.send_date == today)
+    
+    if not include_already_sent:
+        query = query.filter(db.or_(RotationAssignment.last_sent.is_(None), RotationAssignment.last_sent != today))
+    
+    return _plan_items(query.order_by(RotationBlock.start_date, RotationAssignment.id))
+
+
+def _send_plan_item(item, today):
+    """Send one plan item's SMS in its own app context (and therefore its own DB session)"""
+    with app.app_context():
+        assignment = item['assignment']
+        outbox = item.get('outbox')
+        
+        # Check if already sent today
+        if assignment.last_sent == today or evaluation_log.is_pending_sent(assignment.id, today):
+            if outbox:
+                with serialized_write():
+                    update_outbound_messages([_outbox_update(outbox['key'], 'sent')])
+            return 'already_sent'
+        
+        try:
+            success, result = send_evaluation_sms(item['recipient'], item['survey'], assignment,
+                                                  message_body=item.get('message'), outbox=outbox)
+        except SendClaimLost:
+            return 'already_sent'
+        if success:
+            return 'success'
+        return 'retrying' if outbox and outbox['status'] == 'retrying' else 'failed'
+
+
+def dispatch_evaluations(plan, today=None, max_workers=None, claim=True):
+    """Send SMS for a send plan in parallel using a bounded worker pool.
+    
+    Each item's idempotency key is claimed first (see claim_sends), so
+    items another run already sent or is retrying are counted as already
+    sent; pass claim=False for items that were claimed by the caller.
+    Plan objects must be fully loaded; they are read (never lazy-loaded)
+    from the worker threads. Returns a dict with 'success', 'failed',
+    'retrying' (failed, but queued for retry) and 'already_sent' counts.
+    """
+    today = today or datetime.now().date()
+    counts = {'success': 0, 'failed': 0, 'retrying': 0, 'already_sent': 0}
+    if claim:
+        plan, counts['already_sent'] = claim_sends(plan, today)
+    if not plan:
+        return counts
+    
+    render_plan_messages(plan)
+    
+    workers = max(1, min(max_workers or send_worker_count(), len(plan)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for outcome in executor.map(lambda item: _send_plan_item(item, today), plan):
+            if outcome in counts:
+                counts[outcome] += 1
+    
+    # Make the whole run visible before the caller redirects to tracking
+    evaluation_log.flush()
+    
+    if counts['retrying']:
+        schedule_retries()
+    
+    return counts
+
+
+def dispatch_in_background(plan, today, run_id=None):
+    """Send a plan that claim_sends already claimed from a background thread; returns the thread.
+    
+    Sends are paced by the senders' rate limits, so a big run can outlast a
+    request timeout. The outcome is recorded on SendRun `run_id`. If the
+    process stops first, the unsent keys are left 'sending' and
+    process_retries picks them up once they go stale.
+    """
+    def run():
+        try:
+            counts = dispatch_evaluations(plan, today, claim=False)
+        except Exception as e:
+            app.logger.exception('Background send run failed')
+            if run_id is not None:
+                finish_send_run(run_id, error=str(e))
+        else:
+            app.logger.info('Background send run finished: %s', counts)
+            if run_id is not None:
+                finish_send_run(run_id, counts)
+    
+    thread = threading.Thread(target=run, name='send-run', daemon=True)
+    thread.start()
+    return thread
+
+
+def finish_send_run(run_id, counts=None, error=None):
+    """Record how a send run ended: its dispatch counts, or the error that stopped it"""
+    values = {'finished_at': datetime.utcnow(), 'error': error}
+    if counts:
+        values.update(success=counts['success'], failed=counts['failed'], retrying=counts['retrying'],
+                      already_sent=SendRun.already_sent + counts['already_sent'])
+    with app.app_context(), serialized_write():
+        db.session.query(SendRun).filter_by(id=run_id).update(values)
+
+
+# Send Retries
+def send_key(assignment_id, send_date):
+    """Idempotency key of an assignment's scheduled text on a given date"""
+    return f'{assignment_id}:{send_date.isoformat()}'
+
+
+def classify_send_error(error):
+    """Return 'transient', 'ambiguous' or 'permanent' for an exception raised while sending.
+    
+    Transient errors (throttling, a connection that never opened) are safe
+    to retry. Ambiguous ones (a read timeout, a dropped connection, a 5xx)
+    are retried too, but the request may have reached Twilio, so the retry
+    first checks for a message that already went out.
+    """
+    if isinstance(error, TwilioRestException):
+        if error.status == 429:
+            return 'transient'
+        return 'ambiguous' if error.status >= 500 else 'permanent'
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return 'transient'
+    if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+        return 'ambiguous'
+    return 'permanent'
+
+
+def retry_delay(attempt):
+    """Seconds to wait after failed attempt number `attempt`: exponential backoff with jitter"""
+    ceiling = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1))
+    return random.uniform(ceiling / 2, ceiling)
+
+
+def find_sent_message(transport, to, body, since):
+    """Return a message the transport accepted for `to` with this body since `since`, or None"""
+    for message in transport.recent_messages(to):
+        created = message.date_created.replace(tzinfo=None) if message.date_created else None
+        if (message.body == body and created and created >= since - timedelta(minutes=1)
+                and message.status not in ('failed', 'canceled')):
+            return message
+    return None
+
+
+class SendClaimLost(Exception):
+    """Raised instead of sending when another attempt has claimed the same outbox row"""
+
+
+def confirm_claim(outbox, to, body):
+    """Check, right before the text goes out, that this attempt still owns its outbox row.
+    
+    A send left 'sending' longer than RETRY_STALE_AFTER (for example queued
+    behind the rate limiter) can be reclaimed by process_retries, which
+    hands the row a new attempt_token. The compare-and-swap on the token
+    makes sure only the latest claim sends. It also records the recipient
+    and body, so retries and reconciliation use the text that went out.
+    """
+    token = secrets.token_hex(16)
+    table = OutboundMessage.__table__
+    with app.app_context(), serialized_write():
+        result = db.session.execute(
+            db.update(table)
+            .where(table.c.idempotency_key == outbox['key'], table.c.attempt_token == outbox['token'],
+                   table.c.status == 'sending')
+            .values(attempt_token=token, claimed_at=datetime.utcnow(), to_number=to, body=body)
+        )
+    if result.rowcount == 0:
+        raise SendClaimLost(outbox['key'])
+    outbox['token'] = token
+
+
+def _outbox_update(key, status, next_attempt_at=None, needs_reconcile=False, last_error=None, message_sid=None):
+    return {
+        'key': key,
+        'status': status,
+        'next_attempt_at': next_attempt_at,
+        'needs_reconcile': needs_reconcile,
+        'last_error': last_error,
+        'message_sid': message_sid
+    }
+
+
+def _outbox_result(outbox, error=None, message_sid=None):
+    """Outbox update for the outcome of one attempt; also sets outbox['status']"""
+    if error is None:
+        outbox['status'] = 'sent'
+        return _outbox_update(outbox['key'], 'sent', message_sid=message_sid)
+    
+    kind = classify_send_error(error)
+    needs_reconcile = outbox['needs_reconcile'] or kind == 'ambiguous'
+    if kind != 'permanent' and outbox['attempts'] < RETRY_MAX_ATTEMPTS:
+        outbox['status'] = 'retrying'
+        next_attempt_at = datetime.utcnow() + timedelta(seconds=retry_delay(outbox['attempts']))
+        return _outbox_update(outbox['key'], 'retrying', next_attempt_at, needs_reconcile, str(error))
+    
+    outbox['status'] = 'failed'
+    return _outbox_update(outbox['key'], 'failed', None, needs_reconcile, str(error))
+
+
+def update_outbound_messages(updates):
+    """Apply _outbox_update dicts in one executemany; call inside serialized_write"""
+    table = OutboundMessage.__table__
+    db.session.execute(
+        db.update(table)
+        .where(table.c.idempotency_key == db.bindparam('key'))
+        .values(
+            status=db.bindparam('new_status'),
+            next_attempt_at=db.bindparam('new_next_attempt_at'),
+            needs_reconcile=db.bindparam('new_needs_reconcile'),
+            last_error=db.bindparam('new_last_error'),
+            message_sid=db.bindparam('new_message_sid')
+        ),
+        [{'key': update['key'], **{f'new_{name}': value for name, value in update.items() if name != 'key'}}
+         for update in updates]
+    )
+
+
+def _claim(outbound, now):
+    """The outbox dict handed to send_evaluation_sms for a claimed OutboundMessage"""
+    return {
+        'key': outbound.idempotency_key,
+        'assignment_id': outbound.rotation_assignment_id,
+        'send_date': outbound.send_date,
+        'attempts': outbound.attempts,
+        'needs_reconcile': outbound.needs_reconcile,
+        'since': outbound.created_at or now,
+        'status': 'sending',
+        'token': outbound.attempt_token,
+        'to': outbound.to_number,
+        'body': outbound.body
+    }
+
+
+def claim_sends(plan, send_date):
+    """Take ownership of each plan item's idempotency key before it is sent.
+    
+    Runs as one write transaction, so when two runs (or two workers) try
+    to send the same assignment on the same date only one gets the key.
+    New keys are claimed outright, and keys whose earlier sends failed for
+    good are reclaimed so an admin can resend after fixing a phone number.
+    Keys already sent, in flight or queued for retry are left alone.
+    Sets item['outbox'] on each claimed item; returns (claimed, skipped_count).
+    """
+    now = datetime.utcnow()
+    items = {send_key(item['assignment'].id, send_date): item for item in plan}
+    claimed = []
+    
+    with app.app_context(), serialized_write():
+        existing = {outbound.idempotency_key: outbound for outbound in
+                    OutboundMessage.query.filter(OutboundMessage.idempotency_key.in_(list(items)))}
+        new_rows = []
+        for key, item in items.items():
+            outbound = existing.get(key)
+            if outbound is None:
+                outbound = OutboundMessage(idempotency_key=key, rotation_assignment_id=item['assignment'].id,
+                                           send_date=send_date, status='sending', attempts=1,
+                                           needs_reconcile=False, claimed_at=now, created_at=now,
+                                           attempt_token=secrets.token_hex(16))
+                new_rows.append(outbound)
+            elif outbound.status == 'failed':
+                # A new run by hand gets a fresh set of retries, with the current phone number and text
+                outbound.status = 'sending'
+                outbound.attempts = 1
+                outbound.claimed_at = now
+                outbound.next_attempt_at = None
+                outbound.attempt_token = secrets.token_hex(16)
+                outbound.to_number = outbound.body = None
+            else:
+                continue
+            item['outbox'] = _claim(outbound, now)
+            claimed.append(item)
+        
+        if new_rows:
+            db.session.execute(db.insert(OutboundMessage), [
+                {column.key: getattr(outbound, column.key) for column in OutboundMessage.__table__.columns
+                 if column.key != 'id'}
+                for outbound in new_rows
+            ])
+    
+    return claimed, len(plan) - len(claimed)
+
+
+def claim_due_retries(now=None, limit=500):
+    """Claim retries that are due, plus sends left 'sending' by a process that died"""
+    now = now or datetime.utcnow()
+    stale = now - timedelta(seconds=RETRY_STALE_AFTER)
+    claims = []
+    
+    with app.app_context(), serialized_write():
+        due = OutboundMessage.query.filter(db.or_(
+            db.and_(OutboundMessage.status == 'retrying', OutboundMessage.next_attempt_at <= now),
+            db.and_(OutboundMessage.status == 'sending', OutboundMessage.claimed_at <= stale)
+        )).order_by(OutboundMessage.next_attempt_at).limit(limit).all()
+        
+        for outbound in due:
+            if outbound.status == 'sending':
+                # It may or may not have gone out before the process died
+                outbound.needs_reconcile = True
+            outbound.status = 'sending'
+            outbound.attempts += 1
+            outbound.claimed_at = now
+            outbound.attempt_token = secrets.token_hex(16)
+            claims.append(_claim(outbound, now))
+    
+    return claims
+
+
+def process_retries(now=None, limit=500):
+    """Resend every queued retry that is due; returns the summed dispatch counts"""
+    counts = {'success': 0, 'failed': 0, 'retrying': 0, 'already_sent': 0}
+    claims = claim_due_retries(now, limit)
+    if not claims:
+        return counts
+    
+    with app.app_context():
+        items = {item['assignment'].id: item for item in _plan_items(
+            _send_plan_query().filter(RotationAssignment.id.in_({claim['assignment_id'] for claim in claims}))
+        )}
+    
+    plans = {}
+    cancelled = []
+    for claim in claims:
+        item = items.get(claim['assignment_id'])
+        if item is None:
+            cancelled.append(_outbox_update(claim['key'], 'failed', None, claim['needs_reconcile'],
+                                            'Assignment, recipient or survey is no longer active'))
+        else:
+            plans.setdefault(claim['send_date'], []).append(dict(item, outbox=claim))
+    
+    if cancelled:
+        with app.app_context(), serialized_write():
+            update_outbound_messages(cancelled)
+        counts['failed'] += len(cancelled)
+    
+    for send_date, plan in plans.items():
+        for name, value in dispatch_evaluations(plan, send_date, claim=False).items():
+            counts[name] += value
+    return counts
+
+
+_retry_timer = None
+_retry_timer_due = None
+_retry_timer_lock = threading.Lock()
+
+
+def schedule_retries(min_delay=0):
+    """Arm this process's background timer for the earliest queued retry or stale send.
+    
+    Claims are atomic, so it is safe for every worker (and a cron job
+    running 'flask process-retries') to process the queue.
+    """
+    global _retry_timer, _retry_timer_due
+    
+    with app.app_context():
+        next_retry, oldest_claim = db.session.query(
+            db.func.min(db.case((OutboundMessage.status == 'retrying', OutboundMessage.next_attempt_at))),
+            db.func.min(db.case((OutboundMessage.status == 'sending', OutboundMessage.claimed_at)))
+        ).filter(OutboundMessage.status.in_(('retrying', 'sending'))).one()
+    
+    # A send still 'sending' when it goes stale was abandoned (e.g. a run cut short by a restart)
+    due = [next_retry] if next_retry is not None else []
+    if oldest_claim is not None:
+        due.append(oldest_claim + timedelta(seconds=RETRY_STALE_AFTER))
+    if not due:
+        return
+    next_at = min(due)
+    
+    with _retry_timer_lock:
+        if _retry_timer is not None and _retry_timer.is_alive() and _retry_timer_due <= next_at:
+            return
+        if _retry_timer is not None:
+            _retry_timer.cancel()
+        delay = max(min_delay, (next_at - datetime.utcnow()).total_seconds())
+        _retry_timer = threading.Timer(delay, _run_due_retries)
+        _retry_timer.daemon = True
+        _retry_timer_due = next_at
+        _retry_timer.start()
+
+
+def _run_due_retries():
+    global _retry_timer
+    with _retry_timer_lock:
+        _retry_timer = None
+    try:
+        process_retries()
+    except Exception:
+        app.logger.exception('Processing queued SMS retries failed')
+        schedule_retries(min_delay=RETRY_BASE_DELAY)
+    else:
+        schedule_retries()
+
+
+# Delivery Status Callbacks
+# Twilio MessageStatus -> Evaluation.status; statuses not listed don't change the row
+DELIVERY_STATUSES = {
+    'delivered': 'delivered',
+    'undelivered': 'undelivered',
+    'failed': 'undelivered',
+}
+
+# Only move an evaluation forward: never overwrite a final or completed status
+_STATUS_RANK = {'sent': 0, 'delivered': 1, 'undelivered': 1, 'completed': 2, 'failed': 2}
+
+
+class DeliveryStatusBuffer:
+    """Collects status callbacks in memory and applies them in bulk.
+    
+    Updates are keyed by message SID (latest wins) and flushed with one
+    executemany UPDATE by size or after a short interval. Callbacks that
+    arrive before their Evaluation row has been written are kept and
+    retried for unmatched_ttl seconds.
+    """
+    
+    def __init__(self, batch_size=STATUS_BATCH_SIZE, flush_interval=STATUS_FLUSH_INTERVAL, unmatched_ttl=300):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.unmatched_ttl = unmatched_ttl
+        self._lock = threading.RLock()
+        self._pending = {}  # message_sid -> {'status', 'notes', 'received'}
+        self._timer = None
+    
+    def add(self, message_sid, status, error_code=None):
+        with self._lock:
+            self._pending[message_sid] = {
+                'status': status,
+                'notes': f'Delivery error {error_code}' if error_code else None,
+                'received': datetime.utcnow()
+            }
+            if len(self._pending) >= self.batch_size:
+                self._flush_quietly()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self._flush_quietly)
+                self._timer.daemon = True
+                self._timer.start()
+    
+    def _flush_quietly(self):
+        try:
+            self.flush()
+        except Exception:
+            app.logger.exception('Delivery status flush failed; updates kept for retry')
+    
+    def flush(self):
+        """Apply all pending updates in one transaction; returns the number applied"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                return 0
+            if _write_lock_holder() is not None:
+                # Joining the caller's transaction would drop the updates if it rolls back
+                self._timer = threading.Timer(self.flush_interval, self._flush_quietly)
+                self._timer.daemon = True
+                self._timer.start()
+                return 0
+            
+            pending = self._pending
+            with app.app_context():
+                applied, unmatched = self._write(pending)
+            
+            cutoff = datetime.utcnow() - timedelta(seconds=self.unmatched_ttl)
+            self._pending = {sid: update for sid, update in pending.items()
+                             if sid in unmatched and update['received'] >= cutoff}
+            if self._pending:
+                self._timer = threading.Timer(self.flush_interval, self._flush_quietly)
+                self._timer.daemon = True
+                self._timer.start()
+            return applied
+    
+    def _write(self, pending):
+        rows = []
+        deltas = {}
+        with serialized_write():
+            current = dict(db.session.query(Evaluation.message_sid, Evaluation.status)
+                           .filter(Evaluation.message_sid.in_(list(pending))))
+            for sid, update in pending.items():
+                old_status = current.get(sid)
+                if old_status is None or old_status == update['status']:
+                    continue
+                if _STATUS_RANK.get(old_status, 0) >= _STATUS_RANK[update['status']]:
+                    continue
+                rows.append({'sid': sid, 'new_status': update['status'], 'new_notes': update['notes']})
+                deltas[f'evaluations_{old_status}'] = deltas.get(f'evaluations_{old_status}', 0) - 1
+                deltas[f'evaluations_{update["status"]}'] = deltas.get(f'evaluations_{update["status"]}', 0) + 1
+            
+            if rows:
+                table = Evaluation.__table__
+                db.session.execute(
+                    db.update(table)
+                    .where(table.c.message_sid == db.bindparam('sid'))
+                    .values(status=db.bindparam('new_status'),
+                            notes=db.func.coalesce(db.bindparam('new_notes'), table.c.notes)),
+                    rows
+                )
+                bump_dashboard_counters(deltas)
+        
+        unmatched = set(pending) - set(current)
+        return len(rows), unmatched
+
+
+delivery_statuses = DeliveryStatusBuffer()
+atexit.register(delivery_statuses.flush)
+
+
+# Synthetic Data
+SYNTHETIC_FIRST_NAMES = ['Ava', 'Ben', 'Chloe', 'Daniel', 'Elena', 'Farid', 'Grace', 'Hiro', 'Isabel', 'Jamal',
+                         'Kiara', 'Liam', 'Maya', 'Noah', 'Olivia', 'Priya', 'Quinn', 'Rosa', 'Samir', 'Tara',
+                         'Uma', 'Victor', 'Wen', 'Ximena', 'Yusuf', 'Zoë', 'José', 'Łucja', 'Siobhán', 'Renée']
+SYNTHETIC_LAST_NAMES = ['Alvarez', 'Brown', 'Chen', 'Dubois', 'Evans', 'Fischer', 'García', 'Haddad', 'Ivanova',
+                        'Johnson', 'Kowalski', 'Lee', 'Müller', "O'Brien", 'Patel', 'Nguyen', 'Rossi', 'Smith',
+                        'Tanaka', 'Williams']
+SYNTHETIC_AREA_CODES = ['813', '727', '941', '407', '305', '312', '212', '415', '617', '206']
+SYNTHETIC_PHONE_FORMATS = ['({area}) {exchange}-{line}', '{area}-{exchange}-{line}', '{area}.{exchange}.{line}',
+                           '+1 {area} {exchange} {line}', '1{area}{exchange}{line}']
+SYNTHETIC_SURVEYS = [
+    ('Fellow Self-Evaluation', 'self', None),
+    ('Faculty Evaluation of Fellow', 'faculty', 'Hi {name}, please evaluate this week ({date}): {link}'),
+    ('Rotation Feedback', 'rotation', 'Hello {name}! Your {survey} is ready: {link} Thank you!'),
+    ('Peer Evaluation', 'peer', '{name}, time for your {survey}: {link}'),
+]
+# Evaluation outcomes, weighted roughly like production
+SYNTHETIC_STATUSES = ['delivered'] * 80 + ['sent'] * 8 + ['undelivered'] * 5 + ['failed'] * 3 + ['completed'] * 4
+
+
+def synthetic_phone(rng, index):
+    """A phone number unique to `index`, in one of the formats people actually type"""
+    number = f'{2000000 + index:07d}'
+    return rng.choice(SYNTHETIC_PHONE_FORMATS).format(
+        area=rng.choice(SYNTHETIC_AREA_CODES), exchange=number[:3], line=number[3:]
+    )
+
+
+def _executemany_insert(table, columns, rows):
+    """Insert value tuples with one DBAPI executemany, skipping SQLAlchemy's per-row parameter handling"""
+    connection = db.session.connection()
+    dialect = connection.dialect
+    if dialect.paramstyle not in ('qmark', 'format', 'pyformat'):
+        db.session.execute(db.insert(table), [dict(zip(columns, row)) for row in rows])
+        return
+    
+    # Apply only the type conversions the driver needs (e.g. datetimes on SQLite)
+    processors = [(position, process) for position, process in enumerate(
+        table.c[name].type.bind_processor(dialect) for name in columns
+    ) if process is not None]
+    if processors:
+        rows = [list(row) for row in rows]
+        for row in rows:
+            for position, process in processors:
+                if row[position] is not None:
+                    row[position] = process(row[position])
+    
+    placeholder = '?' if dialect.paramstyle == 'qmark' else '%s'
+    connection.exec_driver_sql(
+        f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({', '.join([placeholder] * len(columns))})",
+        [tuple(row) for row in rows]
+    )
 
 
-class RotationBlock(db.Model):
-    """Weekly rotation blocks (typically 7 days, Monday-Sunday)"""
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)  # e.g., "ICU Week 1 - Jan 6-12, 2025"
-    start_date = db.Column(db.Date, nullable=False)
-    end_date = db.Column(db.Date, nullable=False)
-    notes = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    assignments = db.relationship('RotationAssignment', backref='rotation_block', lazy=True)
+def generate_dataset(seed=None, fellows=300, faculty=100, surveys=3, weeks=104, per_block=20,
+                     evaluations=100000, today=None, chunk_size=50000):
+    """Bulk load a synthetic dataset into an empty database; returns the row counts.
     
-    def get_friday(self):
-        """Return the Friday date in this rotation block (if any)"""
-        current_date = self.start_date
-        while current_date <= self.end_date:
-            if current_date.weekday() == 4:  # Friday is 4
-                return current_date
-            current_date += timedelta(days=1)
-        return None
+    Weekly rotation blocks run from weeks/2 weeks ago to weeks/2 from now.
+    Each block gets `per_block` random fellows on the first survey and
+    half as many faculty on the second. Evaluations are spread over the
+    assignments of past blocks and dated on their block's Friday. The
+    same seed always produces the same data.
+    """
+    rng = random.Random(seed)
+    today = today or datetime.now().date()
+    first_monday = today - timedelta(days=today.weekday(), weeks=weeks // 2)
+    surveys = max(1, min(surveys, len(SYNTHETIC_SURVEYS)))
     
-    def get_fridays(self):
-        """Return all Friday dates in this rotation block (for backward compatibility)"""
-        friday = self.get_friday()
-        return [friday] if friday else []
+    # Insert through the Core tables: ORM bulk inserts leave out NULL values,
+    # which splits a batch into one statement per distinct set of columns
+    db.session.execute(db.insert(Survey.__table__), [
+        {'name': name, 'survey_type': survey_type, 'sms_template': template,
+         'survey_link': f'https://example.com/surveys/{index + 1}'}
+        for index, (name, survey_type, template) in enumerate(SYNTHETIC_SURVEYS[:surveys])
+    ])
+    for model, count, offset in ((Fellow, fellows, 0), (Faculty, faculty, fellows)):
+        rows = []
+        for index in range(offset, offset + count):
+            phone = synthetic_phone(rng, index)
+            rows.append({
+                'name': f'{rng.choice(SYNTHETIC_FIRST_NAMES)} {rng.choice(SYNTHETIC_LAST_NAMES)}',
+                'phone_number': phone,
+                'phone_e164': format_phone_number(phone),
+                'email': f'{model.__tablename__}{index}@example.com',
+                'active': rng.random() >= 0.05
+            })
+        if rows:
+            db.session.execute(db.insert(model.__table__), rows)
+    db.session.execute(db.insert(RotationBlock.__table__), [
+        {'name': f'Week {week + 1} - {first_monday + timedelta(weeks=week):%b %d, %Y}',
+         'start_date': first_monday + timedelta(weeks=week),
+         'end_date': first_monday + timedelta(weeks=week, days=6)}
+        for week in range(weeks)
+    ])
     
-    @property
-    def is_active(self):
-        """Check if this block is currently active"""
-        today = datetime.now().date()
-        return self.start_date <= today <= self.end_date
+    survey_ids = [survey_id for (survey_id,) in db.session.query(Survey.id).order_by(Survey.id)]
+    fellow_ids = [fellow_id for (fellow_id,) in db.session.query(Fellow.id)]
+    faculty_ids = [faculty_id for (faculty_id,) in db.session.query(Faculty.id)]
+    assignments = []
+    for block_id, start_date in db.session.query(RotationBlock.id, RotationBlock.start_date).order_by(RotationBlock.id):
+        friday = start_date + timedelta(days=4)
+        last_sent = friday if friday < today else None
+        for fellow_id in rng.sample(fellow_ids, min(per_block, len(fellow_ids))):
+            assignments.append({'fellow_id': fellow_id, 'faculty_id': None, 'recipient_type': 'fellow',
+                                'survey_id': survey_ids[0], 'rotation_block_id': block_id, 'last_sent': last_sent})
+        for faculty_id in rng.sample(faculty_ids, min(per_block // 2, len(faculty_ids))):
+            assignments.append({'fellow_id': None, 'faculty_id': faculty_id, 'recipient_type': 'faculty',
+                                'survey_id': survey_ids[min(1, len(survey_ids) - 1)], 'rotation_block_id': block_id,
+                                'last_sent': last_sent})
+    if assignments:
+        db.session.execute(db.insert(RotationAssignment.__table__), assignments)
     
-    @property
-    def is_upcoming(self):
-        """Check if this block is in the future"""
-        today = datetime.now().date()
-        return self.start_date > today
-
-
-class RotationAssignment(db.Model):
-    """Assigns fellows to surveys for specific rotation blocks"""
-    id = db.Column(db.Integer, primary_key=True)
-    fellow_id = db.Column(db.Integer, db.ForeignKey('fellow.id'), nullable=True)
-    faculty_id = db.Column(db.Integer, db.ForeignKey('faculty.id'), nullable=True)
-    recipient_type = db.Column(db.String(20), default='fellow')
-    send_date = db.Column(db.Date)
-    survey_id = db.Column(db.Integer, db.ForeignKey('survey.id'), nullable=False)
-    rotation_block_id = db.Column(db.Integer, db.ForeignKey('rotation_block.id'), nullable=False)
-    send_on_fridays = db.Column(db.Boolean, default=True)
-    last_sent = db.Column(db.Date)  # Track last send date to avoid duplicates
-    notes = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Evaluations go to past assignments only, sent on their block's Friday morning
+    past = db.session.query(
+        RotationAssignment.id, RotationAssignment.recipient_type, RotationAssignment.fellow_id,
+        RotationAssignment.faculty_id, RotationAssignment.survey_id, RotationAssignment.last_sent
+    ).filter(RotationAssignment.last_sent.isnot(None)).all()
+    # Building the evaluation indexes once at the end is far cheaper than
+    # maintaining them through millions of inserts
+    evaluation_indexes = list(Evaluation.__table__.indexes)
+    connection = db.session.connection()
+    for index in evaluation_indexes:
+        index.drop(connection, checkfirst=True)
     
-    # Unique constraint: one fellow can't have the same survey twice in the same rotation
-    __table_args__ = (db.UniqueConstraint('fellow_id', 'survey_id', 'rotation_block_id'),)
+    columns = ('fellow_id', 'faculty_id', 'recipient_type', 'send_date', 'survey_id', 'rotation_assignment_id',
+               'sent_at', 'status', 'message_sid', 'completed_at', 'notes')
+    created = 0
+    while past and created < evaluations:
+        rows = []
+        for assignment_id, recipient_type, fellow_id, faculty_id, survey_id, friday in rng.choices(
+            past, k=min(chunk_size, evaluations - created)
+        ):
+            status = rng.choice(SYNTHETIC_STATUSES)
+            sent_at = datetime(friday.year, friday.month, friday.day, 9) + timedelta(seconds=rng.randrange(7200))
+            rows.append((
+                fellow_id, faculty_id, recipient_type, friday, survey_id, assignment_id, sent_at, status,
+                None if status == 'failed' else f'SM{rng.getrandbits(128):032x}',
+                sent_at + timedelta(hours=rng.randrange(1, 96)) if status == 'completed' else None,
+                'Synthetic failure' if status == 'failed' else None
+            ))
+        _executemany_insert(Evaluation.__table__, columns, rows)
+        created += len(rows)
+    
+    for index in evaluation_indexes:
+        index.create(connection)
+    db.session.commit()
+    
+    rebuild_dashboard_counters()
+    rebuild_send_calendar()
+    
+    return {'surveys': len(survey_ids), 'fellows': len(fellow_ids), 'faculty': len(faculty_ids),
+            'rotation_blocks': weeks, 'assignments': len(assignments), 'evaluations': created}
 
 
+# Evaluation Export
+EXPORT_FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+EXPORT_COLUMNS = ['id', 'sent_at', 'send_date', 'status', 'recipient_type', 'recipient_name', 'recipient_phone',
+                  'survey', 'rotation_block', 'message_sid', 'completed_at', 'notes']
+EXPORT_FETCH_SIZE = 1000  # rows fetched from the cursor at a time
+EXPORT_FLUSH_ROWS = 500  # rows per chunk sent to the client
 
+
+def evaluation_export_query(start=None, end=None, statuses=None, survey_id=None):
+    """Evaluations with recipient, survey and block, oldest first, filtered by sent date, status and survey.
     
-    def get_recipient(self):
-        """Get the fellow or faculty member"""
-        if self.recipient_type == 'faculty':
-            return Faculty.query.get(self.faculty_id)
-        return Fellow.query.get(self.fellow_id)
+    The recipient comes from the evaluation's assignment when it has one,
+    so rows logged before the evaluation recorded faculty_id still export
+    the right person.
+    """
+    recipient_type = db.func.coalesce(RotationAssignment.recipient_type, Evaluation.recipient_type)
+    query = db.select(
+        Evaluation.id, Evaluation.sent_at, Evaluation.send_date, Evaluation.status,
+        recipient_type.label('recipient_type'),
+        db.func.coalesce(Fellow.name, Faculty.name).label('recipient_name'),
+        db.func.coalesce(Fellow.phone_e164, Faculty.phone_e164,
+                         Fellow.phone_number, Faculty.phone_number).label('recipient_phone'),
+        Survey.name.label('survey'), RotationBlock.name.label('rotation_block'),
+        Evaluation.message_sid, Evaluation.completed_at, Evaluation.notes
+    ).select_from(Evaluation).outerjoin(
+        RotationAssignment, Evaluation.rotation_assignment_id == RotationAssignment.id
+    ).outerjoin(
+        RotationBlock, RotationAssignment.rotation_block_id == RotationBlock.id
+    ).outerjoin(
+        Fellow, db.and_(recipient_type != 'faculty',
+                        Fellow.id == db.func.coalesce(RotationAssignment.fellow_id, Evaluation.fellow_id))
+    ).outerjoin(
+        Faculty, db.and_(recipient_type == 'faculty',
+                         Faculty.id == db.func.coalesce(RotationAssignment.faculty_id, Evaluation.faculty_id))
+    ).outerjoin(
+        Survey, Evaluation.survey_id == Survey.id
+    )
     
-    def get_recipient_name(self):
-        """Get recipient name"""
-        recipient = self.get_recipient()
-        return recipient.name if recipient else "Unknown"
-
-class Evaluation(db.Model):
-    """Log of sent evaluations"""
-    id = db.Column(db.Integer, primary_key=True)
-    fellow_id = db.Column(db.Integer, db.ForeignKey('fellow.id'), nullable=True)
-    faculty_id = db.Column(db.Integer, db.ForeignKey('faculty.id'), nullable=True)
-    recipient_type = db.Column(db.String(20), default='fellow')
-    send_date = db.Column(db.Date)
-    survey_id = db.Column(db.Integer, db.ForeignKey('survey.id'))
-    rotation_assignment_id = db.Column(db.Integer, db.ForeignKey('rotation_assignment.id'))
-    sent_at = db.Column(db.DateTime, default=datetime.utcnow)
-    status = db.Column(db.String(20), default='sent')  # sent, failed, completed
-    message_sid = db.Column(db.String(100))  # Twilio message ID
-    completed_at = db.Column(db.DateTime)
-    notes = db.Column(db.Text)
+    # Date bounds on sent_at keep this a range scan of ix_evaluation_sent_at
+    if start:
+        query = query.where(Evaluation.sent_at >= datetime.combine(start, datetime.min.time()))
+    if end:
+        query = query.where(Evaluation.sent_at < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+    if statuses:
+        query = query.where(Evaluation.status.in_(statuses))
+    if survey_id:
+        query = query.where(Evaluation.survey_id == survey_id)
+    return query.order_by(Evaluation.sent_at, Evaluation.id)
+
+
+def _export_value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+# Cells a spreadsheet would run as a formula; plain numbers such as +1813... phones are left alone
+_CSV_FORMULA_START = ('=', '+', '-', '@', '\t', '\r')
+_CSV_NUMBER = re.compile(r'[+-]?\d+(?:\.\d+)?')
+
+
+def _csv_safe(value):
+    """Prefix text that starts like a formula with ' so spreadsheets show it as text"""
+    if isinstance(value, str) and value.startswith(_CSV_FORMULA_START) and not _CSV_NUMBER.fullmatch(value):
+        return "'" + value
+    return value
+
+
+def iter_evaluation_export(query, fmt):
+    """Yield the export in chunks, fetching EXPORT_FETCH_SIZE rows at a time so memory stays flat"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+    if writer:
+        writer.writerow(EXPORT_COLUMNS)
+        yield buffer.getvalue()  # headers go out before the query runs
+        buffer.seek(0)
+        buffer.truncate()
+    
+    result = db.session.execute(query.execution_options(yield_per=EXPORT_FETCH_SIZE))
+    pending = 0
+    for row in result:
+        values = [_export_value(value) for value in row]
+        if writer:
+            writer.writerow([_csv_safe(value) for value in values])
+        else:
+            buffer.write(json.dumps(dict(zip(EXPORT_COLUMNS, values)), ensure_ascii=False))
+            buffer.write('\n')
+        pending += 1
+        if pending >= EXPORT_FLUSH_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    
+    if buffer.tell():
+        yield buffer.getvalue()
 
 
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
+# Roster Import
+ROSTER_MODELS = {'fellows': Fellow, 'faculty': Faculty}
+# Accepted spellings of each roster column (compared lowercased)
+ROSTER_COLUMNS = {
+    'name': {'name', 'full name', 'full_name'},
+    'phone': {'phone', 'phone number', 'phone_number', 'mobile', 'cell'},
+    'email': {'email', 'email address', 'e-mail'},
+}
+_EMAIL = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
 
 
-# Helper Functions
-def format_phone_number(phone):
-    """Format phone number to E.164 format"""
-    # Remove all non-digit characters
-    digits = ''.join(filter(str.isdigit, phone))
+def parse_roster(lines):
+    """Yield (line number, row dict or None, error or None) for each row of a roster CSV.
     
-    # Add +1 if it's a 10-digit US number
-    if len(digits) == 10:
-        return f'+1{digits}'
-    elif len(digits) == 11 and digits.startswith('1'):
-        return f'+{digits}'
-    else:
-        return f'+{digits}'
+    `lines` is any iterable of text lines (an open file, an upload stream),
+    read one row at a time. Names are whitespace-collapsed, phones get an
+    E.164 key and emails are lowercased.
+    """
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        raise ValueError('The roster file is empty')
+    positions = {}
+    for index, title in enumerate(header):
+        for column, spellings in ROSTER_COLUMNS.items():
+            if title.strip().lower().lstrip('\ufeff') in spellings:
+                positions.setdefault(column, index)
+    missing = {'name', 'phone'} - set(positions)
+    if missing:
+        raise ValueError(f"The roster needs {' and '.join(sorted(missing))} column(s); found: {', '.join(header)}")
+    
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        line = reader.line_num
+        cells = {column: row[index].strip() if index < len(row) else '' for column, index in positions.items()}
+        name = ' '.join(cells['name'].split())
+        phone = cells['phone']
+        email = cells.get('email', '').lower() or None
+        if not name:
+            yield line, None, 'missing name'
+        elif not is_valid_phone_number(phone):
+            yield line, None, f'invalid phone number {phone!r}'
+        elif email and not _EMAIL.match(email):
+            yield line, None, f'invalid email {email!r}'
+        else:
+            yield line, {'name': name, 'phone_number': phone, 'phone_e164': format_phone_number(phone),
+                         'email': email}, None
 
 
-def send_evaluation_sms(recipient, survey, rotation_assignment=None, custom_message=None):
-    """Send evaluation SMS via Twilio"""
-    try:
-        client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-        
-        # Build message
-        if custom_message:
-            message_body = custom_message
-        elif survey.sms_template:
-            message_body = survey.sms_template
+def import_roster(model, lines, deactivate_missing=False, dry_run=False):
+    """Sync Fellow or Faculty rows with a roster CSV in a few bulk statements.
+    
+    Rows are matched by email when it identifies exactly one person, then by
+    normalized phone, so re-importing a file changes nothing. New people are
+    inserted, changed names and phones are updated (emails only when the
+    file has one), inactive people on the roster are reactivated and, with
+    `deactivate_missing`, active people missing from it are deactivated.
+    Every row is checked before anything is written: a row whose phone
+    would still belong to someone else, in either table, is skipped and
+    reported. Returns a report of what changed (or would change, with
+    `dry_run`).
+    """
+    report = {'inserted': [], 'updated': [], 'reactivated': [], 'deactivated': [], 'unchanged': 0, 'errors': []}
+    incoming = {}
+    for line, row, error in parse_roster(lines):
+        if error is None and row['phone_e164'] in incoming:
+            error = f"duplicate phone number {row['phone_number']!r} (also on line {incoming[row['phone_e164']][0]})"
+        if error:
+            report['errors'].append((line, error))
         else:
-            message_body = f"Hi {recipient.name}, please complete your {survey.name}: {survey.survey_link}"
-        
-        # Replace variables
-        message_body = message_body.replace('{name}', recipient.name)
-        message_body = message_body.replace('{link}', survey.survey_link)
-        message_body = message_body.replace('{survey}', survey.name)
-        message_body = message_body.replace('{date}', datetime.now().strftime('%B %d, %Y'))
-        
-        message = client.messages.create(
-            body=message_body,
-            from_=TWILIO_PHONE_NUMBER,
-            to=format_phone_number(recipient.phone_number)
-        )
-        
-        # Log the evaluation
-        evaluation = Evaluation(
-            fellow_id=recipient.id if hasattr(recipient, 'id') and rotation_assignment and rotation_assignment.recipient_type == 'fellow' else None,
-            survey_id=survey.id,
-            rotation_assignment_id=rotation_assignment.id if rotation_assignment else None,
-            status='sent',
-            message_sid=message.sid
-        )
-        db.session.add(evaluation)
-        
-        # Update last_sent date on the assignment
-        if rotation_assignment:
-            rotation_assignment.last_sent = datetime.now().date()
-        
-        db.session.commit()
-        
-        return True, message.sid
-    except Exception as e:
-        # Log failed evaluation
-        evaluation = Evaluation(
-            fellow_id=recipient.id if hasattr(recipient, 'id') and rotation_assignment and rotation_assignment.recipient_type == 'fellow' else None,
-            survey_id=survey.id if survey else None,
-            rotation_assignment_id=rotation_assignment.id if rotation_assignment else None,
-            status='failed',
-            notes=str(e)
-        )
-        db.session.add(evaluation)
-        db.session.commit()
-        
-        return False, str(e)
+            incoming[row['phone_e164']] = (line, row)
+    if not incoming:
+        raise ValueError('The roster has no valid rows; nothing was changed')
+    
+    other = Faculty if model is Fellow else Fellow
+    table = model.__table__
+    try:
+        with serialized_write() if not dry_run else nullcontext():
+            existing = db.session.execute(
+                db.select(table.c.id, table.c.name, table.c.phone_number, table.c.phone_e164, table.c.email,
+                          table.c.active)
+            ).all()
+            taken = {phone for (phone,) in db.session.execute(db.select(other.phone_e164)) if phone in incoming}
+            by_phone = {row.phone_e164: row for row in existing if row.phone_e164}
+            by_email = {}
+            for row in existing:
+                if row.email:
+                    by_email.setdefault(row.email.lower(), []).append(row)
+            
+            # Match emails first, so people who swapped phones are still told apart
+            matches, matched_by = {}, {}
+            rows = sorted(incoming.values(), key=lambda entry: entry[0])
+            for by_email_pass in (True, False):
+                for line, row in rows:
+                    if line in matches:
+                        continue
+                    if by_email_pass:
+                        candidates = by_email.get(row['email']) if row['email'] else None
+                        current = candidates[0] if candidates and len(candidates) == 1 else None
+                        if current is None:
+                            continue
+                    else:
+                        current = by_phone.get(row['phone_e164'])
+                    if current is not None and current.id in matched_by:
+                        report['errors'].append((line, f'matches the same person as line {matched_by[current.id]}'))
+                        current = False
+                    elif current is not None:
+                        matched_by[current.id] = line
+                    matches[line] = (row, current)
+            valid = {line: match for line, match in matches.items() if match[1] is not False}
+            
+            # People who aren't updated keep their phones; drop rows that would take one (which may free others)
+            while True:
+                updating = {current.id for _, current in valid.values() if current is not None}
+                holders = {row.phone_e164: row for row in existing if row.phone_e164 and row.id not in updating}
+                conflicts = {line for line, (row, _) in valid.items()
+                             if row['phone_e164'] in holders or row['phone_e164'] in taken}
+                if not conflicts:
+                    break
+                for line in conflicts:
+                    row = valid.pop(line)[0]
+                    holder = holders.get(row['phone_e164'])
+                    owner = holder.name if holder is not None else f'someone in {other.__tablename__}'
+                    report['errors'].append((line, f"phone number {row['phone_number']!r} belongs to {owner}"))
+            
+            inserts, updates, moved_phones = [], [], []
+            for line, (row, current) in sorted(valid.items()):
+                if current is None:
+                    inserts.append({**row, 'active': True, 'created_at': datetime.utcnow()})
+                    report['inserted'].append(row['name'])
+                    continue
+                
+                # A blank or missing email cell keeps the email on file
+                email = row['email'] or current.email
+                changed = [field for field, old, new in (('name', current.name, row['name']),
+                                                         ('phone', current.phone_e164, row['phone_e164']),
+                                                         ('email', (current.email or '').lower() or None,
+                                                          (email or '').lower() or None))
+                           if old != new]
+                if 'phone' in changed:
+                    moved_phones.append(current.id)
+                if changed or not current.active:
+                    updates.append({'row_id': current.id, 'new_name': row['name'],
+                                    'new_phone_number': row['phone_number'], 'new_phone_e164': row['phone_e164'],
+                                    'new_email': email})
+                if changed:
+                    report['updated'].append((row['name'], changed))
+                if not current.active:
+                    report['reactivated'].append(row['name'])
+                if not changed and current.active:
+                    report['unchanged'] += 1
+            
+            # Rows that errored still name someone on the roster, so they are never deactivated
+            deactivations = ([row for row in existing if row.active and row.id not in matched_by]
+                             if deactivate_missing else [])
+            report['deactivated'] = [row.name for row in deactivations]
+            
+            if not dry_run:
+                if moved_phones:
+                    # Clear moving phones first so a swap never trips the unique phone index halfway
+                    db.session.execute(db.update(table).where(table.c.id.in_(moved_phones)).values(phone_e164=None))
+                if updates:
+                    db.session.execute(
+                        db.update(table).where(table.c.id == db.bindparam('row_id')).values(
+                            name=db.bindparam('new_name'),
+                            phone_number=db.bindparam('new_phone_number'),
+                            phone_e164=db.bindparam('new_phone_e164'),
+                            email=db.bindparam('new_email'),
+                            active=True
+                        ),
+                        updates
+                    )
+                if inserts:
+                    db.session.execute(db.insert(table), inserts)
+                if deactivations:
+                    db.session.execute(
+                        db.update(table).where(table.c.id.in_([row.id for row in deactivations])).values(active=False)
+                    )
+                bump_dashboard_counters({_ACTIVE_COUNTERS[model]: len(inserts) + len(report['reactivated'])
+                                         - len(deactivations)})
+    except IntegrityError as e:
+        # Another writer changed the table between reading and writing
+        raise ValueError(f'The roster conflicts with the saved {model.__tablename__}: {e.orig}; '
+                         'nothing was changed') from e
+    report['errors'].sort()
+    return report
 
 
 # Routes
 @app.route('/')
+@query_budget(15)
 @login_required
 def index():
-    fellows = Fellow.query.filter_by(active=True).all()
-    faculty = Faculty.query.filter_by(active=True).all()
-    surveys = Survey.query.filter_by(active=True).all()
+    counters = get_dashboard_counters()
     
-    # Get recent evaluations
-    recent_evals = Evaluation.query.order_by(Evaluation.sent_at.desc()).limit(10).all()
+    # Only the first few active fellows are listed; totals come from the counters
+    fellows = Fellow.query.filter_by(active=True).limit(5).all()
     
-    # Calculate statistics
-    total_fellows = len(fellows)
-    total_surveys = len(surveys)
-    total_evals_sent = Evaluation.query.filter_by(status='sent').count()
-    total_evals_failed = Evaluation.query.filter_by(status='failed').count()
+    # Get recent evaluations
+    recent_evals = Evaluation.query.options(db.selectinload(Evaluation.fellow)).order_by(Evaluation.sent_at.desc()).limit(10).all()
     
     # Get active rotation blocks
     today = datetime.now().date()
-    active_blocks = RotationBlock.query.filter(
-        RotationBlock.start_date <= today,
-        RotationBlock.end_date >= today
-    ).all()
+    active_blocks = block_calendar.active_blocks(today)
     
     # Get upcoming Friday info
     days_until_friday = (4 - today.weekday()) % 7
@@ -264,13 +3049,12 @@ def index():
     
     return render_template('index.html', 
                          fellows=fellows,
-                         faculty=faculty,
-                         surveys=surveys,
                          recent_evals=recent_evals,
-                         total_fellows=total_fellows,
-                         total_surveys=total_surveys,
-                         total_evals_sent=total_evals_sent,
-                         total_evals_failed=total_evals_failed,
+                         total_fellows=counters['active_fellows'],
+                         total_faculty=counters['active_faculty'],
+                         total_surveys=counters['active_surveys'],
+                         total_evals_sent=counters['evaluations_sent'] + counters['evaluations_delivered'] + counters['evaluations_undelivered'],
+                         total_evals_failed=counters['evaluations_failed'],
                          active_blocks=active_blocks,
                          next_friday_message=next_friday_message)
 
@@ -311,9 +3095,17 @@ def fellows():
 def add_fellow():
     if request.method == 'POST':
         name = request.form.get('name')
-        phone = request.form.get('phone_number')
+        phone = (request.form.get('phone_number') or '').strip()
         email = request.form.get('email')
         
+        if not is_valid_phone_number(phone):
+            flash(f'Please enter a valid phone number (got {phone!r})', 'error')
+            return redirect(url_for('add_fellow'))
+        existing = phone_in_use(phone)
+        if existing:
+            flash(f'{existing.name} already uses the phone number {phone}', 'error')
+            return redirect(url_for('add_fellow'))
+        
         fellow = Fellow(name=name, phone_number=phone, email=email)
         db.session.add(fellow)
         db.session.commit()
@@ -330,8 +3122,17 @@ def edit_fellow(id):
     fellow = Fellow.query.get_or_404(id)
     
     if request.method == 'POST':
+        phone = (request.form.get('phone_number') or '').strip()
+        if not is_valid_phone_number(phone):
+            flash(f'Please enter a valid phone number (got {phone!r})', 'error')
+            return redirect(url_for('edit_fellow', id=id))
+        existing = phone_in_use(phone, exclude=fellow)
+        if existing:
+            flash(f'{existing.name} already uses the phone number {phone}', 'error')
+            return redirect(url_for('edit_fellow', id=id))
+        
         fellow.name = request.form.get('name')
-        fellow.phone_number = request.form.get('phone_number')
+        fellow.phone_number = phone
         fellow.email = request.form.get('email')
         fellow.active = request.form.get('active') == 'on'
         
@@ -353,6 +3154,39 @@ def delete_fellow(id):
     return redirect(url_for('fellows'))
 
 
+@app.route('/roster/import/<kind>', methods=['GET', 'POST'])
+@login_required
+def import_roster_file(kind):
+    if kind not in ROSTER_MODELS:
+        return redirect(url_for('fellows'))
+    
+    report = None
+    if request.method == 'POST':
+        upload = request.files.get('roster')
+        if not upload or not upload.filename:
+            flash('Please choose a CSV file', 'error')
+            return redirect(url_for('import_roster_file', kind=kind))
+        
+        dry_run = bool(request.form.get('dry_run'))
+        try:
+            report = import_roster(ROSTER_MODELS[kind], io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline=''),
+                                   deactivate_missing=bool(request.form.get('deactivate_missing')), dry_run=dry_run)
+            db.session.commit()
+        except (ValueError, UnicodeDecodeError, csv.Error) as e:
+            flash(f'Could not import {upload.filename}: {e}', 'error')
+            return redirect(url_for('import_roster_file', kind=kind))
+        
+        summary = (f"{len(report['inserted'])} added, {len(report['updated'])} updated, "
+                   f"{len(report['reactivated'])} reactivated, {len(report['deactivated'])} deactivated, "
+                   f"{report['unchanged']} unchanged")
+        if dry_run:
+            flash(f'Preview only, nothing saved: {summary}', 'info')
+        else:
+            flash(f'Roster imported: {summary}', 'warning' if report['errors'] else 'success')
+    
+    return render_template('import_roster.html', kind=kind, report=report)
+
+
 @app.route('/faculty')
 @login_required
 def faculty_list():
@@ -365,9 +3199,17 @@ def faculty_list():
 def add_faculty():
     if request.method == 'POST':
         name = request.form.get('name')
-        phone = request.form.get('phone_number')
+        phone = (request.form.get('phone_number') or '').strip()
         email = request.form.get('email')
         
+        if not is_valid_phone_number(phone):
+            flash(f'Please enter a valid phone number (got {phone!r})', 'error')
+            return redirect(url_for('add_faculty'))
+        existing = phone_in_use(phone)
+        if existing:
+            flash(f'{existing.name} already uses the phone number {phone}', 'error')
+            return redirect(url_for('add_faculty'))
+        
         faculty = Faculty(name=name, phone_number=phone, email=email)
         db.session.add(faculty)
         db.session.commit()
@@ -383,8 +3225,17 @@ def edit_faculty(id):
     faculty = Faculty.query.get_or_404(id)
     
     if request.method == 'POST':
+        phone = (request.form.get('phone_number') or '').strip()
+        if not is_valid_phone_number(phone):
+            flash(f'Please enter a valid phone number (got {phone!r})', 'error')
+            return redirect(url_for('edit_faculty', id=id))
+        existing = phone_in_use(phone, exclude=faculty)
+        if existing:
+            flash(f'{existing.name} already uses the phone number {phone}', 'error')
+            return redirect(url_for('edit_faculty', id=id))
+        
         faculty.name = request.form.get('name')
-        faculty.phone_number = request.form.get('phone_number')
+        faculty.phone_number = phone
         faculty.email = request.form.get('email')
         faculty.active = request.form.get('active') == 'on'
         
@@ -414,25 +3265,35 @@ def send_evaluations():
     if request.method == 'POST':
         selected_fellow_ids = request.form.getlist('fellow_ids')
         custom_message = request.form.get('custom_message', '').strip()
+        survey = Survey.query.filter_by(id=request.form.get('survey_id', type=int), active=True).first()
         
         if not selected_fellow_ids:
             flash('Please select at least one fellow', 'error')
             return redirect(url_for('send_evaluations'))
+        if survey is None:
+            flash('Please select a survey', 'error')
+            return redirect(url_for('send_evaluations'))
         
         success_count = 0
         failed_count = 0
         
-        for fellow_id in selected_fellow_ids:
-            fellow = Fellow.query.get(fellow_id)
-            if fellow:
-                success, result = send_evaluation_sms(
-                    fellow, 
-                    custom_message if custom_message else None
-                )
-                if success:
-                    success_count += 1
-                else:
-                    failed_count += 1
+        fellows = Fellow.query.filter(Fellow.id.in_(selected_fellow_ids)).all()
+        
+        # Release the write lock this request took before the slow sends
+        db.session.close()
+        for fellow in fellows:
+            success, result = send_evaluation_sms(
+                fellow,
+                survey,
+                custom_message=custom_message or None
+            )
+            if success:
+                success_count += 1
+            else:
+                failed_count += 1
+        
+        # Make the sends visible before redirecting to tracking
+        evaluation_log.flush()
         
         if failed_count == 0:
             flash(f'Successfully sent {success_count} evaluation requests!', 'success')
@@ -442,7 +3303,9 @@ def send_evaluations():
         return redirect(url_for('tracking'))
     
     fellows = Fellow.query.filter_by(active=True).all()
-    return render_template('send_evaluations.html', fellows=fellows, qualtrics_link=QUALTRICS_SURVEY_LINK)
+    surveys = Survey.query.filter_by(active=True).order_by(Survey.name).all()
+    return render_template('send_evaluations.html', fellows=fellows, surveys=surveys,
+                           default_template=DEFAULT_SMS_TEMPLATE)
 
 
 # Survey Management Routes
@@ -461,17 +3324,25 @@ def add_survey():
         description = request.form.get('description')
         survey_link = request.form.get('survey_link')
         survey_type = request.form.get('survey_type')
+        sms_template = request.form.get('sms_template', '').strip()
+        if request.form.get('transliterate') == 'on':
+            sms_template = transliterate_gsm7(sms_template)
         
         survey = Survey(
             name=name,
             description=description,
             survey_link=survey_link,
-            survey_type=survey_type
+            survey_type=survey_type,
+            sms_template=sms_template if sms_template else None
         )
         db.session.add(survey)
         db.session.commit()
         
         flash(f'Survey "{name}" added successfully!', 'success')
+        unknown = unknown_placeholders(sms_template)
+        if unknown:
+            flash(f'Unknown placeholders in SMS template will be sent as-is: {", ".join("{" + name + "}" for name in unknown)}', 'warning')
+        flash_sms_analysis(survey)
         return redirect(url_for('surveys'))
     
     return render_template('add_survey.html')
@@ -488,11 +3359,22 @@ def edit_survey(id):
         survey.survey_link = request.form.get('survey_link')
         survey.survey_type = request.form.get('survey_type')
         sms_template = request.form.get('sms_template', '').strip()
+        if request.form.get('transliterate') == 'on':
+            sms_template = transliterate_gsm7(sms_template)
         survey.sms_template = sms_template if sms_template else None
         survey.active = request.form.get('active') == 'on'
         
+        # Anything baked into the compiled template invalidates it
+        if any(_was_changed(survey, attr) for attr in ('name', 'survey_link', 'sms_template')):
+            survey.template_version = (survey.template_version or 1) + 1
+            sms_templates.invalidate(survey.id)
+        
         db.session.commit()
         flash(f'Survey "{survey.name}" updated successfully!', 'success')
+        unknown = unknown_placeholders(sms_template)
+        if unknown:
+            flash(f'Unknown placeholders in SMS template will be sent as-is: {", ".join("{" + name + "}" for name in unknown)}', 'warning')
+        flash_sms_analysis(survey)
         return redirect(url_for('surveys'))
     
     return render_template('edit_survey.html', survey=survey)
@@ -531,6 +3413,10 @@ def add_rotation_block():
         if days_diff != 6:
             flash(f'Warning: Block is {days_diff + 1} days. Typically blocks should be 7 days (1 week, Mon-Sun).', 'warning')
         
+        overlapping = block_calendar.overlapping(start_date, end_date)
+        if overlapping:
+            flash(f'Warning: Block overlaps {len(overlapping)} existing block(s).', 'warning')
+        
         block = RotationBlock(
             name=name,
             start_date=start_date,
@@ -557,6 +3443,10 @@ def edit_rotation_block(id):
         block.end_date = datetime.strptime(request.form.get('end_date'), '%Y-%m-%d').date()
         block.notes = request.form.get('notes')
         
+        overlapping = block_calendar.overlapping(block.start_date, block.end_date, exclude_id=block.id)
+        if overlapping:
+            flash(f'Warning: Block overlaps {len(overlapping)} other block(s).', 'warning')
+        
         db.session.commit()
         flash(f'Rotation block "{block.name}" updated successfully!', 'success')
         return redirect(url_for('rotation_blocks'))
@@ -572,35 +3462,14 @@ def bulk_create_blocks():
         start_date = datetime.strptime(request.form.get('start_date'), '%Y-%m-%d').date()
         num_weeks = int(request.form.get('num_weeks'))
         name_template = request.form.get('name_template')
+        allow_overlap = request.form.get('allow_overlap') == 'on'
         
-        created_blocks = []
-        current_start = start_date
-        
-        for week_num in range(1, num_weeks + 1):
-            # Calculate end date (6 days later for 7-day week)
-            current_end = current_start + timedelta(days=6)
-            
-            # Format the name
-            block_name = name_template.replace('{week}', str(week_num))
-            block_name = block_name.replace('{start}', current_start.strftime('%b %d'))
-            block_name = block_name.replace('{end}', current_end.strftime('%b %d'))
-            block_name = block_name.replace('{year}', current_start.strftime('%Y'))
-            
-            # Create the block
-            block = RotationBlock(
-                name=block_name,
-                start_date=current_start,
-                end_date=current_end
-            )
-            db.session.add(block)
-            created_blocks.append(block_name)
-            
-            # Move to next week
-            current_start = current_end + timedelta(days=1)
-        
-        db.session.commit()
+        created_count, skipped = block_calendar.create_weeks(start_date, num_weeks, name_template, allow_overlap)
         
-        flash(f'Successfully created {num_weeks} rotation blocks!', 'success')
+        flash(f'Successfully created {created_count} rotation blocks!', 'success')
+        if skipped:
+            flash(f'Skipped {len(skipped)} weeks that overlap existing blocks: {", ".join(skipped[:5])}'
+                  + (' ...' if len(skipped) > 5 else ''), 'warning')
         return redirect(url_for('rotation_blocks'))
     
     return render_template('bulk_create_blocks.html')
@@ -618,10 +3487,16 @@ def assignments():
 
 
 @app.route('/assignments/block/<int:block_id>')
+@query_budget(15)
 @login_required
 def view_block_assignments(block_id):
     block = RotationBlock.query.get_or_404(block_id)
-    assignments = RotationAssignment.query.filter_by(rotation_block_id=block_id).all()
+    # Load both recipient types and surveys up front so rows don't query one by one
+    assignments = RotationAssignment.query.filter_by(rotation_block_id=block_id).options(
+        db.selectinload(RotationAssignment.fellow),
+        db.selectinload(RotationAssignment.faculty),
+        db.selectinload(RotationAssignment.survey)
+    ).all()
     fellows = Fellow.query.filter_by(active=True).all()
     faculty = Faculty.query.filter_by(active=True).all()
     surveys = Survey.query.filter_by(active=True).all()
@@ -674,6 +3549,7 @@ def delete_assignment(id):
 
 
 @app.route('/assignments/bulk-add/<int:block_id>', methods=['POST'])
+@query_budget(15)
 @login_required
 def bulk_add_assignments(block_id):
     """Add multiple assignments for fellows OR faculty"""
@@ -683,57 +3559,41 @@ def bulk_add_assignments(block_id):
     send_date_str = request.form.get('send_date')
     send_date = datetime.strptime(send_date_str, '%Y-%m-%d').date() if send_date_str else None
     
-    added_count = 0
-    skipped_count = 0
-    
-    # Fellows
-    for fellow_id in fellow_ids:
-        for survey_id in survey_ids:
-            existing = RotationAssignment.query.filter_by(
-                fellow_id=fellow_id,
-                survey_id=survey_id,
-                rotation_block_id=block_id,
-                recipient_type='fellow'
-            ).first()
-            
-            if not existing:
-                assignment = RotationAssignment(
-                    fellow_id=fellow_id,
-                    survey_id=survey_id,
-                    rotation_block_id=block_id,
-                    recipient_type='fellow',
-                    send_date=send_date
-                )
-                db.session.add(assignment)
-                added_count += 1
-            else:
-                skipped_count += 1
-    
-    # Faculty
-    for faculty_id in faculty_ids:
-        for survey_id in survey_ids:
-            existing = RotationAssignment.query.filter_by(
-                faculty_id=faculty_id,
-                survey_id=survey_id,
-                rotation_block_id=block_id,
-                recipient_type='faculty'
-            ).first()
-            
-            if not existing:
-                assignment = RotationAssignment(
-                    faculty_id=faculty_id,
-                    survey_id=survey_id,
-                    rotation_block_id=block_id,
-                    recipient_type='faculty',
-                    send_date=send_date
-                )
-                db.session.add(assignment)
-                added_count += 1
-            else:
-                skipped_count += 1
+    requested = {('fellow', int(fellow_id), int(survey_id)) for fellow_id in fellow_ids for survey_id in survey_ids}
+    requested |= {('faculty', int(faculty_id), int(survey_id)) for faculty_id in faculty_ids for survey_id in survey_ids}
     
+    # Fetch every existing (recipient, survey) pair for the block in one query
+    existing = set()
+    for recipient_type, fellow_id, faculty_id, survey_id in db.session.query(
+        RotationAssignment.recipient_type, RotationAssignment.fellow_id,
+        RotationAssignment.faculty_id, RotationAssignment.survey_id
+    ).filter(RotationAssignment.rotation_block_id == block_id):
+        if recipient_type == 'faculty':
+            existing.add(('faculty', faculty_id, survey_id))
+        else:
+            existing.add(('fellow', fellow_id, survey_id))
+    
+    rows = [{
+        'fellow_id': recipient_id if recipient_type == 'fellow' else None,
+        'faculty_id': recipient_id if recipient_type == 'faculty' else None,
+        'recipient_type': recipient_type,
+        'survey_id': survey_id,
+        'rotation_block_id': block_id,
+        'send_date': send_date
+    } for recipient_type, recipient_id, survey_id in sorted(requested - existing)]
+    
+    added_count = 0
+    if rows:
+        # A pair added by someone else since the read above is skipped, not a 500
+        added_count = len(db.session.execute(
+            sqlite_insert(RotationAssignment).on_conflict_do_nothing().returning(RotationAssignment.id), rows
+        ).all())
+        # Core inserts skip the flush listener, so refresh the block's send calendar here
+        refresh_send_calendar(block_ids=[block_id])
     db.session.commit()
     
+    skipped_count = len(requested) - added_count
+    
     if skipped_count > 0:
         flash(f'Added {added_count} assignments, skipped {skipped_count} duplicates', 'success')
     else:
@@ -744,102 +3604,140 @@ def bulk_add_assignments(block_id):
 
 # Automated Friday Send Route
 @app.route('/send-friday-evaluations', methods=['GET', 'POST'])
+@query_budget(20)
 @login_required
 def send_friday_evaluations():
     """Send evaluations for all active assignments this Friday"""
     if request.method == 'POST':
         today = datetime.now().date()
+        ensure_send_calendar()
+        db.session.commit()
+        plan = build_send_plan(today, include_already_sent=True)
         
-        # Get all active rotation blocks
-        active_blocks = RotationBlock.query.filter(
-            RotationBlock.start_date <= today,
-            RotationBlock.end_date >= today
-        ).all()
-        
-        success_count = 0
-        failed_count = 0
-        already_sent_count = 0
+        # Release the write lock this request took before the workers claim and send
+        db.session.close()
         
-        for block in active_blocks:
-            # Get all assignments for this block
-            assignments = RotationAssignment.query.filter_by(
-                rotation_block_id=block.id,
-                send_on_fridays=True
-            ).all()
-            
-            for assignment in assignments:
-                # Check if already sent today
-                if assignment.last_sent == today:
-                    already_sent_count += 1
-                    continue
-                
-                recipient = assignment.get_recipient()
-                survey = Survey.query.get(assignment.survey_id)
-                
-                if recipient and survey and recipient.active and survey.active:
-                    success, result = send_evaluation_sms(recipient, survey, assignment)
-                    if success:
-                        success_count += 1
-                    else:
-                        failed_count += 1
+        # Claim now so a double click can't queue anything twice, then send paced in the background
+        plan, already_sent_count = claim_sends(plan, today)
+        run = SendRun(pid=os.getpid(), queued=len(plan), already_sent=already_sent_count,
+                      finished_at=None if plan else datetime.utcnow())
+        db.session.add(run)
+        db.session.flush()
+        run_id = run.id
+        db.session.commit()
+        if plan:
+            dispatch_in_background(plan, today, run_id)
         
-        message = f'Sent {success_count} evaluations'
-        if failed_count > 0:
-            message += f', {failed_count} failed'
+        message = f'Queued {len(plan)} evaluations for sending'
         if already_sent_count > 0:
             message += f', {already_sent_count} already sent today'
-        
-        flash(message, 'success' if failed_count == 0 else 'warning')
+        flash(message + '. They appear on this page as they go out, and the run\'s totals when it finishes.', 'success')
         return redirect(url_for('tracking'))
     
     # GET request - show preview
     today = datetime.now().date()
-    active_blocks = RotationBlock.query.filter(
-        RotationBlock.start_date <= today,
-        RotationBlock.end_date >= today
-    ).all()
-    
-    preview_assignments = []
-    for block in active_blocks:
-        assignments = RotationAssignment.query.filter_by(
-            rotation_block_id=block.id,
-            send_on_fridays=True
-        ).all()
-        
-        for assignment in assignments:
-            if assignment.last_sent != today:
-                # Check if should send today
-                should_send = False
-                if assignment.send_date:
-                    should_send = (assignment.send_date == today)
-                elif assignment.send_on_fridays:
-                    should_send = (today.weekday() == 4)
-                else:
-                    should_send = True
-                
-                if should_send:
-                    recipient = assignment.get_recipient()
-                    preview_assignments.append({
-                        'assignment': assignment,
-                        'recipient': recipient,
-                        'recipient_type': assignment.recipient_type,
-                        'survey': Survey.query.get(assignment.survey_id),
-                        'block': block
-                    })
+    preview_assignments = render_plan_messages(build_send_plan(today))
+    for item in preview_assignments:
+        item['sms'] = analyze_sms(item['message'])
+    total_segments = sum(item['sms']['segments'] for item in preview_assignments)
+    ucs2_count = sum(1 for item in preview_assignments if item['sms']['encoding'] == 'UCS-2')
     
     return render_template('send_friday_evaluations.html', 
                          preview_assignments=preview_assignments,
+                         total_segments=total_segments,
+                         ucs2_count=ucs2_count,
                          is_friday=today.weekday() == 4)
 
 
+def encode_cursor(evaluation):
+    """Encode an evaluation's (sent_at, id) position as a URL-safe cursor"""
+    return f"{evaluation.sent_at.isoformat()}_{evaluation.id}"
+
+
+def decode_cursor(cursor):
+    """Decode a cursor from encode_cursor; returns None if it is missing or malformed"""
+    try:
+        sent_at, evaluation_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(sent_at), int(evaluation_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def paginate_evaluations(after=None, before=None, per_page=50):
+    """Keyset pagination over evaluations, newest first.
+    
+    `after` pages to older rows and `before` to newer rows, each given as a
+    decoded (sent_at, id) cursor. Every page is an index range scan on
+    (sent_at, id), so deep pages cost the same as the first one.
+    Returns (evaluations, next_cursor, prev_cursor).
+    """
+    position = db.tuple_(Evaluation.sent_at, Evaluation.id)
+    query = Evaluation.query.options(db.selectinload(Evaluation.fellow))
+    
+    if before:
+        rows = query.filter(position > before).order_by(
+            Evaluation.sent_at.asc(), Evaluation.id.asc()
+        ).limit(per_page + 1).all()
+        has_newer = len(rows) > per_page
+        evaluations = list(reversed(rows[:per_page]))
+        has_older = True
+    else:
+        if after:
+            query = query.filter(position < after)
+        rows = query.order_by(
+            Evaluation.sent_at.desc(), Evaluation.id.desc()
+        ).limit(per_page + 1).all()
+        has_older = len(rows) > per_page
+        evaluations = rows[:per_page]
+        has_newer = after is not None
+    
+    next_cursor = encode_cursor(evaluations[-1]) if evaluations and has_older else None
+    prev_cursor = encode_cursor(evaluations[0]) if evaluations and has_newer else None
+    return evaluations, next_cursor, prev_cursor
+
+
 @app.route('/tracking')
+@query_budget(10)
 @login_required
 def tracking():
-    page = request.args.get('page', 1, type=int)
-    evaluations = Evaluation.query.order_by(Evaluation.sent_at.desc()).paginate(
-        page=page, per_page=50, error_out=False
+    evaluations, next_cursor, prev_cursor = paginate_evaluations(
+        after=decode_cursor(request.args.get('after')),
+        before=decode_cursor(request.args.get('before'))
     )
-    return render_template('tracking.html', evaluations=evaluations)
+    
+    # Approximate total: the highest id is an O(log n) lookup, unlike COUNT(*)
+    approximate_total = db.session.query(db.func.max(Evaluation.id)).scalar() or 0
+    
+    return render_template('tracking.html',
+                         evaluations=evaluations,
+                         next_cursor=next_cursor,
+                         prev_cursor=prev_cursor,
+                         approximate_total=approximate_total,
+                         send_runs=SendRun.query.order_by(SendRun.id.desc()).limit(5).all(),
+                         surveys=Survey.query.order_by(Survey.name).all())
+
+
+@app.route('/tracking/export')
+@login_required
+def export_evaluations():
+    """Stream the evaluation log as CSV or JSON lines, optionally filtered"""
+    fmt = request.args.get('format', 'csv')
+    try:
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') else None
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else None
+        survey_id = int(request.args['survey_id']) if request.args.get('survey_id') else None
+    except ValueError:
+        flash('Export filters must be dates as YYYY-MM-DD and a survey ID', 'error')
+        return redirect(url_for('tracking'))
+    if fmt not in EXPORT_FORMATS:
+        flash(f'Unknown export format: {fmt}', 'error')
+        return redirect(url_for('tracking'))
+    
+    query = evaluation_export_query(start, end, [status for status in request.args.getlist('status') if status],
+                                    survey_id)
+    filename = f"evaluations-{datetime.now():%Y%m%d-%H%M%S}.{fmt}"
+    return Response(stream_with_context(iter_evaluation_export(query, fmt)), mimetype=EXPORT_FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
 
 
 @app.route('/settings', methods=['GET', 'POST'])
@@ -867,9 +3765,37 @@ def settings():
     
     return render_template('settings.html', 
                          twilio_configured=bool(TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN),
+                         sms_transport=SMS_TRANSPORT,
                          surveys_count=surveys_count)
 
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape endpoint; needs a login or the METRICS_TOKEN bearer token"""
+    token_ok = METRICS_TOKEN and hmac.compare_digest(request.headers.get('Authorization', '').encode(),
+                                                     f'Bearer {METRICS_TOKEN}'.encode())
+    if not token_ok and not current_user.is_authenticated:
+        return Response('Unauthorized\n', status=401, mimetype='text/plain',
+                        headers={'WWW-Authenticate': 'Bearer'})
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/twilio/status', methods=['POST'])
+def twilio_status_callback():
+    """Twilio delivery status webhook; buffered and applied in bulk"""
+    validator = RequestValidator(TWILIO_AUTH_TOKEN)
+    url = TWILIO_STATUS_CALLBACK_URL or request.url
+    if not validator.validate(url, request.form.to_dict(), request.headers.get('X-Twilio-Signature', '')):
+        return jsonify({'success': False, 'error': 'Invalid signature'}), 403
+    
+    message_sid = request.form.get('MessageSid')
+    status = DELIVERY_STATUSES.get(request.form.get('MessageStatus'))
+    if message_sid and status:
+        delivery_statuses.add(message_sid, status, request.form.get('ErrorCode'))
+    
+    return '', 204
+
+
 @app.route('/api/test-sms', methods=['POST'])
 @login_required
 def test_sms():
@@ -882,7 +3808,7 @@ def test_sms():
         return jsonify({'success': False, 'error': 'Phone number required'}), 400
     
     try:
-        client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+        transport = get_sms_transport()
         
         # Get survey if specified
         if survey_id:
@@ -894,11 +3820,9 @@ def test_sms():
         else:
             message_body = "Test message from Fellowship Evaluation System"
         
-        message = client.messages.create(
-            body=message_body,
-            from_=TWILIO_PHONE_NUMBER,
-            to=format_phone_number(phone_number)
-        )
+        to = format_phone_number(phone_number)
+        db.session.close()
+        message = get_sender_pool().send(to, lambda **sender: transport.send(to, message_body, **sender))
         return jsonify({'success': True, 'message_sid': message.sid})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -909,9 +3833,102 @@ def test_sms():
 def init_db():
     """Initialize the database"""
     db.create_all()
+    rebuild_dashboard_counters()
+    rebuild_send_calendar()
     print("Database initialized!")
 
 
+@app.cli.command()
+def rebuild_counters():
+    """Recount the dashboard counters from the database"""
+    values = rebuild_dashboard_counters()
+    for name, value in values.items():
+        print(f"{name}: {value}")
+
+
+@app.cli.command()
+def rebuild_calendar():
+    """Recompute the send calendar from assignments and blocks"""
+    count = rebuild_send_calendar()
+    print(f"Send calendar rebuilt: {count} scheduled sends")
+
+
+@app.cli.command('process-retries')
+def process_retries_command():
+    """Resend failed scheduled texts whose retry is due (run from cron)"""
+    counts = process_retries()
+    print(f"Retried: {counts['success']} sent, {counts['retrying']} rescheduled, "
+          f"{counts['failed']} failed for good, {counts['already_sent']} already sent")
+
+
+@app.cli.command('generate-dataset')
+@click.option('--seed', type=int, default=None, help='RNG seed; the same seed gives the same data')
+@click.option('--fellows', type=int, default=300, show_default=True)
+@click.option('--faculty', type=int, default=100, show_default=True)
+@click.option('--surveys', type=int, default=3, show_default=True)
+@click.option('--weeks', type=int, default=104, show_default=True, help='weekly rotation blocks, centred on today')
+@click.option('--per-block', type=int, default=20, show_default=True, help='fellows assigned to each block')
+@click.option('--evaluations', type=int, default=100000, show_default=True)
+def generate_dataset_command(seed, fellows, faculty, surveys, weeks, per_block, evaluations):
+    """Fill an empty database with synthetic data for scale testing"""
+    db.create_all()
+    if Fellow.query.first() or Faculty.query.first() or RotationBlock.query.first():
+        print("❌ The database already has data; point DATABASE_URL at an empty database")
+        sys.exit(1)
+    
+    started = time.perf_counter()
+    counts = generate_dataset(seed, fellows, faculty, surveys, weeks, per_block, evaluations)
+    for name, count in counts.items():
+        print(f"{name}: {count}")
+    print(f"Dataset generated in {time.perf_counter() - started:.1f}s")
+
+
+@app.cli.command('import-roster')
+@click.argument('kind', type=click.Choice(sorted(ROSTER_MODELS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--deactivate-missing', is_flag=True, help='Deactivate active people missing from the file')
+@click.option('--dry-run', is_flag=True, help='Report the changes without saving them')
+def import_roster_command(kind, path, deactivate_missing, dry_run):
+    """Sync fellows or faculty with a roster CSV (name, phone, email columns)"""
+    try:
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            report = import_roster(ROSTER_MODELS[kind], f, deactivate_missing=deactivate_missing, dry_run=dry_run)
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    
+    for name in report['inserted']:
+        print(f"+ {name}")
+    for name, fields in report['updated']:
+        print(f"~ {name} ({', '.join(fields)})")
+    for name in report['reactivated']:
+        print(f"↑ {name} reactivated")
+    for name in report['deactivated']:
+        print(f"- {name} deactivated")
+    for line, error in report['errors']:
+        print(f"⚠️  Line {line}: {error}")
+    print(f"{len(report['inserted'])} added, {len(report['updated'])} updated, "
+          f"{len(report['reactivated'])} reactivated, {len(report['deactivated'])} deactivated, "
+          f"{report['unchanged']} unchanged, {len(report['errors'])} skipped")
+    if dry_run:
+        print("Dry run: nothing was saved")
+
+
+@app.cli.command()
+def backfill_phones():
+    """Normalize every stored phone number to E.164"""
+    updated = backfill_phone_numbers()
+    print(f"Normalized {updated} phone numbers")
+    
+    # The unique phone indexes can't be built until duplicates are resolved
+    for model in (Fellow, Faculty):
+        duplicates = db.session.query(model.phone_e164, db.func.count()).group_by(
+            model.phone_e164
+        ).having(db.func.count() > 1, model.phone_e164.isnot(None)).all()
+        for phone_e164, count in duplicates:
+            print(f"⚠️  {count} {model.__tablename__} rows share {phone_e164}")
+
+
 @app.cli.command()
 def create_admin():
     """Create an admin user"""
@@ -927,5 +3944,56 @@ def create_admin():
     print(f"Admin user '{username}' created successfully!")
 
 
+# Start-up: send history journaled by workers that crashed before flushing
+# belongs in the database (tracking, last_sent) now, not at the next send
+def recover_evaluation_log():
+    if not os.path.isdir(evaluation_log.journal_dir):
+        return
+    try:
+        recovered = evaluation_log.recover()
+    except Exception:
+        app.logger.exception('Replaying evaluation log journals at start-up failed')
+    else:
+        if recovered:
+            app.logger.warning('Replayed %d evaluation log entries left by a crashed worker', recovered)
+
+
+recover_evaluation_log()
+
+
+# Start-up: a send run whose process died will never record its counts;
+# its unsent texts stay 'sending' until the retry timer reclaims them
+def close_interrupted_send_runs():
+    with app.app_context():
+        if not db.inspect(db.engine).has_table(SendRun.__tablename__):
+            return
+        try:
+            with serialized_write():
+                for run in SendRun.query.filter(SendRun.finished_at.is_(None)):
+                    if run.pid == os.getpid() or not _pid_alive(run.pid):
+                        run.finished_at = datetime.utcnow()
+                        run.error = 'Interrupted by a restart; unsent texts are retried'
+        except Exception:
+            app.logger.exception('Closing interrupted send runs at start-up failed')
+
+
+close_interrupted_send_runs()
+
+
+# Start-up: retries queued before a restart may already be due, sends it cut
+# short go stale, and the timer that would have handled them died with it
+def arm_retry_timer():
+    with app.app_context():
+        if not db.inspect(db.engine).has_table(OutboundMessage.__tablename__):
+            return
+    try:
+        schedule_retries()
+    except Exception:
+        app.logger.exception('Arming the SMS retry timer at start-up failed')
+
+
+arm_retry_timer()
+
+
 if __name__ == '__main__':
     app.run(debug=True)
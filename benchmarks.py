@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Benchmarks
+Times the app's hot paths against a throwaway SQLite database filled by
+generate_dataset (the same generator as 'flask generate-dataset') at a
+chosen size, and saves the results as JSON so runs from two versions can
+be compared. Nothing is texted and the real database is never touched.
+
+    python benchmarks.py                                  # default dataset
+    python benchmarks.py --fellows 2000 --faculty 500 --weeks 208 --evaluations 1000000
+    python benchmarks.py --only tracking_page --only build_send_plan
+    python benchmarks.py --compare old.json new.json      # exits 1 on a regression
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def load_app(workdir):
+    """Import the app against an empty database and journal in `workdir`"""
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'benchmark.db')}"
+    os.environ['EVAL_LOG_JOURNAL_DIR'] = os.path.join(workdir, 'journal')
+    os.environ['SMS_TRANSPORT'] = 'fake'
+    import app as flask_app
+    return flask_app
+
+
+def seed_dataset(m, args):
+    """Generate the dataset and a login; returns the Friday whose send plan to benchmark"""
+    with m.app.app_context():
+        m.db.create_all()
+        m.generate_dataset(args.seed, args.fellows, args.faculty, 3, args.weeks, args.per_block, args.evaluations)
+        user = m.User(username='benchmark')
+        user.set_password('benchmark')
+        m.db.session.add(user)
+        m.db.session.commit()
+
+    today = datetime.now().date()
+    return today + timedelta(days=(4 - today.weekday()) % 7)
+
+
+def time_it(fn, repeat, setup=None):
+    """Run fn once to warm up, then `repeat` timed runs; returns per-run seconds"""
+    fn(setup() if setup else None)
+    timings = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        started = time.perf_counter()
+        fn(arg)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def summarize(timings, ops):
+    median = statistics.median(timings)
+    return {
+        'ops': ops,
+        'repeat': len(timings),
+        'min': min(timings),
+        'median': median,
+        'mean': statistics.fmean(timings),
+        'max': max(timings),
+        'stdev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        'median_per_op': median / ops,
+    }
+
+
+def define_benchmarks(m, rng, friday):
+    """Return {name: (fn(arg), ops, setup or None)} for every hot path"""
+    app, db = m.app, m.db
+    client = app.test_client()
+    client.post('/login', data={'username': 'benchmark', 'password': 'benchmark'})
+
+    with app.app_context():
+        survey = m.Survey.query.filter(m.Survey.sms_template.isnot(None)).first()
+        fellows = m.Fellow.query.filter_by(active=True).all()
+        blocks = m.RotationBlock.query.all()
+        busiest_block_id = db.session.query(m.RotationAssignment.rotation_block_id).group_by(
+            m.RotationAssignment.rotation_block_id
+        ).order_by(db.func.count().desc()).limit(1).scalar()
+        fellow_ids = [str(fellow.id) for fellow in fellows]
+        faculty_ids = [str(faculty_id) for (faculty_id,) in db.session.query(m.Faculty.id).filter_by(active=True)]
+        db.session.expunge_all()
+
+    phones = [m.synthetic_phone(rng, index) for index in range(10000)]
+    names = [fellow.name for fellow in fellows]
+    compiled = m.CompiledSmsTemplate(survey.sms_template, survey)
+    new_blocks = iter(range(10 ** 6))
+    lookup_days = [friday - timedelta(days=day) for day in range(365)]
+
+    def get_page(path):
+        response = client.get(path)
+        if response.status_code != 200:
+            raise RuntimeError(f'GET {path} returned {response.status_code}')
+
+    def empty_block(_=None):
+        with app.app_context():
+            block = m.RotationBlock(name=f'Benchmark block {next(new_blocks)}',
+                                    start_date=friday - timedelta(days=4), end_date=friday + timedelta(days=2))
+            db.session.add(block)
+            db.session.commit()
+            return block.id
+
+    def bulk_add(block_id):
+        response = client.post(f'/assignments/bulk-add/{block_id}', data={
+            'fellow_ids': fellow_ids, 'faculty_ids': faculty_ids, 'survey_ids': [str(survey.id)]
+        })
+        if response.status_code != 302:
+            raise RuntimeError(f'bulk add returned {response.status_code}')
+
+    def block_lookups(_):
+        with app.app_context():
+            for day in lookup_days:
+                m.block_calendar.active_block_ids(day)
+
+    def send_plan(_):
+        with app.app_context():
+            m.build_send_plan(friday, include_already_sent=True)
+
+    def render_template(template, **context):
+        with app.test_request_context():
+            m.login_user(m.User.query.first())
+            m.render_template(template, **context)
+
+    def tracking_template(_):
+        with app.app_context():
+            evaluations, next_cursor, prev_cursor = m.paginate_evaluations()
+            render_template('tracking.html', evaluations=evaluations, next_cursor=next_cursor,
+                            prev_cursor=prev_cursor, approximate_total=len(evaluations))
+
+    def block_template(_):
+        with app.app_context():
+            block = db.session.get(m.RotationBlock, busiest_block_id)
+            assignments = m.RotationAssignment.query.filter_by(rotation_block_id=busiest_block_id).options(
+                db.selectinload(m.RotationAssignment.fellow),
+                db.selectinload(m.RotationAssignment.faculty),
+                db.selectinload(m.RotationAssignment.survey)
+            ).all()
+            render_template('block_assignments.html', block=block, assignments=assignments,
+                            fellows=m.Fellow.query.filter_by(active=True).all(),
+                            faculty=m.Faculty.query.filter_by(active=True).all(),
+                            surveys=m.Survey.query.filter_by(active=True).all())
+
+    with app.app_context():
+        plan_size = len(m.build_send_plan(friday, include_already_sent=True))
+
+    return {
+        'format_phone_number': (lambda _: [m.format_phone_number(phone) for phone in phones], len(phones), None),
+        'sms_render_batch': (lambda _: compiled.render_batch(names), len(names), None),
+        'sms_render_message': (lambda _: [m.render_sms_message(fellow, survey) for fellow in fellows],
+                               len(fellows), None),
+        'rotation_block_get_friday': (lambda _: [block.get_friday() for block in blocks], len(blocks), None),
+        'block_calendar_lookups': (block_lookups, len(lookup_days), None),
+        'build_send_plan': (send_plan, max(plan_size, 1), None),
+        'tracking_page': (lambda _: get_page('/tracking'), 1, None),
+        'tracking_template': (tracking_template, 1, None),
+        'block_assignments_page': (lambda _: get_page(f'/assignments/block/{busiest_block_id}'), 1, None),
+        'block_assignments_template': (block_template, 1, None),
+        # Last: every run adds a block full of assignments
+        'bulk_add_assignments': (bulk_add, max(len(fellow_ids) + len(faculty_ids), 1), empty_block),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix='benchmarks-')
+    m = load_app(workdir)
+
+    print(f"Seeding {args.fellows} fellows, {args.faculty} faculty, {args.weeks} weeks, "
+          f"{args.evaluations} evaluations...")
+    started = time.perf_counter()
+    friday = seed_dataset(m, args)
+    print(f"  done in {time.perf_counter() - started:.1f}s")
+    print()
+
+    benchmarks = define_benchmarks(m, random.Random(args.seed), friday)
+    unknown = set(args.only or ()) - set(benchmarks)
+    if unknown:
+        print(f"❌ Unknown benchmark(s): {', '.join(sorted(unknown))}")
+        sys.exit(2)
+
+    results = {}
+    for name, (fn, ops, setup) in benchmarks.items():
+        if args.only and name not in args.only:
+            continue
+        results[name] = summarize(time_it(fn, args.repeat, setup), ops)
+        print(f"  {name:<28} median {results[name]['median'] * 1000:10.3f} ms"
+              f"   ({results[name]['median_per_op'] * 1e6:10.3f} µs/op over {ops} ops)")
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'dataset': {'fellows': args.fellows, 'faculty': args.faculty, 'weeks': args.weeks,
+                        'per_block': args.per_block, 'evaluations': args.evaluations},
+        },
+        'results': results,
+    }
+
+    output = args.output or os.path.join(
+        'instance', 'benchmarks', f"{datetime.now():%Y%m%d-%H%M%S}-{report['meta']['commit'] or 'local'}.json"
+    )
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print()
+    print(f"✅ Results saved to {output}")
+
+
+def compare(old_path, new_path, threshold):
+    """Print the median change for each benchmark; returns the names that regressed"""
+    with open(old_path, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)
+
+    if old['meta'].get('dataset') != new['meta'].get('dataset'):
+        print("⚠️  The runs used different datasets; compare per-op times with care")
+
+    regressed = []
+    for name in sorted(set(old['results']) & set(new['results'])):
+        before = old['results'][name]['median_per_op']
+        after = new['results'][name]['median_per_op']
+        change = (after - before) / before if before else 0.0
+        marker = '❌' if change > threshold else '✅'
+        print(f"  {marker} {name:<28} {before * 1e6:10.3f} → {after * 1e6:10.3f} µs/op  ({change:+.1%})")
+        if change > threshold:
+            regressed.append(name)
+    return regressed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the app against a seeded database')
+    parser.add_argument('--fellows', type=int, default=300)
+    parser.add_argument('--faculty', type=int, default=100)
+    parser.add_argument('--weeks', type=int, default=104, help='weekly rotation blocks, centred on today')
+    parser.add_argument('--per-block', type=int, default=20, help='fellows assigned to each block')
+    parser.add_argument('--evaluations', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--only', action='append', help='run just this benchmark (repeatable)')
+    parser.add_argument('--output', help='results file (default: instance/benchmarks/<time>-<commit>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two results files')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='with --compare, fail when a median slows by more than this fraction')
+    args = parser.parse_args()
+
+    if args.compare:
+        regressed = compare(*args.compare, args.threshold)
+        print()
+        if regressed:
+            print(f"❌ {len(regressed)} benchmark(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+        print("✅ No regressions")
+    else:
+        run(args)
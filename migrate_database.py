@@ -49,8 +49,38 @@ try:
         conn.commit()
         print("  ✅ Added sms_template")
     
+    if 'template_version' not in survey_columns:
+        print("  Adding template_version column to survey...")
+        cursor.execute("ALTER TABLE survey ADD COLUMN template_version INTEGER DEFAULT 1")
+        conn.commit()
+        print("  ✅ Added template_version")
+    
+    # 3. Add normalized phone column to fellow and faculty
+    for table in ('fellow', 'faculty'):
+        cursor.execute(f"PRAGMA table_info({table})")
+        columns = [row[1] for row in cursor.fetchall()]
+        
+        if 'phone_e164' not in columns:
+            print(f"  Adding phone_e164 column to {table}...")
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN phone_e164 VARCHAR(20)")
+            conn.commit()
+            print(f"  ✅ Added phone_e164 to {table}")
+    
+    # 4. Record each outbound text's attempt token, recipient and body
+    cursor.execute("PRAGMA table_info(outbound_message)")
+    outbound_columns = [row[1] for row in cursor.fetchall()]
+    
+    # (no columns means the table doesn't exist yet; 'flask init-db' creates it complete)
+    for column, column_type in (('attempt_token', 'VARCHAR(32)'), ('to_number', 'VARCHAR(20)'), ('body', 'TEXT')):
+        if outbound_columns and column not in outbound_columns:
+            print(f"  Adding {column} column to outbound_message...")
+            cursor.execute(f"ALTER TABLE outbound_message ADD COLUMN {column} {column_type}")
+            conn.commit()
+            print(f"  ✅ Added {column} to outbound_message")
+    
     print()
     print("✅ Database migration complete!")
+    print("   Next: run 'flask init-db', 'flask backfill-phones', then 'python migrate_indexes.py'")
     conn.close()
     
 except Exception as e:
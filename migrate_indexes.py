@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Index migration
+Builds the indexes declared on the models in app.py on an existing
+database, then checks with EXPLAIN QUERY PLAN that the hot queries use them.
+Safe to run more than once.
+"""
+
+import sys
+
+from app import app, db
+
+# (description, SQL, index the plan must use)
+HOT_QUERIES = [
+    ("Recent evaluations (dashboard, tracking)",
+     "SELECT * FROM evaluation ORDER BY sent_at DESC, id DESC LIMIT 50",
+     "ix_evaluation_sent_at"),
+    ("Evaluation counts by status (dashboard)",
+     "SELECT count(*) FROM evaluation WHERE status = 'sent'",
+     "ix_evaluation_status"),
+    ("Delivery status lookup by message SID",
+     "SELECT id, status FROM evaluation WHERE message_sid = 'SM00000000000000000000000000000000'",
+     "ix_evaluation_message_sid"),
+    ("Active rotation blocks",
+     "SELECT * FROM rotation_block WHERE start_date <= '2025-01-10' AND end_date >= '2025-01-10'",
+     "ix_rotation_block_dates"),
+    ("Friday assignments for a block",
+     "SELECT * FROM rotation_assignment WHERE rotation_block_id = 1 AND send_on_fridays = 1",
+     "ix_rotation_assignment_block_fridays"),
+    ("Today's sends",
+     "SELECT rotation_assignment_id FROM send_calendar WHERE send_date = '2025-01-10'",
+     "sqlite_autoindex_send_calendar_1"),
+    ("Due SMS retries",
+     "SELECT * FROM outbound_message WHERE status = 'retrying' AND next_attempt_at <= '2025-01-10 09:00:00'",
+     "ix_outbound_message_due"),
+    ("Send claims by idempotency key",
+     "SELECT * FROM outbound_message WHERE idempotency_key IN ('1:2025-01-10', '2:2025-01-10')",
+     "sqlite_autoindex_outbound_message_1"),
+    ("Fellow lookup by phone",
+     "SELECT id FROM fellow WHERE phone_e164 = '+18135550100'",
+     "ux_fellow_phone_e164"),
+    ("Faculty lookup by phone",
+     "SELECT id FROM faculty WHERE phone_e164 = '+18135550100'",
+     "ux_faculty_phone_e164"),
+    ("Active fellows",
+     "SELECT count(*) FROM fellow WHERE active = 1",
+     "ix_fellow_active"),
+    ("Active faculty",
+     "SELECT count(*) FROM faculty WHERE active = 1",
+     "ix_faculty_active"),
+    ("Active surveys",
+     "SELECT count(*) FROM survey WHERE active = 1",
+     "ix_survey_active"),
+]
+
+
+def build_indexes():
+    """Create every index declared on the models that the database is missing"""
+    created = 0
+    inspector = db.inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing = {ix['name'] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                print(f"  {index.name} already exists")
+                continue
+            print(f"  Creating {index.name}...")
+            index.create(db.engine)
+            created += 1
+    return created
+
+
+def check_query_plans():
+    """Print the plan for each hot query; return the ones not using their index"""
+    missing = []
+    with db.engine.connect() as conn:
+        for description, sql, index_name in HOT_QUERIES:
+            plan = ' | '.join(row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}"))
+            if index_name in plan:
+                print(f"  ✅ {description}: {plan}")
+            else:
+                print(f"  ❌ {description}: {plan}")
+                missing.append(description)
+    return missing
+
+
+if __name__ == '__main__':
+    print("Building indexes...")
+    print()
+
+    try:
+        with app.app_context():
+            db.create_all()
+            created = build_indexes()
+            print()
+            print(f"✅ {created} index(es) created")
+            print()
+
+            if db.engine.dialect.name != 'sqlite':
+                print("Skipping EXPLAIN QUERY PLAN check (SQLite only)")
+                sys.exit(0)
+
+            print("Checking query plans...")
+            missing = check_query_plans()
+            print()
+            if missing:
+                print(f"❌ {len(missing)} hot query(ies) not using an index")
+                sys.exit(1)
+            print("✅ All hot queries use an index")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
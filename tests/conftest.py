@@ -0,0 +1,106 @@
+"""
+Shared fixtures. The app reads its configuration from the environment at
+import time, so the test settings are applied before it is imported: a
+throwaway SQLite database, journal and metrics directories, and the fake
+SMS transport (nothing is ever texted).
+"""
+
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+import pytest
+
+_workdir = tempfile.mkdtemp(prefix='flask_app-tests-')
+os.environ.update({
+    'DATABASE_URL': f"sqlite:///{os.path.join(_workdir, 'test.db')}",
+    'EVAL_LOG_JOURNAL_DIR': os.path.join(_workdir, 'journal'),
+    'METRICS_DIR': os.path.join(_workdir, 'metrics'),
+    'SMS_TRANSPORT': 'fake',
+    'SMS_FAKE_LATENCY_MS': '0',
+    'SMS_SENDER_RATE': '1000',
+    'SMS_SENDER_BURST': '1000',
+    'QUERY_BUDGET_ACTION': 'raise',
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+from app import app, db  # noqa: E402
+
+app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+
+
+@pytest.fixture(autouse=True)
+def database(monkeypatch):
+    """A fresh schema and fresh per-process caches for every test"""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    monkeypatch.setattr(app_module, 'sms_templates', app_module.SmsTemplateCache())
+    monkeypatch.setattr(app_module, 'block_calendar', app_module.BlockCalendar())
+    monkeypatch.setattr(app_module, '_sender_pool', None)
+    monkeypatch.setattr(app_module, '_sms_transport', None)
+    yield
+    app_module.evaluation_log.flush()
+    with app_module._retry_timer_lock:
+        if app_module._retry_timer is not None:
+            app_module._retry_timer.cancel()
+            app_module._retry_timer = None
+
+
+@pytest.fixture
+def transport(monkeypatch):
+    """The fake transport every send goes through; its messages are what was 'texted'"""
+    fake = app_module.FakeTransport(latency_ms=0, error_rate=0, timeout_rate=0, rate_limit=0)
+    monkeypatch.setattr(app_module, '_sms_transport', fake)
+    return fake
+
+
+@pytest.fixture
+def client():
+    """A test client logged in as an admin user"""
+    with app.app_context():
+        user = app_module.User(username='admin')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+    test_client = app.test_client()
+    test_client.post('/login', data={'username': 'admin', 'password': 'password'})
+    return test_client
+
+
+@pytest.fixture
+def seed():
+    """seed(fellows, faculty) adds a block running today with one survey assignment per person.
+    
+    Everyone is due today. Returns a dict of the created ids.
+    """
+    def seed(fellows=3, faculty=0, sms_template='Hi {name}, please complete {survey}: {link}'):
+        today = date.today()
+        with app.app_context():
+            survey = app_module.Survey(name='Weekly', survey_link='https://example.com/s', sms_template=sms_template)
+            block = app_module.RotationBlock(name='Block', start_date=today - timedelta(days=3),
+                                             end_date=today + timedelta(days=3))
+            db.session.add_all([survey, block])
+            db.session.flush()
+            ids = {'survey': survey.id, 'block': block.id, 'fellows': [], 'faculty': [], 'assignments': []}
+            people = [(app_module.Fellow(name=f'Fellow {i}', phone_number=f'813-555-{1000 + i}'), 'fellow')
+                      for i in range(fellows)]
+            people += [(app_module.Faculty(name=f'Faculty {i}', phone_number=f'727-555-{2000 + i}'), 'faculty')
+                       for i in range(faculty)]
+            for person, kind in people:
+                db.session.add(person)
+                db.session.flush()
+                assignment = app_module.RotationAssignment(
+                    survey_id=survey.id, rotation_block_id=block.id, recipient_type=kind, send_date=today,
+                    fellow_id=person.id if kind == 'fellow' else None,
+                    faculty_id=person.id if kind == 'faculty' else None
+                )
+                db.session.add(assignment)
+                db.session.flush()
+                ids['fellows' if kind == 'fellow' else 'faculty'].append(person.id)
+                ids['assignments'].append(assignment.id)
+            db.session.commit()
+        return ids
+    return seed
@@ -0,0 +1,57 @@
+"""Bulk assignment: pairs already in the block are skipped, even ones added after the form was read."""
+
+import pytest
+
+from conftest import app, app_module, db
+
+RotationAssignment = app_module.RotationAssignment
+
+
+@pytest.fixture
+def concurrent_duplicate():
+    """Insert the first requested pair just before the bulk insert runs, as a concurrent request would"""
+    def add_first(state):
+        if state.is_insert and not added:
+            added.append(state.parameters[0])
+            state.session.connection().execute(db.insert(RotationAssignment.__table__).values(**state.parameters[0]))
+    added = []
+    db.event.listen(db.Session, 'do_orm_execute', add_first)
+    yield added
+    db.event.remove(db.Session, 'do_orm_execute', add_first)
+
+
+def _pairs(block_id):
+    with app.app_context():
+        return sorted(db.session.query(RotationAssignment.fellow_id, RotationAssignment.survey_id)
+                      .filter_by(rotation_block_id=block_id))
+
+
+def _last_flash(client):
+    with client.session_transaction() as session:
+        return session['_flashes'][-1][1]
+
+
+def test_existing_pairs_are_skipped(seed, client):
+    ids = seed(fellows=2)
+    response = client.post(f"/assignments/bulk-add/{ids['block']}",
+                           data={'fellow_ids': ids['fellows'], 'survey_ids': [ids['survey']]})
+
+    assert response.status_code == 302
+    assert _last_flash(client) == 'Added 0 assignments, skipped 2 duplicates'
+
+
+def test_pair_added_concurrently_is_skipped(seed, client, concurrent_duplicate):
+    ids = seed(fellows=0)
+    with app.app_context():
+        people = [app_module.Fellow(name=f'New {i}', phone_number=f'813-555-{3000 + i}') for i in range(2)]
+        db.session.add_all(people)
+        db.session.commit()
+        fellow_ids = [person.id for person in people]
+
+    response = client.post(f"/assignments/bulk-add/{ids['block']}",
+                           data={'fellow_ids': fellow_ids, 'survey_ids': [ids['survey']]})
+
+    assert response.status_code == 302
+    assert concurrent_duplicate
+    assert _last_flash(client) == 'Added 1 assignments, skipped 1 duplicates'
+    assert _pairs(ids['block']) == [(fellow_id, ids['survey']) for fellow_id in fellow_ids]
@@ -0,0 +1,55 @@
+"""The block assignments page: recipients and surveys load in bulk, so the query count is constant."""
+
+from datetime import date
+
+from conftest import app, app_module, db
+
+
+def _get(client, path):
+    """GET path; returns the response and the number of SQL statements it ran"""
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    with app.app_context():
+        engine = db.engine
+    db.event.listen(engine, 'before_cursor_execute', count)
+    try:
+        response = client.get(path)
+    finally:
+        db.event.remove(engine, 'before_cursor_execute', count)
+    assert response.status_code == 200
+    return response, len(statements)
+
+
+def _small_block(ids):
+    """A second block with one fellow and one faculty assignment"""
+    with app.app_context():
+        block = app_module.RotationBlock(name='Small', start_date=date(2026, 1, 5), end_date=date(2026, 1, 11))
+        db.session.add(block)
+        db.session.flush()
+        db.session.add_all([
+            app_module.RotationAssignment(survey_id=ids['survey'], rotation_block_id=block.id,
+                                          recipient_type='fellow', fellow_id=ids['fellows'][0]),
+            app_module.RotationAssignment(survey_id=ids['survey'], rotation_block_id=block.id,
+                                          recipient_type='faculty', faculty_id=ids['faculty'][0]),
+        ])
+        db.session.commit()
+        return block.id
+
+
+def test_page_query_count_does_not_grow_with_the_block(seed, client):
+    ids = seed(fellows=40, faculty=20)
+    small_block = _small_block(ids)
+    with app.app_context():
+        # Off the page's pick lists, so only the assignment rows load them
+        for model in (app_module.Fellow, app_module.Faculty):
+            db.session.query(model).update({'active': False})
+        db.session.commit()
+
+    large, large_statements = _get(client, f"/assignments/block/{ids['block']}")
+    small, small_statements = _get(client, f"/assignments/block/{small_block}")
+
+    assert large_statements == small_statements
+    assert b'Fellow 39' in large.data and b'Faculty 19' in large.data
+    assert b'Fellow 0' in small.data and b'Faculty 0' in small.data
@@ -0,0 +1,79 @@
+"""The rotation block interval index: correct overlaps, and only committed blocks are ever cached."""
+
+import random
+from datetime import date, timedelta
+
+from conftest import app, app_module, db
+
+RotationBlock = app_module.RotationBlock
+
+
+def _add_block(name, start, days):
+    with app.app_context():
+        block = RotationBlock(name=name, start_date=start, end_date=start + timedelta(days=days))
+        db.session.add(block)
+        db.session.commit()
+        return block.id
+
+
+def test_overlaps_match_a_full_scan():
+    rng = random.Random(11)
+    origin = date(2026, 1, 1)
+    blocks = {}
+    for i in range(60):
+        start = origin + timedelta(days=rng.randrange(365))
+        length = rng.randrange(30)
+        blocks[_add_block(f'B{i}', start, length)] = (start, start + timedelta(days=length))
+
+    with app.app_context():
+        for _ in range(200):
+            start = origin + timedelta(days=rng.randrange(-10, 375))
+            end = start + timedelta(days=rng.randrange(20))
+            expected = sorted(block_id for block_id, (block_start, block_end) in blocks.items()
+                              if block_start <= end and block_end >= start)
+            assert sorted(app_module.block_calendar.overlapping(start, end)) == expected
+
+
+def test_uncommitted_blocks_are_never_cached():
+    start = date(2026, 3, 2)
+    with app.app_context():
+        db.session.add(RotationBlock(name='Rolled back', start_date=start, end_date=start + timedelta(days=6)))
+        db.session.flush()
+        assert app_module.block_calendar.overlapping(start, start) == []
+        db.session.rollback()
+
+    # Reuses the version number the rolled-back insert bumped to
+    kept = _add_block('Kept', start + timedelta(days=2), 6)
+    with app.app_context():
+        assert app_module.block_calendar.overlapping(start, start) == []
+        assert app_module.block_calendar.overlapping(start + timedelta(days=3), start + timedelta(days=3)) == [kept]
+
+
+def test_create_weeks_skips_weeks_that_overlap():
+    start = date(2026, 6, 1)
+    _add_block('Existing', start + timedelta(days=8), 2)
+
+    with app.app_context():
+        created, skipped = app_module.block_calendar.create_weeks(start, 3, 'Week {week}')
+        names = sorted(name for (name,) in db.session.query(RotationBlock.name))
+
+    assert (created, skipped) == (2, ['Week 2'])
+    assert names == ['Existing', 'Week 1', 'Week 3']
+
+
+def test_version_is_checked_once_per_context_and_after_a_commit(monkeypatch):
+    start = date(2026, 9, 7)
+    first = _add_block('First', start, 6)
+    checks = []
+    get_version = app_module.get_version
+    monkeypatch.setattr(app_module, 'get_version', lambda *args: checks.append(args[0]) or get_version(*args))
+
+    with app.app_context():
+        for day in range(7):
+            assert app_module.block_calendar.active_block_ids(start + timedelta(days=day)) == [first]
+        assert len(checks) == 1
+
+        db.session.add(RotationBlock(name='Second', start_date=start, end_date=start))
+        db.session.commit()
+        assert len(app_module.block_calendar.active_block_ids(start)) == 2
+        assert len(checks) == 2
@@ -0,0 +1,57 @@
+"""Dashboard counters stay equal to a full recount through ORM edits, bulk log writes and status callbacks."""
+
+from conftest import app, app_module, db
+
+
+def _counters_match_recount():
+    with app.app_context():
+        maintained = app_module.get_dashboard_counters()
+        recounted = {name: count() for name, count in app_module.DASHBOARD_COUNTERS.items()}
+    assert {name: maintained[name] for name in recounted} == recounted
+    return recounted
+
+
+def test_orm_changes_keep_counters_in_step(seed):
+    ids = seed(fellows=3, faculty=1)
+    _counters_match_recount()
+
+    with app.app_context():
+        fellows = [db.session.get(app_module.Fellow, fellow_id) for fellow_id in ids['fellows']]
+        fellows[0].active = False
+        db.session.delete(db.session.get(app_module.Faculty, ids['faculty'][0]))
+        db.session.add(app_module.Fellow(name='Inactive', phone_number='813-555-0199', active=False))
+        db.session.commit()
+
+    counters = _counters_match_recount()
+    assert counters['active_fellows'] == 2
+    assert counters['active_faculty'] == 0
+
+
+def test_bulk_log_writes_and_status_callbacks_keep_counters_in_step(seed, transport):
+    seed(fellows=4)
+    with app.app_context():
+        app_module.get_dashboard_counters()
+        plan = app_module.build_send_plan()
+    app_module.dispatch_evaluations(plan)
+    app_module.evaluation_log.flush()
+    assert _counters_match_recount()['evaluations_sent'] == 4
+
+    with app.app_context():
+        sids = [sid for (sid,) in db.session.query(app_module.Evaluation.message_sid)]
+    buffer = app_module.DeliveryStatusBuffer()
+    buffer.add(sids[0], 'delivered')
+    buffer.add(sids[1], 'undelivered', error_code=30003)
+    buffer.flush()
+
+    counters = _counters_match_recount()
+    assert (counters['evaluations_sent'], counters['evaluations_delivered'],
+            counters['evaluations_undelivered']) == (2, 1, 1)
+
+
+def test_missing_counters_are_rebuilt(seed):
+    seed(fellows=2)
+    with app.app_context():
+        db.session.query(app_module.DashboardCounter).delete()
+        db.session.commit()
+
+    assert _counters_match_recount()['active_fellows'] == 2
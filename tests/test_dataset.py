@@ -0,0 +1,62 @@
+"""The synthetic dataset generator: the same seed gives the same data, loaded consistently and in bulk."""
+
+from datetime import date
+
+from conftest import app, app_module, db
+
+SIZE = dict(fellows=40, faculty=12, surveys=3, weeks=10, per_block=6, evaluations=500, today=date(2026, 3, 4))
+
+
+def _generate(seed):
+    with app.app_context():
+        counts = app_module.generate_dataset(seed, chunk_size=128, **SIZE)
+        snapshot = (
+            db.session.query(app_module.Fellow.name, app_module.Fellow.phone_number).order_by('id').all(),
+            db.session.query(app_module.Evaluation.rotation_assignment_id, app_module.Evaluation.sent_at,
+                             app_module.Evaluation.status).order_by('id').all(),
+        )
+        return counts, snapshot
+
+
+def _reset():
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+
+def test_same_seed_same_data():
+    counts, first = _generate(7)
+    _reset()
+    assert _generate(7) == (counts, first)
+    _reset()
+    assert _generate(8)[1] != first
+
+
+def test_rows_are_consistent_with_the_app():
+    counts, _ = _generate(3)
+
+    with app.app_context():
+        assert counts == {'surveys': 3, 'fellows': 40, 'faculty': 12, 'rotation_blocks': 10,
+                          'assignments': db.session.query(app_module.RotationAssignment).count(),
+                          'evaluations': db.session.query(app_module.Evaluation).count()}
+        assert counts['evaluations'] == 500
+        phones = [phone for (phone,) in db.session.query(app_module.Fellow.phone_e164)]
+        phones += [phone for (phone,) in db.session.query(app_module.Faculty.phone_e164)]
+        assert len(set(phones)) == 52 and all(phone.startswith('+1') and len(phone) == 12 for phone in phones)
+
+        stored = dict(db.session.query(app_module.DashboardCounter.name, app_module.DashboardCounter.value))
+        assert {name: stored[name] for name in app_module.DASHBOARD_COUNTERS} == \
+            {name: count() for name, count in app_module.DASHBOARD_COUNTERS.items()}
+        assert db.session.query(app_module.SendCalendar).count() > 0
+
+
+def test_cli_refuses_a_database_with_data():
+    runner = app.test_cli_runner()
+    args = ['generate-dataset', '--seed', '1', '--fellows', '5', '--faculty', '2', '--weeks', '2',
+            '--per-block', '2', '--evaluations', '10']
+
+    first = runner.invoke(args=args)
+    assert first.exit_code == 0 and 'evaluations: ' in first.output
+
+    second = runner.invoke(args=args)
+    assert second.exit_code == 1 and 'already has data' in second.output
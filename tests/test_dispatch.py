@@ -0,0 +1,88 @@
+import threading
+from datetime import date
+
+from app import app, db, Evaluation, RotationAssignment, build_send_plan, dispatch_evaluations
+import app as app_module
+
+
+def send_today():
+    with app.app_context():
+        plan = build_send_plan(date.today(), include_already_sent=True)
+        db.session.close()
+    return dispatch_evaluations(plan, date.today())
+
+
+def test_every_recipient_is_texted_once(seed, transport):
+    seed(fellows=12, faculty=4)
+    
+    counts = send_today()
+    
+    assert counts == {'success': 16, 'failed': 0, 'retrying': 0, 'already_sent': 0}
+    assert transport.sent == 16
+    assert all(len(messages) == 1 for messages in transport._messages.values())
+    with app.app_context():
+        assert Evaluation.query.filter_by(status='sent').count() == 16
+        assert {a.last_sent for a in RotationAssignment.query} == {date.today()}
+
+
+def test_worker_pool_is_bounded(seed, transport, monkeypatch):
+    seed(fellows=20)
+    active = []
+    peak = []
+    lock = threading.Lock()
+    original = transport._send
+    
+    def tracking_send(to, body, **options):
+        with lock:
+            active.append(to)
+            peak.append(len(active))
+        try:
+            return original(to, body, **options)
+        finally:
+            with lock:
+                active.remove(to)
+    
+    monkeypatch.setattr(transport, '_send', tracking_send)
+    with app.app_context():
+        plan = build_send_plan(date.today(), include_already_sent=True)
+        db.session.close()
+    counts = dispatch_evaluations(plan, date.today(), max_workers=3)
+    
+    assert counts['success'] == 20
+    assert max(peak) <= 3
+
+
+def test_second_run_sends_nothing(seed, transport):
+    seed(fellows=5)
+    
+    send_today()
+    counts = send_today()
+    
+    assert counts['success'] == 0
+    assert counts['already_sent'] == 5
+    assert transport.sent == 5
+
+
+def test_concurrent_runs_send_each_text_once(seed, transport):
+    seed(fellows=10)
+    results = []
+    runs = [threading.Thread(target=lambda: results.append(send_today())) for _ in range(3)]
+    for run in runs:
+        run.start()
+    for run in runs:
+        run.join()
+    
+    assert transport.sent == 10
+    assert sum(result['success'] for result in results) == 10
+
+
+def test_failed_send_is_logged(seed, transport, monkeypatch):
+    seed(fellows=2)
+    transport.error_rate = 1.0
+    monkeypatch.setattr(app_module, 'RETRY_MAX_ATTEMPTS', 1)
+    
+    counts = send_today()
+    
+    assert counts['failed'] == 2
+    with app.app_context():
+        assert Evaluation.query.filter_by(status='failed').count() == 2
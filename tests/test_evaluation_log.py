@@ -0,0 +1,111 @@
+"""Journal recovery: send history left behind by a crashed worker reaches the database exactly once."""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+from datetime import date, datetime
+
+from conftest import app, app_module, db
+
+
+def _dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def _write_journal(pid, entries, suffix=''):
+    journal_dir = app_module.evaluation_log.journal_dir
+    os.makedirs(journal_dir, exist_ok=True)
+    path = os.path.join(journal_dir, f'evaluations.{pid}.journal{suffix}')
+    with open(path, 'w', encoding='utf-8') as journal:
+        for entry in entries:
+            journal.write(json.dumps(entry) + '\n')
+    return path
+
+
+def _entry(ids, index=0, sid=None):
+    return {
+        'fellow_id': ids['fellows'][index],
+        'survey_id': ids['survey'],
+        'status': 'sent',
+        'message_sid': sid or f'SM{index}',
+        'sent_at': datetime.utcnow().isoformat(),
+        'rotation_assignment_id': ids['assignments'][index],
+        'last_sent': date.today().isoformat(),
+    }
+
+
+def _evaluation_count():
+    with app.app_context():
+        return db.session.query(app_module.Evaluation).count()
+
+
+def test_startup_replays_dead_workers_journal(seed):
+    ids = seed(fellows=2)
+    path = _write_journal(_dead_pid(), [_entry(ids, 0), _entry(ids, 1)])
+
+    app_module.recover_evaluation_log()
+
+    assert _evaluation_count() == 2
+    assert not os.path.exists(path)
+    with app.app_context():
+        assignment = db.session.get(app_module.RotationAssignment, ids['assignments'][0])
+        assert assignment.last_sent == date.today()
+
+
+def test_replay_skips_entries_already_flushed(seed):
+    ids = seed(fellows=2)
+    with app.app_context():
+        db.session.add(app_module.Evaluation(fellow_id=ids['fellows'][0], survey_id=ids['survey'],
+                                             message_sid='SM0', status='sent'))
+        db.session.commit()
+    _write_journal(_dead_pid(), [_entry(ids, 0), _entry(ids, 1)])
+
+    app_module.recover_evaluation_log()
+
+    assert _evaluation_count() == 2
+
+
+def test_live_workers_journals_are_left_alone(seed):
+    ids = seed(fellows=1)
+    live = _write_journal(os.getppid(), [_entry(ids)])
+    claimed = _write_journal(_dead_pid(), [_entry(ids)], suffix=f'.{os.getppid()}.recovering')
+
+    app_module.recover_evaluation_log()
+
+    assert _evaluation_count() == 0
+    assert os.path.exists(live) and os.path.exists(claimed)
+    os.remove(live)
+    os.remove(claimed)
+
+
+def test_abandoned_claim_is_recovered(seed):
+    ids = seed(fellows=1)
+    path = _write_journal(_dead_pid(), [_entry(ids)], suffix=f'.{_dead_pid()}.recovering')
+
+    app_module.recover_evaluation_log()
+
+    assert _evaluation_count() == 1
+    assert not os.path.exists(path)
+
+
+def test_concurrent_recovery_inserts_once(seed):
+    ids = seed(fellows=3)
+    _write_journal(_dead_pid(), [_entry(ids, i) for i in range(3)])
+    writers = [app_module.EvaluationLogWriter(app_module.evaluation_log.journal_dir) for _ in range(4)]
+    barrier = threading.Barrier(len(writers))
+
+    def recover(writer):
+        barrier.wait()
+        writer.recover()
+
+    threads = [threading.Thread(target=recover, args=(writer,)) for writer in writers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert _evaluation_count() == 3
@@ -0,0 +1,65 @@
+"""Evaluation export: every row names its recipient, fellow or faculty, with the normalized phone."""
+
+import csv
+import io
+import json
+
+from conftest import app, app_module, db
+
+
+def _send_run(seed, fellows, faculty):
+    ids = seed(fellows=fellows, faculty=faculty)
+    with app.app_context():
+        plan = app_module.build_send_plan()
+    app_module.dispatch_evaluations(plan)
+    return ids
+
+
+def _export(client, fmt='jsonl'):
+    response = client.get(f'/tracking/export?format={fmt}')
+    assert response.status_code == 200
+    text = response.get_data(as_text=True)
+    if fmt == 'csv':
+        return list(csv.DictReader(io.StringIO(text)))
+    return [json.loads(line) for line in text.splitlines()]
+
+
+def test_faculty_rows_export_their_recipient(seed, client, transport):
+    ids = _send_run(seed, fellows=1, faculty=1)
+    rows = sorted(_export(client), key=lambda row: row['recipient_type'])
+
+    assert [(row['recipient_type'], row['recipient_name'], row['recipient_phone'], row['rotation_block'])
+            for row in rows] == [('faculty', 'Faculty 0', '+17275552000', 'Block'),
+                                 ('fellow', 'Fellow 0', '+18135551000', 'Block')]
+    with app.app_context():
+        faculty_row = db.session.query(app_module.Evaluation).filter_by(recipient_type='faculty').one()
+    assert faculty_row.faculty_id == ids['faculty'][0] and faculty_row.fellow_id is None
+
+
+def test_rows_logged_without_recipient_ids_follow_the_assignment(seed, client, transport):
+    _send_run(seed, fellows=0, faculty=1)
+    with app.app_context():
+        # As logged before faculty_id and recipient_type were recorded
+        db.session.query(app_module.Evaluation).update({'faculty_id': None, 'recipient_type': 'fellow'})
+        db.session.commit()
+
+    [row] = _export(client, 'csv')
+    assert (row['recipient_type'], row['recipient_name'], row['recipient_phone']) == \
+        ('faculty', 'Faculty 0', '+17275552000')
+
+
+def test_csv_cells_that_look_like_formulas_are_escaped(seed, client, transport):
+    ids = _send_run(seed, fellows=1, faculty=0)
+    with app.app_context():
+        db.session.get(app_module.Fellow, ids['fellows'][0]).name = '=HYPERLINK("http://evil")'
+        db.session.get(app_module.Survey, ids['survey']).name = '@SUM(A1)'
+        db.session.query(app_module.Evaluation).update({'notes': '-1+2'})
+        db.session.commit()
+
+    [row] = _export(client, 'csv')
+    assert (row['recipient_name'], row['survey'], row['notes']) == \
+        ('\'=HYPERLINK("http://evil")', "'@SUM(A1)", "'-1+2")
+    assert row['recipient_phone'] == '+18135551000'
+
+    [line] = _export(client)
+    assert line['recipient_name'] == '=HYPERLINK("http://evil")'
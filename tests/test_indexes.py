@@ -0,0 +1,27 @@
+"""The index migration: it builds missing indexes on an existing database, and every hot query uses one."""
+
+import migrate_indexes
+
+from conftest import app, db
+
+
+def _index_names(table):
+    return {index['name'] for index in db.inspect(db.engine).get_indexes(table)}
+
+
+def test_missing_indexes_are_built_once():
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql('DROP INDEX ix_evaluation_sent_at')
+            conn.exec_driver_sql('DROP INDEX ix_fellow_active')
+        assert 'ix_evaluation_sent_at' not in _index_names('evaluation')
+
+        assert migrate_indexes.build_indexes() == 2
+        assert migrate_indexes.build_indexes() == 0
+        assert 'ix_evaluation_sent_at' in _index_names('evaluation')
+        assert 'ix_fellow_active' in _index_names('fellow')
+
+
+def test_hot_queries_use_their_indexes():
+    with app.app_context():
+        assert migrate_indexes.check_query_plans() == []
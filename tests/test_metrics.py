@@ -0,0 +1,74 @@
+"""Request metrics: counters add up across processes and never go backwards when a worker exits."""
+
+import json
+import multiprocessing
+import os
+
+from conftest import app, app_module
+
+SharedMetrics = app_module.SharedMetrics
+KEY = SharedMetrics._key('http_requests_total', {'endpoint': 'index', 'method': 'GET', 'status': '200'})
+
+
+def _count_in_child(directory, times):
+    def child():
+        shared = SharedMetrics(directory)
+        for _ in range(times):
+            shared.inc('http_requests_total', {'endpoint': 'index', 'method': 'GET', 'status': '200'})
+    process = multiprocessing.get_context('fork').Process(target=child)
+    process.start()
+    process.join()
+
+
+def test_dead_workers_counts_are_archived_not_dropped(tmp_path):
+    directory = str(tmp_path)
+    _count_in_child(directory, 3)
+    _count_in_child(directory, 4)
+    shared = SharedMetrics(directory)
+    assert shared.collect()[KEY] == 7
+
+    shared.inc('http_requests_total', {'endpoint': 'index', 'method': 'GET', 'status': '200'})  # archives the dead
+
+    assert shared.collect()[KEY] == 8
+    assert [name for name in os.listdir(directory) if name.endswith('.db')] == [f'metrics.{os.getpid()}.db']
+
+
+def test_archiving_interrupted_after_the_archive_is_written_counts_once(tmp_path):
+    directory = str(tmp_path)
+    _count_in_child(directory, 5)
+    shared = SharedMetrics(directory)
+    [path] = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.db')]
+    leftover = f'{path[:-3]}.abcd.archiving'
+    os.rename(path, leftover)
+    with open(os.path.join(directory, 'metrics.archive.json'), 'w', encoding='utf-8') as f:
+        json.dump({'values': {KEY: 5.0}, 'merged': [os.path.basename(leftover)]}, f)
+
+    assert shared.collect()[KEY] == 5
+    shared.inc('http_requests_total', {'endpoint': 'index', 'method': 'GET', 'status': '200'})
+    assert shared.collect()[KEY] == 6
+    assert not os.path.exists(leftover)
+
+
+def test_metrics_token(monkeypatch):
+    monkeypatch.setattr(app_module, 'METRICS_TOKEN', 's3cret')
+    client = app.test_client()
+
+    assert client.get('/metrics', headers={'Authorization': 'Bearer s3cret'}).status_code == 200
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer sécret'}).status_code == 401
+    assert client.get('/metrics').status_code == 401
+
+
+def test_sms_latency_is_labelled_by_endpoint(tmp_path, monkeypatch):
+    shared = SharedMetrics(str(tmp_path))
+    monkeypatch.setattr(app_module, 'metrics', shared)
+    transport = app_module.FakeTransport(latency_ms=0, error_rate=0, timeout_rate=0, rate_limit=0)
+
+    transport.send('+18135550001', 'Hi', from_='+15550000000')
+    transport.recent_messages('+18135550001')
+
+    def count(endpoint):
+        labels = {'transport': 'fake', 'endpoint': endpoint, 'outcome': 'ok'}
+        return shared.collect().get(SharedMetrics._key('sms_send_seconds', labels, 'count'))
+    assert count('messages.create') == 1
+    assert count('messages.list') == 1
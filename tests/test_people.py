@@ -0,0 +1,59 @@
+"""Adding and editing people: phone numbers are checked before they are looked up or saved."""
+
+import pytest
+
+from conftest import app, app_module, db
+
+
+def _person(model, name='Ada', phone='813-555-0001'):
+    with app.app_context():
+        person = model(name=name, phone_number=phone)
+        db.session.add(person)
+        db.session.commit()
+        return person.id
+
+
+def _phone(model, person_id):
+    with app.app_context():
+        return db.session.get(model, person_id).phone_e164
+
+
+def _last_flash(client):
+    with client.session_transaction() as session:
+        return session['_flashes'][-1]
+
+
+@pytest.mark.parametrize('model, kind', [(app_module.Fellow, 'fellows'), (app_module.Faculty, 'faculty')])
+@pytest.mark.parametrize('form', [{'name': 'Ada'}, {'name': 'Ada', 'phone_number': 'n/a'}])
+def test_edit_rejects_a_missing_or_garbage_phone(client, model, kind, form):
+    person_id = _person(model)
+    response = client.post(f'/{kind}/edit/{person_id}', data=form)
+
+    assert response.status_code == 302 and response.location.endswith(f'/{kind}/edit/{person_id}')
+    assert _last_flash(client)[0] == 'error'
+    assert _phone(model, person_id) == '+18135550001'
+
+
+@pytest.mark.parametrize('model, kind', [(app_module.Fellow, 'fellows'), (app_module.Faculty, 'faculty')])
+def test_edit_saves_the_normalized_phone(client, model, kind):
+    person_id = _person(model)
+    client.post(f'/{kind}/edit/{person_id}', data={'name': 'Ada', 'phone_number': ' (813) 555-0009 ', 'active': 'on'})
+
+    assert _phone(model, person_id) == '+18135550009'
+
+
+def test_edit_onto_someone_elses_phone_is_rejected(client):
+    person_id = _person(app_module.Fellow)
+    _person(app_module.Faculty, name='Dr Bo', phone='813-555-0002')
+    client.post(f'/fellows/edit/{person_id}', data={'name': 'Ada', 'phone_number': '8135550002'})
+
+    assert 'Dr Bo already uses' in _last_flash(client)[1]
+    assert _phone(app_module.Fellow, person_id) == '+18135550001'
+
+
+def test_add_rejects_a_garbage_phone(client):
+    response = client.post('/faculty/add', data={'name': 'Dr Cy', 'phone_number': 'call me'})
+
+    assert response.status_code == 302 and _last_flash(client)[0] == 'error'
+    with app.app_context():
+        assert db.session.query(app_module.Faculty).count() == 0
@@ -0,0 +1,116 @@
+"""Outbox idempotency: a scheduled text goes out at most once, whichever attempt gets there first."""
+
+from datetime import date, datetime, timedelta
+
+from conftest import app, app_module, db
+
+OutboundMessage = app_module.OutboundMessage
+
+
+def _plan():
+    with app.app_context():
+        return app_module.build_send_plan()
+
+
+def _make_stale():
+    with app.app_context():
+        stale = datetime.utcnow() - timedelta(seconds=app_module.RETRY_STALE_AFTER + 1)
+        db.session.query(OutboundMessage).update({'claimed_at': stale})
+        db.session.commit()
+
+
+def _outbox():
+    with app.app_context():
+        return db.session.query(OutboundMessage).one()
+
+
+def test_stale_reclaim_and_queued_original_send_once(seed, transport):
+    seed(fellows=1)
+    plan, _ = app_module.claim_sends(_plan(), date.today())
+    _make_stale()  # the original run is still waiting on the rate limiter
+
+    assert app_module.process_retries()['success'] == 1
+    assert app_module.dispatch_evaluations(plan, claim=False)['already_sent'] == 1
+    assert transport.sent == 1
+
+
+def test_original_send_then_stale_reclaim_reconciles(seed, transport):
+    seed(fellows=1)
+    plan, _ = app_module.claim_sends(_plan(), date.today())
+    app_module.render_plan_messages(plan)
+    with app.app_context():
+        # The text goes out, then the worker dies before logging it
+        app_module.send_evaluation_sms(plan[0]['recipient'], plan[0]['survey'],
+                                       message_body=plan[0]['message'], outbox=plan[0]['outbox'])
+    app_module.evaluation_log._buffer.clear()
+    _make_stale()
+
+    assert app_module.process_retries()['success'] == 1
+    assert transport.sent == 1
+    assert _outbox().status == 'sent'
+
+
+def test_retry_reuses_the_first_attempts_text(seed, transport):
+    ids = seed(fellows=1)
+    transport.timeout_rate = 1  # accepted by the provider, but the response is lost
+    assert app_module.dispatch_evaluations(_plan())['retrying'] == 1
+    transport.timeout_rate = 0
+    first = _outbox()
+    assert first.needs_reconcile and first.body
+
+    with app.app_context():
+        survey = db.session.get(app_module.Survey, ids['survey'])
+        survey.sms_template = 'Changed since the first attempt: {link}'
+        db.session.commit()
+
+    counts = app_module.process_retries(now=first.next_attempt_at + timedelta(seconds=1))
+    assert counts['success'] == 1
+    assert transport.sent == 1
+    assert _outbox().status == 'sent'
+
+
+def test_lost_claim_does_not_send(seed, transport):
+    seed(fellows=1)
+    plan, _ = app_module.claim_sends(_plan(), date.today())
+    plan[0]['outbox']['token'] = 'superseded'
+
+    assert app_module.dispatch_evaluations(plan, claim=False)['already_sent'] == 1
+    assert transport.sent == 0
+
+
+def _restart():
+    """Drop this process's retry timer, as a restart would"""
+    with app_module._retry_timer_lock:
+        if app_module._retry_timer is not None:
+            app_module._retry_timer.cancel()
+            app_module._retry_timer = None
+
+
+def test_overdue_retries_are_sent_after_a_restart(seed, transport):
+    seed(fellows=1)
+    transport.error_rate = 1
+    assert app_module.dispatch_evaluations(_plan())['retrying'] == 1
+    transport.error_rate = 0
+    _restart()
+    with app.app_context():
+        db.session.query(OutboundMessage).update({'next_attempt_at': datetime.utcnow() - timedelta(minutes=5)})
+        db.session.commit()
+
+    app_module.arm_retry_timer()
+    app_module._retry_timer.join(timeout=5)
+
+    assert transport.sent == 1
+    assert _outbox().status == 'sent'
+
+
+def test_sends_abandoned_by_a_restart_are_reclaimed(seed, transport):
+    seed(fellows=1)
+    app_module.claim_sends(_plan(), date.today())  # the run's thread died with its process
+    _make_stale()
+    _restart()
+
+    app_module.arm_retry_timer()
+    app_module._retry_timer.join(timeout=5)
+
+    assert transport.sent == 1
+    assert _outbox().status == 'sent'
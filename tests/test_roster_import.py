@@ -0,0 +1,103 @@
+"""Roster import: updates keep what the file doesn't say, and every row is checked before anything is written."""
+
+import io
+
+from conftest import app, app_module, db
+
+Fellow = app_module.Fellow
+
+
+def _people(*people):
+    with app.app_context():
+        for name, phone, email in people:
+            db.session.add(Fellow(name=name, phone_number=phone, email=email))
+        db.session.commit()
+
+
+def _import(text, **options):
+    with app.app_context():
+        return app_module.import_roster(Fellow, io.StringIO(text), **options)
+
+
+def _fellows():
+    with app.app_context():
+        return {fellow.name: (fellow.phone_e164, fellow.email, fellow.active)
+                for fellow in Fellow.query.order_by(Fellow.name)}
+
+
+def test_reimport_changes_nothing():
+    _people(('Ada', '813-555-0001', 'ada@example.com'))
+    report = _import('name,phone,email\nAda,(813) 555-0001,ADA@example.com\n')
+
+    assert report['unchanged'] == 1 and not report['updated'] and not report['errors']
+
+
+def test_missing_or_blank_email_keeps_the_one_on_file():
+    _people(('Ada', '813-555-0001', 'ada@example.com'), ('Bo', '813-555-0002', 'bo@example.com'))
+    _import('name,phone\nAda Lovelace,813-555-0001\n')
+    _import('name,phone,email\nBo Diddley,813-555-0002,\n')
+
+    assert _fellows() == {'Ada Lovelace': ('+18135550001', 'ada@example.com', True),
+                          'Bo Diddley': ('+18135550002', 'bo@example.com', True)}
+
+
+def test_people_can_swap_phones():
+    _people(('Ada', '813-555-0001', 'ada@example.com'), ('Bo', '813-555-0002', 'bo@example.com'))
+    report = _import('name,phone,email\nAda,813-555-0002,ada@example.com\nBo,813-555-0001,bo@example.com\n')
+
+    assert not report['errors']
+    assert _fellows() == {'Ada': ('+18135550002', 'ada@example.com', True),
+                          'Bo': ('+18135550001', 'bo@example.com', True)}
+
+
+def test_update_onto_someone_elses_phone_is_rejected():
+    _people(('Ada', '813-555-0001', 'ada@example.com'), ('Bo', '813-555-0002', 'bo@example.com'))
+    with app.app_context():
+        db.session.add(app_module.Faculty(name='Dr Cy', phone_number='813-555-0003'))
+        db.session.commit()
+    report = _import('name,phone,email\nAda,813-555-0002,ada@example.com\nBo,813-555-0003,bo@example.com\n',
+                     deactivate_missing=True)
+
+    assert report['errors'] == [(2, "phone number '813-555-0002' belongs to Bo"),
+                                (3, "phone number '813-555-0003' belongs to someone in faculty")]
+    assert report['deactivated'] == []
+    assert _fellows() == {'Ada': ('+18135550001', 'ada@example.com', True),
+                          'Bo': ('+18135550002', 'bo@example.com', True)}
+
+
+def test_people_missing_from_the_file_stay_active_unless_asked():
+    _people(('Ada', '813-555-0001', None), ('Bo', '813-555-0002', None))
+    assert _import('name,phone\nAda,813-555-0001\n')['deactivated'] == []
+    assert _fellows()['Bo'][2] is True
+
+    assert _import('name,phone\nAda,813-555-0001\n', deactivate_missing=True)['deactivated'] == ['Bo']
+    assert _fellows()['Bo'][2] is False
+
+
+def test_upload_with_conflicts_reports_them(client):
+    _people(('Ada', '813-555-0001', 'ada@example.com'), ('Bo', '813-555-0002', 'bo@example.com'))
+    roster = io.BytesIO(b'name,phone,email\nAda,813-555-0002,ada@example.com\n')
+    response = client.post('/roster/import/fellows', data={'roster': (roster, 'fellows.csv')},
+                           content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    assert b'belongs to Bo' in response.data
+    assert _fellows()['Ada'][0] == '+18135550001'
+
+
+def test_write_conflict_is_rolled_back_and_reported(client, monkeypatch):
+    _people(('Ada', '813-555-0001', None))
+
+    def concurrent_insert(deltas):
+        # Someone else took the new phone after the roster was checked
+        db.session.execute(db.insert(Fellow.__table__).values(name='Late', phone_number='813-555-0005',
+                                                              phone_e164='+18135550005', active=True))
+    monkeypatch.setattr(app_module, 'bump_dashboard_counters', concurrent_insert)
+    roster = io.BytesIO(b'name,phone\nAda Lovelace,813-555-0001\nNew,813-555-0005\n')
+    response = client.post('/roster/import/fellows', data={'roster': (roster, 'fellows.csv')},
+                           content_type='multipart/form-data')
+
+    assert response.status_code == 302
+    with client.session_transaction() as session:
+        assert 'nothing was changed' in session['_flashes'][-1][1]
+    assert _fellows() == {'Ada': ('+18135550001', None, True)}
@@ -0,0 +1,84 @@
+"""The send calendar: (date, assignment) rows follow every change to assignments and blocks."""
+
+from datetime import date, timedelta
+
+from conftest import app, app_module, db
+
+SendCalendar = app_module.SendCalendar
+MONDAY = date(2026, 3, 2)  # Fridays that week and the next: March 6 and 13
+
+
+def _calendar():
+    with app.app_context():
+        return sorted(db.session.query(SendCalendar.send_date, SendCalendar.rotation_assignment_id))
+
+
+def _rebuilt():
+    with app.app_context():
+        app_module.rebuild_send_calendar()
+    return _calendar()
+
+
+def _block_with_assignments(seed):
+    ids = seed(fellows=2)
+    with app.app_context():
+        block = db.session.get(app_module.RotationBlock, ids['block'])
+        block.start_date, block.end_date = MONDAY, MONDAY + timedelta(days=13)
+        for assignment in db.session.query(app_module.RotationAssignment):
+            assignment.send_date = None
+        db.session.commit()
+    return ids
+
+
+def test_send_dates_follow_the_assignment_rules():
+    end = MONDAY + timedelta(days=13)
+
+    assert app_module.assignment_send_dates(None, True, MONDAY, end) == [date(2026, 3, 6), date(2026, 3, 13)]
+    assert app_module.assignment_send_dates(date(2026, 3, 10), True, MONDAY, end) == [date(2026, 3, 10)]
+    assert app_module.assignment_send_dates(date(2026, 4, 1), True, MONDAY, end) == []
+    assert app_module.assignment_send_dates(None, False, MONDAY, end) == []
+
+
+def test_orm_changes_keep_the_calendar_in_step(seed):
+    ids = _block_with_assignments(seed)
+    first, second = ids['assignments']
+    assert _calendar() == sorted((day, assignment_id) for day in (date(2026, 3, 6), date(2026, 3, 13))
+                                 for assignment_id in (first, second))
+
+    with app.app_context():
+        db.session.get(app_module.RotationBlock, ids['block']).end_date = MONDAY + timedelta(days=6)
+        db.session.get(app_module.RotationAssignment, first).send_date = date(2026, 3, 4)
+        db.session.commit()
+    assert _calendar() == [(date(2026, 3, 4), first), (date(2026, 3, 6), second)]
+
+    with app.app_context():
+        db.session.delete(db.session.get(app_module.RotationAssignment, second))
+        db.session.commit()
+    assert _calendar() == [(date(2026, 3, 4), first)] == _rebuilt()
+
+
+def test_bulk_added_assignments_are_on_the_calendar(seed, client):
+    ids = _block_with_assignments(seed)
+    with app.app_context():
+        fellow = app_module.Fellow(name='Late', phone_number='813-555-0999')
+        db.session.add(fellow)
+        db.session.commit()
+        fellow_id = fellow.id
+
+    client.post(f"/assignments/bulk-add/{ids['block']}", data={'fellow_ids': [fellow_id], 'survey_ids': [ids['survey']]})
+
+    calendar = _calendar()
+    assert len(calendar) == 6
+    assert calendar == _rebuilt()
+
+
+def test_empty_calendar_is_built_on_first_use(seed):
+    _block_with_assignments(seed)
+    expected = _calendar()
+    with app.app_context():
+        db.session.query(SendCalendar).delete()
+        db.session.commit()
+        app_module.ensure_send_calendar()
+        db.session.commit()
+
+    assert _calendar() == expected
@@ -0,0 +1,43 @@
+"""Manual sends: the chosen survey is sent, with the custom message as its template."""
+
+from conftest import app, app_module, db
+
+
+def _bodies(transport):
+    return sorted(message.body for messages in transport._messages.values() for message in messages)
+
+
+def test_form_lists_surveys_within_its_query_budget(seed, client):
+    seed(fellows=3)
+    response = client.get('/send-evaluations')
+
+    assert response.status_code == 200
+    assert b'Weekly' in response.data
+
+
+def test_sends_the_selected_survey(seed, client, transport):
+    ids = seed(fellows=2)
+    response = client.post('/send-evaluations', data={'fellow_ids': ids['fellows'], 'survey_id': ids['survey']})
+
+    assert response.status_code == 302
+    assert _bodies(transport) == ['Hi Fellow 0, please complete Weekly: https://example.com/s',
+                                  'Hi Fellow 1, please complete Weekly: https://example.com/s']
+    with app.app_context():
+        logged = db.session.query(app_module.Evaluation.survey_id, app_module.Evaluation.status).all()
+    assert logged == [(ids['survey'], 'sent')] * 2
+
+
+def test_custom_message_is_the_template_not_the_survey(seed, client, transport):
+    ids = seed(fellows=1)
+    client.post('/send-evaluations', data={'fellow_ids': ids['fellows'], 'survey_id': ids['survey'],
+                                           'custom_message': 'Reminder for {name}: {link}'})
+
+    assert _bodies(transport) == ['Reminder for Fellow 0: https://example.com/s']
+
+
+def test_survey_is_required(seed, client, transport):
+    ids = seed(fellows=1)
+    response = client.post('/send-evaluations', data={'fellow_ids': ids['fellows']})
+
+    assert response.status_code == 302 and response.location.endswith('/send-evaluations')
+    assert transport.sent == 0
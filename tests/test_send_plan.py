@@ -0,0 +1,73 @@
+"""The send plan: one joined query for any number of assignments, with the send rules applied in SQL."""
+
+from contextlib import contextmanager
+from datetime import date
+
+import pytest
+
+from conftest import app, app_module, db
+
+
+@contextmanager
+def _count_queries():
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    db.event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        yield statements
+    finally:
+        db.event.remove(db.engine, 'before_cursor_execute', count)
+
+
+def _plan(**options):
+    with app.app_context():
+        app_module.ensure_send_calendar()
+        db.session.commit()
+        with _count_queries() as statements:
+            plan = app_module.build_send_plan(date.today(), **options)
+            names = sorted((item['recipient_type'], item['recipient'].name, item['survey'].name, item['block'].name)
+                           for item in plan)
+        return names, len(statements)
+
+
+@pytest.mark.parametrize('fellows, faculty', [(2, 1), (60, 20)])
+def test_plan_query_count_does_not_grow_with_the_plan(seed, fellows, faculty):
+    seed(fellows=fellows, faculty=faculty)
+    plan, queries = _plan()
+
+    assert len(plan) == fellows + faculty
+    assert queries == 3  # BEGIN, the calendar check and the plan itself
+
+
+def test_inactive_recipients_and_surveys_are_left_out(seed):
+    ids = seed(fellows=2, faculty=1)
+    with app.app_context():
+        db.session.get(app_module.Fellow, ids['fellows'][0]).active = False
+        db.session.commit()
+
+    assert _plan()[0] == [('faculty', 'Faculty 0', 'Weekly', 'Block'), ('fellow', 'Fellow 1', 'Weekly', 'Block')]
+
+    with app.app_context():
+        db.session.get(app_module.Survey, ids['survey']).active = False
+        db.session.commit()
+    assert _plan()[0] == []
+
+
+def test_already_sent_today_is_left_out_unless_asked_for(seed):
+    ids = seed(fellows=2)
+    with app.app_context():
+        db.session.get(app_module.RotationAssignment, ids['assignments'][0]).last_sent = date.today()
+        db.session.commit()
+
+    assert [name for _, name, _, _ in _plan()[0]] == ['Fellow 1']
+    assert [name for _, name, _, _ in _plan(include_already_sent=True)[0]] == ['Fellow 0', 'Fellow 1']
+
+
+def test_friday_preview_stays_within_its_query_budget(seed, client):
+    seed(fellows=40, faculty=10)
+    response = client.get('/send-friday-evaluations')
+
+    assert response.status_code == 200
+    assert b'50 Evaluations Ready to Send' in response.data
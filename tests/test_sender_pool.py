@@ -0,0 +1,85 @@
+"""Rate limiting: token buckets, sticky senders, throttling, and a send run that doesn't hold the request."""
+
+import os
+import threading
+import time
+
+from twilio.base.exceptions import TwilioRestException
+
+from conftest import app, app_module, db
+
+Sender = app_module.Sender
+SenderPool = app_module.SenderPool
+
+
+def _throttled():
+    return TwilioRestException(429, '/Messages.json', msg='Too Many Requests', method='POST')
+
+
+def test_token_bucket_allows_a_burst_then_paces():
+    bucket = app_module.TokenBucket(rate=20, capacity=5)
+    delays = [bucket.reserve() for _ in range(7)]
+
+    assert delays[:5] == [0.0] * 5
+    assert 0.04 < delays[5] < 0.06
+    assert 0.09 < delays[6] < 0.11
+
+
+def test_recipients_stick_to_one_sender_and_spread_across_all():
+    pool = SenderPool([Sender({'from_': f'+1555000000{i}'}, rate=100, burst=100) for i in range(3)])
+    recipients = [f'+1813555{i:04d}' for i in range(300)]
+    first = {to: pool.sender_for(to).name for to in recipients}
+
+    assert first == {to: pool.sender_for(to).name for to in recipients}
+    assert all(40 < list(first.values()).count(sender.name) < 160 for sender in pool.senders)
+
+
+def test_throttled_sender_rests_and_the_send_moves_on():
+    pool = SenderPool([Sender({'from_': f'+1555000000{i}'}, rate=100, burst=100) for i in range(2)])
+    preferred = pool.sender_for('+18135550000')
+    used = []
+
+    def send(from_):
+        used.append(from_)
+        if from_ == preferred.name:
+            raise _throttled()
+        return 'sent'
+
+    assert pool.send('+18135550000', send) == 'sent'
+    assert used[0] == preferred.name and used[1] != preferred.name
+    assert preferred.resting_until > time.monotonic()
+    assert preferred.bucket.rate < preferred.max_rate
+
+
+def test_friday_send_returns_before_paced_sends_finish(seed, transport, client, monkeypatch):
+    seed(fellows=6)
+    monkeypatch.setattr(app_module, '_sender_pool', SenderPool([Sender({'from_': '+15550000000'}, rate=2, burst=1)]))
+    monkeypatch.setattr(app_module, '_sender_pool_pid', os.getpid())
+
+    started = time.perf_counter()
+    response = client.post('/send-friday-evaluations')
+    elapsed = time.perf_counter() - started
+    assert response.status_code == 302
+    assert elapsed < 1
+
+    for thread in threading.enumerate():
+        if thread.name == 'send-run':
+            thread.join(timeout=30)
+    assert transport.sent == 6
+    with app.app_context():
+        run = db.session.query(app_module.SendRun).one()
+        assert (run.queued, run.success, run.failed, run.already_sent) == (6, 6, 0, 0)
+        assert run.finished_at is not None and run.error is None
+    assert b'Recent Send Runs' in client.get('/tracking').data
+
+
+def test_run_cut_short_by_a_restart_is_closed():
+    with app.app_context():
+        db.session.add(app_module.SendRun(pid=os.getpid(), queued=1))
+        db.session.commit()
+
+    app_module.close_interrupted_send_runs()
+
+    with app.app_context():
+        run = db.session.query(app_module.SendRun).one()
+        assert run.finished_at is not None and 'Interrupted' in run.error
@@ -0,0 +1,49 @@
+"""SMS segments: GSM-7 vs UCS-2 encoding, billed segments, and transliteration back to GSM-7."""
+
+import pytest
+
+from conftest import app_module
+
+analyze_sms = app_module.analyze_sms
+
+
+@pytest.mark.parametrize('text, encoding, length, segments', [
+    ('a' * 160, 'GSM-7', 160, 1),
+    ('a' * 161, 'GSM-7', 161, 2),
+    ('a' * 306, 'GSM-7', 306, 2),
+    ('a' * 307, 'GSM-7', 307, 3),
+    ('€' * 80, 'GSM-7', 160, 1),  # extended characters cost two septets
+    ('€' * 81, 'GSM-7', 162, 2),
+    ('a' * 69 + '’', 'UCS-2', 70, 1),
+    ('a' * 70 + '’', 'UCS-2', 71, 2),
+    ('a' * 68 + '\U0001F600', 'UCS-2', 70, 1),  # an emoji is two UTF-16 units
+])
+def test_segment_boundaries(text, encoding, length, segments):
+    analysis = analyze_sms(text)
+
+    assert (analysis['encoding'], analysis['length'], analysis['segments']) == (encoding, length, segments)
+
+
+def test_transliteration_keeps_messages_in_gsm7():
+    pasted = '“Hi” – it’s Zoë… Łódź ☃'
+    converted = app_module.transliterate_gsm7(pasted)
+
+    assert converted == '"Hi" - it\'s Zoe... Lodz ?'
+    assert analyze_sms(pasted)['non_gsm'] and analyze_sms(converted)['encoding'] == 'GSM-7'
+
+
+def test_forced_gsm7_applies_to_rendered_messages(seed, monkeypatch):
+    seed(fellows=1, sms_template='Hi {name} — please complete “{survey}”: {link}')
+    monkeypatch.setattr(app_module, 'SMS_FORCE_GSM7', True)
+    with app_module.app.app_context():
+        plan = app_module.render_plan_messages(app_module.build_send_plan())
+
+    assert plan[0]['message'] == 'Hi Fellow 0 - please complete "Weekly": https://example.com/s'
+
+
+def test_friday_preview_shows_the_runs_segment_cost(seed, client):
+    seed(fellows=3, sms_template='Hi {name} — {link}')
+    response = client.get('/send-friday-evaluations')
+
+    assert b'3 SMS segments for 3 messages' in response.data
+    assert b'3 sent as UCS-2' in response.data
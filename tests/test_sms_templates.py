@@ -0,0 +1,60 @@
+"""SMS templates: compiled once per survey version, rendered in batches, and rebuilt when the survey changes."""
+
+from types import SimpleNamespace
+
+from conftest import app, app_module, db
+
+SURVEY = SimpleNamespace(id=1, name='Weekly', survey_link='https://example.com/s', template_version=1,
+                         sms_template='Hi {name}, {survey} for {date}: {link} {unknown}')
+
+
+def _naive(template, name, date):
+    """The four str.replace calls the compiled template stands in for"""
+    return (template.replace('{name}', name).replace('{link}', SURVEY.survey_link)
+            .replace('{survey}', SURVEY.name).replace('{date}', date))
+
+
+def test_compiled_render_matches_plain_replacement():
+    compiled = app_module.CompiledSmsTemplate(SURVEY.sms_template, SURVEY)
+    names = ['Ada', 'Bo', '']
+
+    assert compiled.render_batch(names, 'March 06, 2026') == [
+        _naive(SURVEY.sms_template, name, 'March 06, 2026') for name in names
+    ]
+    assert compiled.render('{link}', 'today').startswith('Hi {link}, ')  # names are never re-expanded
+    assert app_module.unknown_placeholders(SURVEY.sms_template) == ['unknown']
+
+
+def test_cache_compiles_each_survey_version_once():
+    cache = app_module.SmsTemplateCache()
+    first = cache.get(SURVEY)
+
+    assert cache.get(SURVEY) is first
+    assert cache.get(SimpleNamespace(**{**vars(SURVEY), 'template_version': 2})) is not first
+    assert list(cache._compiled) == [(1, 2)]
+
+
+def _edit(client, survey_id, **form):
+    fields = {'name': 'Weekly', 'survey_link': 'https://example.com/s', 'survey_type': 'weekly',
+              'sms_template': 'Hi {name}, please complete {survey}: {link}', 'active': 'on'}
+    fields.update(form)
+    return client.post(f'/surveys/edit/{survey_id}', data=fields)
+
+
+def _message(survey_id):
+    with app.app_context():
+        survey = db.session.get(app_module.Survey, survey_id)
+        return survey.template_version, app_module.render_sms_message(SimpleNamespace(name='Ada'), survey)
+
+
+def test_editing_the_template_replaces_the_compiled_form(seed, client):
+    ids = seed(fellows=1)
+    version, before = _message(ids['survey'])
+
+    _edit(client, ids['survey'], description='Only the description changed')
+    assert _message(ids['survey']) == (version, before)
+
+    _edit(client, ids['survey'], sms_template='{name}: {link} ({oops})')
+    assert _message(ids['survey']) == (version + 1, 'Ada: https://example.com/s ({oops})')
+    with client.session_transaction() as session:
+        assert any('{oops}' in message for _, message in session['_flashes'])
@@ -0,0 +1,60 @@
+"""Tracking pagination: keyset cursors on (sent_at, id) visit every row once, in both directions."""
+
+from datetime import datetime, timedelta
+
+from conftest import app, app_module, db
+
+Evaluation = app_module.Evaluation
+
+
+def _evaluations(count):
+    """`count` evaluations, three to a timestamp so cursors must break ties on id"""
+    start = datetime(2026, 1, 1, 9)
+    with app.app_context():
+        db.session.execute(db.insert(Evaluation), [
+            {'sent_at': start + timedelta(minutes=i // 3), 'status': 'sent', 'recipient_type': 'fellow'}
+            for i in range(count)
+        ])
+        db.session.commit()
+        return [evaluation_id for (evaluation_id,) in db.session.query(Evaluation.id)
+                .order_by(Evaluation.sent_at.desc(), Evaluation.id.desc())]
+
+
+def _page(**cursor):
+    with app.app_context():
+        decoded = {key: app_module.decode_cursor(value) for key, value in cursor.items()}
+        evaluations, next_cursor, prev_cursor = app_module.paginate_evaluations(**decoded)
+        return [evaluation.id for evaluation in evaluations], next_cursor, prev_cursor
+
+
+def test_pages_forward_and_back_cover_every_row_once():
+    newest_first = _evaluations(125)
+
+    pages = [_page()]
+    while pages[-1][1]:
+        pages.append(_page(after=pages[-1][1]))
+    assert [len(ids) for ids, _, _ in pages] == [50, 50, 25]
+    assert [i for ids, _, _ in pages for i in ids] == newest_first
+    assert pages[0][2] is None
+
+    back = [pages[-1]]
+    while back[-1][2]:
+        back.append(_page(before=back[-1][2]))
+    assert [ids for ids, _, _ in reversed(back)] == [ids for ids, _, _ in pages]
+
+
+def test_malformed_cursor_shows_the_first_page(client):
+    newest_first = _evaluations(60)
+
+    assert _page(after='not-a-cursor')[0] == newest_first[:50]
+    assert client.get('/tracking?after=not-a-cursor').status_code == 200
+
+
+def test_deep_page_renders_within_its_query_budget(client):
+    _evaluations(200)
+    _, next_cursor, _ = _page()
+    _, next_cursor, _ = _page(after=next_cursor)
+
+    response = client.get(f'/tracking?after={next_cursor}')
+    assert response.status_code == 200
+    assert b'Previous' in response.data and b'Next' in response.data
@@ -0,0 +1,113 @@
+"""SQLite transactions: write units begin IMMEDIATE, and serialized_write() joins a lock its thread holds."""
+
+import threading
+import time
+
+import pytest
+
+from conftest import app, app_module, db
+
+Fellow = app_module.Fellow
+
+
+def _fellow_names():
+    with app.app_context():
+        return sorted(name for (name,) in db.session.query(Fellow.name))
+
+
+def _insert_fellow(name):
+    with app.app_context(), app_module.serialized_write() as session:
+        session.add(Fellow(name=name, phone_number='813-555-0100'))
+
+
+def test_serialized_write_leaves_the_callers_session_alone():
+    with app.app_context():
+        db.session.add(Fellow(name='Pending', phone_number='813-555-0101'))
+        with app_module.serialized_write() as session:
+            session.add(Fellow(name='Written', phone_number='813-555-0102'))
+        db.session.rollback()
+
+    assert _fellow_names() == ['Written']
+
+
+def test_nested_serialized_write_joins_the_outer_block():
+    with app.app_context():
+        with pytest.raises(ValueError):
+            with app_module.serialized_write() as outer:
+                outer.add(Fellow(name='Outer', phone_number='813-555-0103'))
+                with app_module.serialized_write() as inner:
+                    assert inner is outer
+                    inner.add(Fellow(name='Inner', phone_number='813-555-0104'))
+                raise ValueError
+
+    assert _fellow_names() == []
+
+
+def _write_request():
+    """A POST request context whose session begins as a writer"""
+    context = app.test_request_context('/', method='POST')
+    context.push()
+    app.preprocess_request()
+    return context
+
+
+def test_serialized_write_joins_the_write_lock_its_thread_holds():
+    context = _write_request()
+    try:
+        db.session.add(Fellow(name='Route', phone_number='813-555-0105'))
+        db.session.flush()
+        assert app_module._write_lock_holder() is not None
+        started = time.perf_counter()
+        _insert_fellow('Helper')
+        assert time.perf_counter() - started < 1
+        db.session.commit()
+    finally:
+        context.pop()
+
+    assert _fellow_names() == ['Helper', 'Route']
+
+
+def test_joined_serialized_write_rolls_back_with_its_caller():
+    context = _write_request()
+    try:
+        db.session.add(Fellow(name='Route', phone_number='813-555-0105'))
+        db.session.flush()
+        _insert_fellow('Helper')
+        db.session.rollback()
+        assert app_module._write_lock_holder() is None
+    finally:
+        context.pop()
+
+    assert _fellow_names() == []
+
+
+def test_post_request_holds_the_write_lock_from_its_first_read():
+    context = _write_request()
+    try:
+        assert db.session.query(Fellow).count() == 0
+        writer = threading.Thread(target=_insert_fellow, args=('Concurrent',))
+        writer.start()
+        writer.join(timeout=0.3)
+        assert writer.is_alive()  # queued behind the request, not racing its snapshot
+        db.session.add(Fellow(name='Late', phone_number='813-555-0106'))
+        db.session.commit()
+        writer.join()
+    finally:
+        context.pop()
+
+    assert _fellow_names() == ['Concurrent', 'Late']
+
+
+def test_get_request_reads_do_not_take_the_write_lock():
+    with app.test_request_context('/'):
+        app.preprocess_request()
+        db.session.query(Fellow).count()
+        assert app_module._write_lock_holder() is None
+        writer = threading.Thread(target=_insert_fellow, args=('Background',))
+        started = time.perf_counter()
+        writer.start()
+        writer.join()
+        assert time.perf_counter() - started < 1
+        db.session.rollback()
+
+    assert _fellow_names() == ['Background']
@@ -0,0 +1,67 @@
+"""SMS transports: chosen by configuration, and a fake that behaves like Twilio under load."""
+
+import time
+
+import pytest
+import requests
+from twilio.base.exceptions import TwilioRestException
+
+from conftest import app_module
+
+FakeTransport = app_module.FakeTransport
+
+
+def _fake(**options):
+    settings = dict(latency_ms=0, error_rate=0, timeout_rate=0, rate_limit=0)
+    settings.update(options)
+    return FakeTransport(**settings)
+
+
+def test_transport_is_chosen_by_configuration(monkeypatch):
+    monkeypatch.setattr(app_module, 'SMS_TRANSPORT', 'twilio')
+    assert isinstance(app_module.get_sms_transport(), app_module.TwilioTransport)
+
+    monkeypatch.setattr(app_module, '_sms_transport', None)
+    monkeypatch.setattr(app_module, 'SMS_TRANSPORT', 'pigeon')
+    with pytest.raises(ValueError, match='pigeon'):
+        app_module.get_sms_transport()
+
+
+def test_fake_records_what_it_sends():
+    transport = _fake()
+    first = transport.send('+18135550001', 'One', from_='+15550000000')
+    second = transport.send('+18135550001', 'Two', from_='+15550000000')
+
+    assert first.sid != second.sid and first.sid.startswith('SM')
+    assert [message.body for message in transport.recent_messages('+18135550001')] == ['Two', 'One']
+    assert transport.sent == 2
+
+
+def test_fake_injects_provider_errors_and_lost_responses():
+    with pytest.raises(TwilioRestException) as error:
+        _fake(error_rate=1).send('+18135550001', 'Hi', from_='+15550000000')
+    assert error.value.status == 503
+
+    transport = _fake(timeout_rate=1)
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        transport.send('+18135550001', 'Hi', from_='+15550000000')
+    assert len(transport.recent_messages('+18135550001')) == 1  # accepted, but the response was lost
+
+
+def test_fake_throttles_each_sender_to_its_rate_limit():
+    transport = _fake(rate_limit=3)
+    for _ in range(3):
+        transport.send('+18135550001', 'Hi', from_='+15550000000')
+    with pytest.raises(TwilioRestException) as error:
+        transport.send('+18135550001', 'Hi', from_='+15550000000')
+
+    assert app_module.is_throttling_error(error.value)
+    transport.send('+18135550001', 'Hi', from_='+15550000001')  # other senders have their own limit
+
+
+def test_fake_latency_is_jittered_around_the_mean():
+    transport = _fake(latency_ms=20)
+    started = time.perf_counter()
+    transport.send('+18135550001', 'Hi', from_='+15550000000')
+
+    assert 0.01 <= time.perf_counter() - started < 0.2
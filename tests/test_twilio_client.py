@@ -0,0 +1,43 @@
+"""The Twilio client: one pooled, keep-alive client per process, with connect and read timeouts."""
+
+import threading
+
+import pytest
+
+from conftest import app_module
+
+
+@pytest.fixture(autouse=True)
+def credentials(monkeypatch):
+    monkeypatch.setattr(app_module, 'TWILIO_ACCOUNT_SID', 'AC' + '0' * 32)
+    monkeypatch.setattr(app_module, 'TWILIO_AUTH_TOKEN', 'token')
+    monkeypatch.setattr(app_module, '_twilio_client', None)
+    monkeypatch.setattr(app_module, '_twilio_client_pid', None)
+
+
+def test_threads_share_one_client():
+    clients = []
+    threads = [threading.Thread(target=lambda: clients.append(app_module.get_twilio_client())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(client) for client in clients}) == 1
+    assert app_module.get_twilio_client() is clients[0]
+
+
+def test_client_pools_connections_with_timeouts():
+    http_client = app_module.get_twilio_client().http_client
+    adapter = http_client.session.get_adapter('https://api.twilio.com')
+
+    assert http_client.timeout == (app_module.TWILIO_CONNECT_TIMEOUT, app_module.TWILIO_READ_TIMEOUT)
+    assert adapter._pool_maxsize == app_module.send_worker_count()
+    assert adapter.max_retries.total == 0
+
+
+def test_forked_worker_builds_its_own_client(monkeypatch):
+    parent = app_module.get_twilio_client()
+    monkeypatch.setattr(app_module, '_twilio_client_pid', -1)  # as seen from a forked child
+
+    assert app_module.get_twilio_client() is not parent